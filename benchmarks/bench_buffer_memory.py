@@ -0,0 +1,70 @@
+"""
+Memory of a full client buffer: the frames of a video are scaled to 1080p and encoded as the server encodes them,
+then the buffer of the video player is filled and drained. Compares the bytes of the buffer (the encoded frames and
+the ring of decoded frames) with the bytes of the same frames buffered decoded, and measures the time to show a
+frame.
+
+    python benchmarks/bench_buffer_memory.py [video] [--frames N]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import socket_functions  # noqa: E402
+from videoplayer import VideoPlayer, EncodedFrame  # noqa: E402
+
+
+def encoded_frames(video_path: str, amount: int) -> list:
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < amount:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(socket_functions.encode_img(cv2.resize(frame, (1920, 1080), interpolation=cv2.INTER_LINEAR)))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default=os.path.join(ROOT, "server", "videos", "IronMan", "video.mp4"))
+    parser.add_argument("--frames", type=int, default=VideoPlayer.MAX_FRAMES)
+    args = parser.parse_args()
+
+    frames = encoded_frames(args.video, args.frames)
+    player = VideoPlayer()
+    player.set_fps(25)
+    player.set_frames_amount(len(frames) + 1)
+    added = 0
+    for img_bytes in frames:
+        if not player.can_add_frame():
+            break
+        player.add_frame(EncodedFrame(socket_functions.ASK_FOR_FRAME, socket_functions.IMAGE_FORMAT, (img_bytes,),
+                                      len(img_bytes)))
+        added += 1
+
+    times = []
+    peak_bytes = player.buffered_bytes
+    shown = player.get_frames()
+    for _ in range(added):
+        start = time.perf_counter()
+        next(shown)
+        times.append(time.perf_counter() - start)
+        peak_bytes = max(peak_bytes, player.buffered_bytes)
+    times_ms = np.array(times) * 1000
+
+    decoded_bytes = added * 1920 * 1080 * 3
+    print(f"{len(frames)} frames of 1920x1080, {sum(map(len, frames)) / len(frames) / 1024:.0f} KB each, "
+          f"the buffer took {added}")
+    print(f"buffered decoded: {decoded_bytes / 2 ** 20:>8.1f} MB")
+    print(f"buffered encoded: {peak_bytes / 2 ** 20:>8.1f} MB at the peak (with the ring of decoded frames)")
+    print(f"time to show a frame: mean {times_ms.mean():.2f} ms, p95 {np.percentile(times_ms, 95):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
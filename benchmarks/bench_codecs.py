@@ -0,0 +1,85 @@
+"""
+Encode and decode time and bytes per frame of every codec of the registry (frame_codecs.py) with a few
+parameter sets, on the frames of a real clip. The error is the mean absolute difference from the source frames
+(0 for the lossless codecs).
+
+    python benchmarks/bench_codecs.py [video] [--frames N] [--scale S]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+import cv2  # noqa: E402
+from ServerConfig import ALL_VIDEOS_DIRECTORIES, get_video_and_thumbnail_path  # noqa: E402
+from frame_codecs import CODECS, CodecSettings, encode_frame, decode_frame  # noqa: E402
+
+# (quality, chroma subsampling) of every codec, None is the default of the codec
+PARAMETERS = {
+    "jpeg": [(None, None), (90, "4:4:4"), (75, "4:2:0"), (50, "4:2:0")],
+    "cv2-jpeg": [(None, None), (90, "4:4:4"), (75, "4:2:0"), (50, "4:2:0")],
+    "webp": [(None, None), (90, None), (50, None)],
+    "raw-zlib": [(None, None)],
+}
+
+
+def read_frames(video_path: str, amount: int, scale: float) -> list:
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < amount:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if scale != 1:
+            height, width = frame.shape[:2]
+            frame = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    return frames
+
+
+def measure(frames: list, settings: CodecSettings) -> tuple:
+    """
+    :return: a tuple: (encode ms per frame, decode ms per frame, bytes per frame, mean error)
+    """
+    encode_seconds = decode_seconds = 0.0
+    total_bytes = 0
+    error = 0.0
+    for frame in frames:
+        start = time.perf_counter()
+        img_bytes = encode_frame(frame, settings)
+        encode_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = decode_frame(img_bytes, settings.codec)
+        decode_seconds += time.perf_counter() - start
+        total_bytes += len(img_bytes)
+        error += cv2.absdiff(decoded, frame).mean()
+    amount = len(frames)
+    return encode_seconds / amount * 1000, decode_seconds / amount * 1000, total_bytes / amount, error / amount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", help="path of a video (default the first video of the server)")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    video_path = args.video
+    if video_path is None:
+        video_path = next(path for path, _ in map(get_video_and_thumbnail_path, ALL_VIDEOS_DIRECTORIES)
+                          if os.path.exists(path))
+    frames = read_frames(video_path, args.frames, args.scale)
+    height, width = frames[0].shape[:2]
+    print(f"{video_path}: {len(frames)} frames of {width}x{height}")
+    print(f"{'codec':<10}{'quality':>8}{'chroma':>8}{'encode ms':>11}{'decode ms':>11}{'KB/frame':>10}{'error':>8}")
+    for codec in CODECS:
+        for quality, subsampling in PARAMETERS.get(codec, [(None, None)]):
+            encode_ms, decode_ms, frame_bytes, error = measure(frames, CodecSettings(codec, quality, subsampling))
+            print(f"{codec:<10}{str(quality or '-'):>8}{subsampling or '-':>8}{encode_ms:>11.2f}{decode_ms:>11.2f}"
+                  f"{frame_bytes / 1024:>10.1f}{error:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
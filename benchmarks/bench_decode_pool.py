@@ -0,0 +1,71 @@
+"""
+Frames per second through the decode pool of the client with different amounts of workers. The frames of a video
+are scaled to 1080p and encoded as the server encodes them, then submitted to the pool as fast as they come and
+released in order.
+
+    python benchmarks/bench_decode_pool.py [video] [--frames N] [--workers 0 1 2 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+import cv2  # noqa: E402
+import socket_functions  # noqa: E402
+from decode_pool import DecodePool  # noqa: E402
+
+
+def encoded_frames(video_path: str, amount: int) -> list:
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < amount:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(socket_functions.encode_img(cv2.resize(frame, (1920, 1080), interpolation=cv2.INTER_LINEAR)))
+    return frames
+
+
+def run(frames: list, workers: int) -> tuple:
+    """
+    :return: a tuple: (frames per second, are the frames released in order, the stats of the pool)
+    """
+    pool = DecodePool(workers)
+    released = []
+    done = threading.Event()
+
+    def release(index: int, img_frame) -> None:
+        released.append(index)
+        if len(released) == len(frames):
+            done.set()
+
+    start = time.perf_counter()
+    for index, img_bytes in enumerate(frames):
+        pool.submit(lambda img_bytes=img_bytes: socket_functions.decode_img(img_bytes),
+                    lambda img_frame, index=index: release(index, img_frame))
+    done.wait()
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, released == list(range(len(frames))), pool.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default=os.path.join(ROOT, "server", "videos", "IronMan", "video.mp4"))
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    frames = encoded_frames(args.video, args.frames)
+    print(f"{len(frames)} frames of 1920x1080, {sum(map(len, frames)) / len(frames) / 1024:.0f} KB each")
+    print(f"{'workers':<10}{'fps':>8}{'decode ms':>11}{'p95 ms':>9}{'max depth':>11}{'in order':>10}")
+    for workers in args.workers:
+        fps, in_order, stats = run(frames, workers)
+        print(f"{workers:<10}{fps:>8.1f}{stats['decode_ms_mean']:>11.2f}{stats['decode_ms_p95']:>9.2f}"
+              f"{stats['max_queue_depth']:>11}{str(in_order):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Bandwidth and CPU of whole frames against delta frames (only the tiles that changed since the previous frame)
+on real clips. Every frame is encoded as the server encodes it and decoded as the client decodes it, the
+reconstructed frames are compared with the source frames.
+
+    python benchmarks/bench_delta.py [video ...] [--frames N] [--scale S] [--tile-size T] [--threshold D]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+import cv2  # noqa: E402
+import socket_functions  # noqa: E402
+from ServerConfig import ALL_VIDEOS_DIRECTORIES, DELTA_TILE_SIZE, DELTA_THRESHOLD, \
+    get_video_and_thumbnail_path  # noqa: E402
+from delta_codec import DeltaEncoder  # noqa: E402
+
+# the client has a module with the same name as the server module
+_spec = importlib.util.spec_from_file_location("client_delta_codec", os.path.join(ROOT, "client", "delta_codec.py"))
+client_delta_codec = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(client_delta_codec)
+
+KIND_NAMES = {socket_functions.ASK_FOR_FRAME: "whole", socket_functions.DELTA_FRAME: "delta",
+              socket_functions.REPEAT_FRAME: "repeat"}
+
+
+def read_frames(video_path: str, amount: int, scale: float) -> list:
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < amount:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if scale != 1:
+            height, width = frame.shape[:2]
+            frame = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    return frames
+
+
+def whole_frames(frames: list) -> dict:
+    wire_bytes = 0
+    encode_seconds = decode_seconds = 0.0
+    error = 0.0
+    for frame in frames:
+        start = time.process_time()
+        img_bytes = socket_functions.encode_img(frame)
+        encode_seconds += time.process_time() - start
+        start = time.process_time()
+        decoded = socket_functions.decode_img(img_bytes)
+        decode_seconds += time.process_time() - start
+        wire_bytes += len(img_bytes)
+        error += cv2.absdiff(decoded, frame).mean()
+    return {"bytes": wire_bytes, "encode": encode_seconds, "decode": decode_seconds, "error": error,
+            "kinds": {socket_functions.ASK_FOR_FRAME: len(frames)}}
+
+
+def delta_frames(frames: list, tile_size: int, threshold: int) -> dict:
+    encoder = DeltaEncoder(tile_size, threshold)
+    decoder = client_delta_codec.DeltaDecoder()
+    wire_bytes = 0
+    encode_seconds = decode_seconds = 0.0
+    error = 0.0
+    kinds = {}
+    for frame in frames:
+        start = time.process_time()
+        message, frame_bytes = encoder.encode(frame)
+        encode_seconds += time.process_time() - start
+        start = time.process_time()
+        if message[0] == socket_functions.ASK_FOR_FRAME:
+            decoded = decoder.whole_frame(socket_functions.decode_img(message[1]))
+        elif message[0] == socket_functions.DELTA_FRAME:
+            decoded = decoder.delta_frame(*message[1:4], socket_functions.decode_img(message[4]))
+        else:
+            decoded = decoder.repeat_frame()
+        decode_seconds += time.process_time() - start
+        wire_bytes += frame_bytes
+        error += cv2.absdiff(decoded, frame).mean()
+        kinds[message[0]] = kinds.get(message[0], 0) + 1
+    return {"bytes": wire_bytes, "encode": encode_seconds, "decode": decode_seconds, "error": error,
+            "kinds": kinds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="*", help="paths of videos (default all the videos of the server)")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--scale", type=float, default=1.0, help="scale of the frames, like the display size")
+    parser.add_argument("--tile-size", type=int, default=DELTA_TILE_SIZE)
+    parser.add_argument("--threshold", type=int, default=DELTA_THRESHOLD)
+    args = parser.parse_args()
+
+    videos = args.videos or [path for path, _ in map(get_video_and_thumbnail_path, ALL_VIDEOS_DIRECTORIES)
+                             if os.path.exists(path)]
+    print(f"{'video':<30}{'codec':<8}{'KB/frame':>10}{'server ms':>11}{'client ms':>11}{'error':>8}  frames")
+    for video_path in videos:
+        frames = read_frames(video_path, args.frames, args.scale)
+        if not frames:
+            continue
+        name = os.path.basename(os.path.dirname(video_path))
+        for codec, result in (("whole", whole_frames(frames)),
+                              ("delta", delta_frames(frames, args.tile_size, args.threshold))):
+            amount = len(frames)
+            kinds = ", ".join(f"{KIND_NAMES[kind]} {count}" for kind, count in result["kinds"].items())
+            print(f"{name:<30}{codec:<8}{result['bytes'] / amount / 1024:>10.1f}"
+                  f"{result['encode'] / amount * 1000:>11.2f}{result['decode'] / amount * 1000:>11.2f}"
+                  f"{result['error'] / amount:>8.2f}  {kinds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Aggregate frames per second of the server encode pool with different amounts of worker processes. Every session
+(a thread, like a client of the threaded server) keeps `ENCODE_AHEAD` frames in the pool and takes the encoded
+frames in order, as ClientHandler does for a stream. The frames of a video are scaled to the size and decoded
+before the run, only the encoding is measured.
+
+    python benchmarks/bench_encode_pool.py [video] [--frames N] [--sessions S] [--workers 0 1 2 4] [--size WxH]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+import cv2  # noqa: E402
+import socket_functions  # noqa: E402
+from ServerConfig import ENCODE_AHEAD  # noqa: E402
+from encode_pool import EncodePool  # noqa: E402
+
+
+def read_frames(video_path: str, amount: int, size: tuple) -> list:
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < amount:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR))
+    return frames
+
+
+def session(pool: EncodePool, frames: list, expected: list, in_order: list) -> None:
+    """
+    :return: None. Encode all the frames, up to `ENCODE_AHEAD` at once, and check they come back in order.
+    """
+    encoding = deque()
+    next_frame = 0
+    for index in range(len(frames)):
+        while next_frame < len(frames) and len(encoding) < ENCODE_AHEAD:
+            encoding.append(pool.submit(frames[next_frame]))
+            next_frame += 1
+        if encoding.popleft().result() != expected[index]:
+            in_order[0] = False
+
+
+def run(frames: list, expected: list, workers: int, sessions: int) -> tuple:
+    """
+    :return: a tuple: (frames per second of all the sessions, were all the frames in order)
+    """
+    pool = EncodePool(workers)
+    # start the workers before we measure
+    pool.submit(frames[0]).result()
+    in_order = [True]
+    threads = [threading.Thread(target=session, args=(pool, frames, expected, in_order)) for _ in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return len(frames) * sessions / elapsed, in_order[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default=os.path.join(ROOT, "server", "videos", "IronMan", "video.mp4"))
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--size", default="1280x720")
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames, tuple(map(int, args.size.split("x"))))
+    expected = [socket_functions.encode_img(frame) for frame in frames]
+    print(f"{len(frames)} frames of {args.size} for each of {args.sessions} sessions, {os.cpu_count()} cores")
+    print(f"{'workers':<10}{'fps':>8}{'in order':>10}")
+    for workers in args.workers:
+        fps, in_order = run(frames, expected, workers, args.sessions)
+        print(f"{workers:<10}{fps:>8.1f}{str(in_order):>10}")
+
+
+if __name__ == "__main__":
+    main()
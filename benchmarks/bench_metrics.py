@@ -0,0 +1,63 @@
+"""
+Overhead of the server metrics. Times what the server records for every frame it serves (the read, encode,
+serialise and send stages, the frames and the bytes) against the time of a frame at 25 fps, and how long the
+exporter takes to render the totals of many sessions.
+
+    python benchmarks/bench_metrics.py [--frames N] [--sessions N]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+# ServerConfig needs a port even though nothing listens
+os.environ.setdefault("PORT", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+from metrics import ServerMetrics, STAGES, READ_STAGE, BYTES_SENT, FRAMES_SERVED  # noqa: E402
+
+FRAME_INTERVAL_US = 1e6 / 25
+
+
+def record_frame(session) -> None:
+    """
+    :return: None. Record what the server records for one frame.
+    """
+    for stage in STAGES:
+        with session.time(stage):
+            pass
+    session.count(FRAMES_SERVED)
+    session.count(BYTES_SENT, 40000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--sessions", type=int, default=100)
+    args = parser.parse_args()
+
+    metrics = ServerMetrics()
+    session = metrics.open_session()
+    started = time.perf_counter()
+    for _ in range(args.frames):
+        record_frame(session)
+    per_frame_us = (time.perf_counter() - started) / args.frames * 1e6
+    print(f"metrics of a frame: {per_frame_us:.2f} us, {per_frame_us / FRAME_INTERVAL_US * 100:.4f}% of a frame "
+          f"at 25 fps")
+
+    started = time.perf_counter()
+    for _ in range(args.frames):
+        session.observe(READ_STAGE, 0.001)
+    print(f"one observation:    {(time.perf_counter() - started) / args.frames * 1e6:.2f} us")
+
+    for _ in range(args.sessions - 1):
+        record_frame(metrics.open_session())
+    started = time.perf_counter()
+    text = metrics.prometheus()
+    print(f"exporter with {args.sessions} sessions: {(time.perf_counter() - started) * 1000:.2f} ms, "
+          f"{len(text)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+CPU time of the client process while it plays a video, while it seeks (4 seeks a second) and while the playback
+is paused (with a full buffer). Starts a server on a free port and runs the real player window offscreen. Exits
+with status 1 when the paused playback takes more than `--max-paused-cpu` percent of a core, a paused player must
+wait instead of polling.
+
+    python benchmarks/bench_paused_cpu.py [video] [--seconds S] [--max-paused-cpu PERCENT]
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt5.QtCore import QEventLoop, QTimer  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from client import Client  # noqa: E402
+from videoplayer import VideoPlayer  # noqa: E402
+from gui import Window, AskingForFrameThread  # noqa: E402
+
+
+def start_server() -> tuple:
+    """
+    :return: a tuple: (the server process, its port)
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server", "server.py")],
+                              env=dict(os.environ, IP="127.0.0.1", PORT=str(port)), stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return server, port
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("The server did not start")
+
+
+def run_for(seconds: float) -> float:
+    """
+    :return: the CPU time (seconds) of this process while the Qt event loop ran for the seconds
+    """
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    start = time.process_time()
+    loop.exec_()
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default="IronMan")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--max-paused-cpu", type=float, default=2,
+                        help="the most CPU (percent of a core) the client may take while paused")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    server, port = start_server()
+    try:
+        video_player = VideoPlayer()
+        client = Client("127.0.0.1", port, video_player)
+        client.threaded_connect_and_listen_to_server()
+        client.ask_for_video_details(args.video)
+        client.ask_for_new_location(args.video, 0)
+        video_player.wait_for_video_details()
+        thread = AskingForFrameThread(client, video_player, args.video)
+        thread.start()
+        window = Window(client, video_player, args.video, thread)
+        window.show()
+
+        run_for(1)
+        playing = run_for(args.seconds)
+        seeks = QTimer()
+        seeks.timeout.connect(lambda: window.change_video_frame(random.randrange(video_player.frames_amount - 100)))
+        seeks.start(250)
+        seeking = run_for(args.seconds)
+        seeks.stop()
+        run_for(1)
+        window.pause_start_click()
+        run_for(1)
+        paused = run_for(args.seconds)
+        for name, cpu in (("playing", playing), ("seeking", seeking), ("paused", paused)):
+            print(f"{name:<10}{cpu / args.seconds * 100:>6.1f}% of a core")
+        thread.kill()
+    finally:
+        server.terminate()
+
+    if paused / args.seconds * 100 > args.max_paused_cpu:
+        print(f"FAIL: the paused client took more than {args.max_paused_cpu:g}% of a core")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Real time playback of the player window (offscreen) on a loaded machine. The frames of a video are encoded as the
+server encodes them and fed to the video player without a server, the window plays them at 29.97 fps while every
+rendered frame costs extra CPU (busy work added to `show_img`). Compares the previous fixed interval timer (every
+frame is shown, `round(1000 / fps)` ms after the previous one) with the playback clock (every frame has a deadline,
+the late frames are dropped): how far the position in the video is behind the wall clock after the run.
+
+    python benchmarks/bench_playback_clock.py [video] [--seconds S] [--fps F] [--load-ms 0 20 40]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+import cv2  # noqa: E402
+from PyQt5.QtCore import QEventLoop, QTimer  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+import socket_functions  # noqa: E402
+from videoplayer import VideoPlayer, EncodedFrame  # noqa: E402
+from gui import Window  # noqa: E402
+
+
+def encoded_frames(video_path: str, amount: int) -> list:
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < amount:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(socket_functions.encode_img(frame))
+    return frames
+
+
+def feed(video_player: VideoPlayer, frames: list, stop: threading.Event) -> None:
+    """
+    :return: None. Keep the buffer of the video player full with the frames, again and again.
+    """
+    index = 0
+    while not stop.is_set():
+        if video_player.can_add_frame():
+            img_bytes = frames[index % len(frames)]
+            video_player.add_frame(EncodedFrame(socket_functions.ASK_FOR_FRAME, socket_functions.IMAGE_FORMAT,
+                                                (img_bytes,), len(img_bytes)))
+            index += 1
+        else:
+            video_player.wait_for_change(0.1)
+
+
+def busy(ms: float) -> None:
+    end = time.perf_counter() + ms / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def play(frames: list, fps: float, seconds: float, load_ms: float, previous: bool) -> tuple:
+    """
+    :return: a tuple: (seconds the position is behind the wall clock, the counters of the playback clock)
+    """
+    video_player = VideoPlayer()
+    video_player.set_fps(fps)
+    video_player.set_frames_amount(10 ** 6)
+    stop = threading.Event()
+    feeder = threading.Thread(target=feed, args=(video_player, frames, stop), daemon=True)
+    feeder.start()
+    video_player.wait_for_buffer()
+
+    # the window only needs the client to seek and to send the display size, neither happens here
+    window = Window(None, video_player, "bench", None)
+    show_img = window.show_img
+    window.show_img = lambda img: (show_img(img), busy(load_ms))
+    if previous:
+        window.timer.stop()
+        window.timer.timeout.disconnect()
+        timer = QTimer()
+
+        def previous_timer_event():
+            window.show_img(next(window.frames))
+            window.current_frame += 1
+
+        timer.timeout.connect(previous_timer_event)
+        timer.start(round(1000 / fps))
+    window.show()
+
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    start = time.monotonic()
+    loop.exec_()
+    elapsed = time.monotonic() - start
+    stop.set()
+    window.timer.stop()
+    if previous:
+        timer.stop()
+    return elapsed - window.current_frame / fps, window.clock.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default=os.path.join(ROOT, "server", "videos", "IronMan", "video.mp4"))
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=float, default=29.97)
+    parser.add_argument("--load-ms", type=float, nargs="+", default=[0, 20, 40])
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)  # noqa: F841
+    frames = encoded_frames(args.video, 100)
+    print(f"{args.seconds:.0f} s at {args.fps} fps, {frames and len(frames)} frames looped")
+    print(f"{'load ms':<9}{'previous behind s':>19}{'clock behind s':>16}{'on time':>9}{'late':>6}{'dropped':>9}")
+    for load_ms in args.load_ms:
+        previous_behind, _ = play(frames, args.fps, args.seconds, load_ms, previous=True)
+        behind, stats = play(frames, args.fps, args.seconds, load_ms, previous=False)
+        print(f"{load_ms:<9.0f}{previous_behind:>19.2f}{behind:>16.2f}{stats['on_time']:>9}{stats['late']:>6}"
+              f"{stats['dropped']:>9}")
+
+
+if __name__ == "__main__":
+    main()
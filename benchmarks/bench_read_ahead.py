@@ -0,0 +1,123 @@
+"""
+Latency of serving a frame of a stream with and without the read-ahead thread of the session. A client plays a
+synthetic video at its fps (one credit per frame, a seek every few seconds) against a ClientHandler in this process,
+and the time the handler takes to serve every frame (from taking the frame until it was sent) is measured. Without
+the read-ahead (`ENCODE_AHEAD=0`) every frame is decoded and encoded when it is asked for, with it the frame was
+prepared while the client waited for the next one.
+
+    python benchmarks/bench_read_ahead.py [--size WxH] [--fps F] [--seconds S] [--seek-every S] [--depths 0 8]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+# the server modules read their configuration when they are imported, nothing listens
+WORK_DIR = tempfile.mkdtemp(prefix="bench-read-ahead-")
+os.environ.update(PORT="0", METRICS_PORT="0", VIDEOS_DIR=WORK_DIR, DATABASE_PATH=os.path.join(WORK_DIR, "db.sqlite3"),
+                  SESSION_SECRET="bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import socket_functions  # noqa: E402
+import ClientHandler as handler_module  # noqa: E402
+from ClientHandler import ClientHandler  # noqa: E402
+from frame_cache import FRAME_CACHE  # noqa: E402
+from encode_pool import ENCODE_POOL  # noqa: E402
+
+VIDEO = "synthetic"
+
+
+class BenchHandler(ClientHandler):
+    """
+    Packs the messages like the server does and drops them.
+    """
+
+    def _send(self, data) -> None:
+        socket_functions.pack_data(data, socket_functions.BINARY_PROTOCOL)
+
+
+def make_video(size: tuple, fps: float, seconds: float) -> None:
+    """
+    :return: None. A video of moving gradients and noise in the layout of server/videos, so every frame differs.
+    """
+    video_dir = os.path.join(WORK_DIR, VIDEO)
+    os.makedirs(video_dir)
+    width, height = size
+    writer = cv2.VideoWriter(os.path.join(video_dir, "video.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    x, y = np.meshgrid(np.arange(width), np.arange(height))
+    noise = np.random.default_rng(0).integers(0, 32, (height, width, 3), dtype=np.uint8)
+    for index in range(int(seconds * fps)):
+        frame = np.dstack([(x + index * 4) % 256, (y + index * 2) % 256, (x + y + index) % 256]).astype(np.uint8)
+        writer.write(frame + np.roll(noise, index, axis=1))
+    writer.release()
+    cv2.imwrite(os.path.join(video_dir, "img.jpg"), frame)
+    with open(os.path.join(video_dir, "video_type.txt"), "w") as file:
+        file.write("mp4")
+
+
+def play(depth: int, fps: float, seconds: float, seek_every: float, frames_amount: int) -> list:
+    """
+    :return: the seconds it took to serve every frame, playing at the fps with a seek every `seek_every` seconds
+    """
+    handler_module.ENCODE_AHEAD = depth
+    FRAME_CACHE.discard_video(VIDEO)
+    handler = BenchHandler(("bench", depth))
+    handler.handle_data([socket_functions.HELLO, [socket_functions.BINARY_PROTOCOL]])
+    handler.handle_data([socket_functions.ADK_FOR_VIDEO_DETAILS, VIDEO])
+    # not the source profile, so every frame is encoded
+    handler.handle_data([socket_functions.SET_PROFILE, "medium"])
+    handler.handle_data([socket_functions.START_STREAM, VIDEO, 0])
+
+    rng = random.Random(depth)
+    latencies = []
+    interval = 1 / fps
+    frames_per_seek = int(seek_every * fps)
+    due = time.perf_counter()
+    for frame in range(int(seconds * fps)):
+        if frame and frame % frames_per_seek == 0:
+            handler.handle_data([socket_functions.CHANGE_VIDEO_LOCATION, VIDEO,
+                                 rng.randrange(frames_amount - frames_per_seek)])
+        handler.handle_data([socket_functions.GRANT_CREDIT, 1])
+        started = time.perf_counter()
+        handler.push_frame()
+        latencies.append(time.perf_counter() - started)
+        due += interval
+        time.sleep(max(0.0, due - time.perf_counter()))
+    handler.handle_data([socket_functions.STOP_STREAM])
+    handler._disconnected()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--fps", type=float, default=25)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--seek-every", type=float, default=5)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, handler_module.ENCODE_AHEAD or 8])
+    args = parser.parse_args()
+
+    size = tuple(int(side) for side in args.size.split("x"))
+    try:
+        make_video(size, args.fps, args.seconds)
+        frames_amount = int(args.seconds * args.fps)
+        print(f"{args.size} at {args.fps:g} fps, {args.seconds:g} s, a seek every {args.seek_every:g} s, "
+              f"{ENCODE_POOL.workers} encode workers")
+        for depth in args.depths:
+            latencies = np.array(play(depth, args.fps, args.seconds, args.seek_every, frames_amount)) * 1000
+            p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+            label = "no read-ahead" if depth <= 0 else f"read-ahead {depth}"
+            print(f"{label:<16} frame ms: p50 {p50:7.2f}  p95 {p95:7.2f}  p99 {p99:7.2f}  "
+                  f"max {latencies.max():7.2f}")
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Time to render a decoded frame in the player window (offscreen): from the BGR array the video player hands out to
+the pixmap on the label, with the events it posts processed. Compares the previous render path (two colour
+conversions, a copy, `rgbSwapped` and placing the widgets on every frame) with `Window.show_img`.
+
+    python benchmarks/bench_render.py [video] [--frames N] [--sizes 640x360 1280x720 1920x1080]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from PyQt5.QtGui import QImage, QPixmap  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from videoplayer import VideoPlayer  # noqa: E402
+from gui import Window  # noqa: E402
+
+
+def read_frames(video_path: str, amount: int, size: tuple) -> list:
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < amount:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR))
+    return frames
+
+
+def previous_show_img(window: Window, img_array: np.ndarray) -> None:
+    """
+    :return: None. Show the frame the way the window did before: `get_frames` converted the frame to RGB,
+    `convert_numpy_array_to_qimage` converted it back and copied it, `rgbSwapped` copied it again, and the widgets
+    were placed on every frame.
+    """
+    rgb = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
+    array = np.array(cv2.cvtColor(rgb, cv2.COLOR_BGR2RGB))
+    height, width, _ = array.shape
+    pixmap = QPixmap(QImage(array, width, height, 3 * width, QImage.Format_RGB888).rgbSwapped())
+    window._Window__place_widgets(pixmap.width(), pixmap.height())
+    window.img_label.setPixmap(pixmap)
+
+
+def ms_per_frame(app: QApplication, show, frames: list) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        show(frame)
+        app.processEvents()
+    return (time.perf_counter() - start) * 1000 / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default=os.path.join(ROOT, "server", "videos", "IronMan", "video.mp4"))
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--sizes", nargs="+", default=["640x360", "1280x720", "1920x1080"])
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    video_player = VideoPlayer()
+    video_player.set_fps(25)
+    video_player.set_frames_amount(args.frames)
+    # the window only needs the client to seek and to send the display size, neither happens here
+    window = Window(None, video_player, "bench", None)
+    window.timer.stop()
+    window.show()
+
+    print(f"{'size':<12}{'previous ms':>13}{'show_img ms':>13}{'speedup':>9}")
+    for size in args.sizes:
+        width, height = map(int, size.split("x"))
+        frames = read_frames(args.video, args.frames, (width, height))
+        ms_per_frame(app, window.show_img, frames[:5])
+        previous = ms_per_frame(app, lambda frame: previous_show_img(window, frame), frames)
+        current = ms_per_frame(app, window.show_img, frames)
+        print(f"{size:<12}{previous:>13.2f}{current:>13.2f}{previous / current:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
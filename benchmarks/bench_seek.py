@@ -0,0 +1,98 @@
+"""
+Seek latency over random positions (half of them short jumps forward): a new capture for every seek (the old
+CHANGE_VIDEO_LOCATION), reusing the capture with CAP_PROP_POS_FRAMES, and reusing the capture with the seek index
+(grab forward or let the capture seek).
+Every seek is followed by reading the target frame, which is checked against a sequential decode.
+
+    python benchmarks/bench_seek.py [video] [--seeks N]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from ServerConfig import ALL_VIDEOS_DIRECTORIES, get_video_and_thumbnail_path  # noqa: E402
+from seek_index import SeekIndex, seek  # noqa: E402
+
+
+def reopen(video_path: str, state: dict, index: int) -> np.ndarray:
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    return cap.read()[1]
+
+
+def reuse(video_path: str, state: dict, index: int) -> np.ndarray:
+    cap = state.setdefault("cap", cv2.VideoCapture(video_path))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    return cap.read()[1]
+
+
+def with_seek_index(video_path: str, state: dict, index: int) -> np.ndarray:
+    cap = state.setdefault("cap", cv2.VideoCapture(video_path))
+    seek(cap, state.get("position", 0), index, state["seek_index"])
+    state["position"] = index + 1
+    return cap.read()[1]
+
+
+def checksums(video_path: str) -> list:
+    """
+    :return: a checksum of every frame, decoded one after the other
+    """
+    cap = cv2.VideoCapture(video_path)
+    sums = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            return sums
+        sums.append(int(frame.sum(dtype=np.int64)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", help="path of a video (default the first video of the server)")
+    parser.add_argument("--seeks", type=int, default=200)
+    args = parser.parse_args()
+
+    video_path = args.video
+    if video_path is None:
+        video_path = next(path for path, _ in map(get_video_and_thumbnail_path, ALL_VIDEOS_DIRECTORIES)
+                          if os.path.exists(path))
+
+    sums = checksums(video_path)
+    start = time.perf_counter()
+    seek_index = SeekIndex.build(video_path)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{video_path}: {len(sums)} frames, "
+          f"{len(seek_index) if seek_index else 'no'} keyframes (index built in {build_ms:.1f} ms)")
+
+    # slider drags: half of the seeks are short jumps forward
+    positions = []
+    for _ in range(args.seeks):
+        if positions and random.random() < 0.5:
+            positions.append(min(positions[-1] + random.randrange(1, 60), len(sums) - 1))
+        else:
+            positions.append(random.randrange(len(sums)))
+    methods = {"new capture": reopen, "reuse capture": reuse, "seek index": with_seek_index}
+    print(f"{'method':<15}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'wrong frames':>14}")
+    for name, method in methods.items():
+        state = {"seek_index": seek_index}
+        latencies = []
+        wrong = 0
+        for index in positions:
+            start = time.perf_counter()
+            frame = method(video_path, state, index)
+            latencies.append((time.perf_counter() - start) * 1000)
+            wrong += frame is None or int(frame.sum(dtype=np.int64)) != sums[index]
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{name:<15}{statistics.mean(latencies):>10.2f}{statistics.median(latencies):>10.2f}{p95:>10.2f}"
+              f"{wrong:>14}")
+
+
+if __name__ == "__main__":
+    main()
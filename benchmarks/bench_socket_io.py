@@ -0,0 +1,148 @@
+"""
+Memory allocated and time taken to send and to receive a frame over a loopback TCP connection, the previous socket
+I/O (the header and the payload joined into new bytes to send, the message received packet by packet into a growing
+bytearray) vs the current one (`send_buffers` hands the header and the frame to sendmsg as they are, `SocketReader`
+receives into one reused buffer with recv_into). The memory is the peak that `tracemalloc` sees above what was
+allocated before the frame, the mean over the frames. The times are taken while tracemalloc traces, compare them
+only with each other.
+
+    python benchmarks/bench_socket_io.py [--sizes 30000 200000 1000000] [--frames N]
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+import socket_functions  # noqa: E402
+from socket_functions import BINARY_PROTOCOL, HEADER_LENGTH, SocketReader, parse_header, unpack_data  # noqa: E402
+
+
+def previous_send(sock: socket.socket, data: list, protocol: int) -> None:
+    """
+    :return: None. Send the message the way it was sent before: the payload joined, then copied behind the header.
+    """
+    chunks = []
+    for arg in data[1:]:
+        socket_functions._pack_value(arg, chunks)
+    payload = b"".join(chunks)
+    header = socket_functions.BINARY_HEADER.pack(socket_functions.BINARY_MAGIC, protocol,
+                                                 socket_functions.OPCODES[data[0]], 0, len(payload))
+    sock.sendall(header + payload)
+
+
+def previous_read(sock: socket.socket) -> tuple:
+    """
+    :return: the message read the way it was read before: a new bytes object for every packet, extending a
+    bytearray.
+    """
+    header = bytearray()
+    while len(header) < HEADER_LENGTH:
+        packet = sock.recv(HEADER_LENGTH - len(header))
+        if not packet:
+            return False, None
+        header.extend(packet)
+    protocol, opcode, size = parse_header(header)
+    data = bytearray()
+    while len(data) < size:
+        packet = sock.recv(size - len(data))
+        if not packet:
+            raise ConnectionResetError("The socket was closed in the middle of a message")
+        data.extend(packet)
+    return True, unpack_data(data, protocol, opcode)
+
+
+def connected_pair() -> tuple:
+    """
+    :return: a tuple: (sender, receiver), the two ends of a loopback TCP connection
+    """
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        sender = socket.create_connection(server.getsockname())
+        receiver, _ = server.accept()
+    socket_functions.set_no_delay(sender)
+    return sender, receiver
+
+
+def drain(sock: socket.socket) -> None:
+    """
+    :return: None. Receive and throw away everything until the socket closes, without allocating.
+    """
+    buffer = memoryview(bytearray(1024 * 1024))
+    while sock.recv_into(buffer):
+        pass
+
+
+def measure(run_frame, frames: int) -> tuple:
+    """
+    :param run_frame: sends or receives one frame
+    :return: a tuple: (mean peak KB allocated for a frame, mean ms for a frame)
+    """
+    peaks = []
+    started = time.perf_counter()
+    for _ in range(frames):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run_frame()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    elapsed = time.perf_counter() - started
+    return sum(peaks) / len(peaks) / 1024, elapsed / frames * 1000
+
+
+def measure_send(send, message: list, frames: int) -> tuple:
+    sender, receiver = connected_pair()
+    thread = threading.Thread(target=drain, args=(receiver,), daemon=True)
+    thread.start()
+    try:
+        return measure(lambda: send(sender, message, BINARY_PROTOCOL), frames)
+    finally:
+        sender.close()
+        thread.join()
+        receiver.close()
+
+
+def measure_receive(make_read, message: list, frames: int) -> tuple:
+    sender, receiver = connected_pair()
+    packed = socket_functions.pack_data(message, BINARY_PROTOCOL)
+    thread = threading.Thread(target=lambda: [sender.sendall(packed) for _ in range(frames + 1)], daemon=True)
+    thread.start()
+    read = make_read(receiver)
+    try:
+        # the first message fills the buffer of the reader
+        read()
+        return measure(read, frames)
+    finally:
+        thread.join()
+        sender.close()
+        receiver.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30_000, 200_000, 1_000_000],
+                        help="bytes of an encoded frame")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    print(f"{'frame KB':>9}  {'':<8}{'previous KB':>13}{'current KB':>12}{'previous ms':>13}{'current ms':>12}")
+    for size in args.sizes:
+        message = [socket_functions.ASK_FOR_FRAME, os.urandom(size)]
+        rows = {
+            "send": (measure_send(previous_send, message, args.frames),
+                     measure_send(socket_functions.send_data_through_socket, message, args.frames)),
+            "receive": (measure_receive(lambda sock: lambda: previous_read(sock), message, args.frames),
+                        measure_receive(lambda sock: SocketReader(sock).read, message, args.frames)),
+        }
+        for how, ((previous_kb, previous_ms), (current_kb, current_ms)) in rows.items():
+            print(f"{size / 1024:>9.0f}  {how:<8}{previous_kb:>13.1f}{current_kb:>12.1f}{previous_ms:>13.3f}"
+                  f"{current_ms:>12.3f}")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+CPU of the server for a video watched together by N clients: as a watch party (the frames are read, encoded and
+packed once and written to every member) and as N separate streams of the same video (every client has its own
+session, read-ahead and credit). The clients are raw sockets that count the frames they get, the streams grant
+credit at the fps of the video so both play at the same pace. The CPU of the server (with its encode processes) is
+sampled from /proc while the clients play. The frames are in the frame cache of the server before the first run, so
+the runs differ only in the work of the sessions.
+
+    python benchmarks/bench_watch_party.py [--members 1 10 50 100] [--seconds S] [--size WxH] [--fps F]
+                                           [--mode threaded|asyncio]
+
+The clients run in this process, so on a machine with few cores they compete with the server for the CPU.
+"""
+import argparse
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from typing import List
+
+from load_test import make_videos, start_server, free_port, ServerMonitor
+import socket_functions
+from socket_functions import read_data_from_socket, send_data_through_socket
+
+# seconds the clients play before the CPU is measured, the read-ahead and the caches fill up
+WARMUP = 2
+# seconds between the grants of credit of the streams
+GRANT_INTERVAL = 0.2
+
+
+class Member:
+    """
+    A client that only counts the frames it gets (from a party or a stream).
+    """
+
+    def __init__(self, port: int):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        send_data_through_socket(self.sock, [socket_functions.HELLO, [socket_functions.BINARY_PROTOCOL]])
+        _, data = read_data_from_socket(self.sock)
+        self.protocol = data[1]
+        self.frames = 0
+        self.answer = None
+        self._answered = threading.Event()
+        threading.Thread(target=self.__listen, daemon=True).start()
+
+    def send(self, data: list) -> None:
+        send_data_through_socket(self.sock, data, self.protocol)
+
+    def ask(self, data: list) -> list:
+        """
+        :return: the answer of the server to a party request
+        """
+        self._answered.clear()
+        self.send(data)
+        if not self._answered.wait(10):
+            raise TimeoutError(f"no answer to {data[0]}")
+        return self.answer
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def __listen(self) -> None:
+        while True:
+            try:
+                ok, data = read_data_from_socket(self.sock)
+            except OSError:
+                return
+            if not ok:
+                return
+            if data[0] in (socket_functions.PARTY_FRAME, socket_functions.ASK_FOR_FRAME):
+                self.frames += 1
+            elif data[0] in (socket_functions.CREATE_PARTY, socket_functions.JOIN_PARTY):
+                self.answer = data
+                self._answered.set()
+
+
+def measure(server_pid: int, members: List[Member], seconds: float, play=None) -> tuple:
+    """
+    :param play: called every GRANT_INTERVAL while the members play, None to just wait
+    :return: a tuple: (the mean CPU percent of the server, the fps of the slowest member, the mean fps)
+    """
+    deadline = time.monotonic() + WARMUP
+    while time.monotonic() < deadline:
+        if play is not None:
+            play()
+        time.sleep(GRANT_INTERVAL)
+
+    monitor = ServerMonitor(server_pid)
+    before = [member.frames for member in members]
+    started = time.monotonic()
+    monitor.start()
+    deadline = started + seconds
+    while time.monotonic() < deadline:
+        if play is not None:
+            play()
+        time.sleep(GRANT_INTERVAL)
+    stats = monitor.stop()
+    elapsed = time.monotonic() - started
+    fps = [(member.frames - frames) / elapsed for member, frames in zip(members, before)]
+    return stats.get("cpu_percent_mean", float("nan")), min(fps), sum(fps) / len(fps)
+
+
+def run_party(port: int, server_pid: int, video: str, amount: int, seconds: float) -> tuple:
+    """
+    :return: the measures (see measure) of a party of `amount` members, the host is one of them
+    """
+    host = Member(port)
+    members = [host]
+    try:
+        party_id = host.ask([socket_functions.CREATE_PARTY, video])[1]
+        for _ in range(amount - 1):
+            member = Member(port)
+            members.append(member)
+            member.ask([socket_functions.JOIN_PARTY, party_id])
+        host.send([socket_functions.PARTY_CONTROL, socket_functions.PARTY_PLAY, 0])
+        return measure(server_pid, members, seconds)
+    finally:
+        for member in members:
+            member.close()
+
+
+def run_streams(port: int, server_pid: int, video: str, amount: int, seconds: float, fps: float) -> tuple:
+    """
+    :return: the measures (see measure) of `amount` clients streaming the video from its start on their own
+    """
+    members = [Member(port) for _ in range(amount)]
+    credit = max(1, round(fps * GRANT_INTERVAL))
+    try:
+        for member in members:
+            member.send([socket_functions.ADK_FOR_VIDEO_DETAILS, video])
+            # a second of the video ahead, like the lead of a party
+            member.send([socket_functions.START_STREAM, video, int(fps)])
+
+        def grant() -> None:
+            for client in members:
+                client.send([socket_functions.GRANT_CREDIT, credit])
+
+        return measure(server_pid, members, seconds, grant)
+    finally:
+        for member in members:
+            member.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--seconds", type=float, default=10, help="seconds the CPU is measured for every run")
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--fps", type=float, default=25)
+    parser.add_argument("--mode", choices=("threaded", "asyncio"), default="threaded")
+    args = parser.parse_args()
+
+    size = tuple(int(side) for side in args.size.split("x"))
+    video_seconds = WARMUP + args.seconds + 5
+    videos_dir = os.path.join(tempfile.gettempdir(),
+                              f"load-videos-1-{video_seconds:g}s-{args.fps:g}fps-{args.size}")
+    video = make_videos(videos_dir, 1, video_seconds, args.fps, size)[0]
+    work_dir = tempfile.mkdtemp(prefix="bench-party-")
+    server, port = start_server(videos_dir, os.path.join(work_dir, "db.sqlite3"), args.mode,
+                                os.path.join(work_dir, "server.log"), free_port())
+    try:
+        print(f"{args.size} at {args.fps:g} fps, {args.seconds:g} s per run, the {args.mode} server")
+        print(f"{'members':>8}  {'how':<8}{'server CPU %':>14}{'min fps':>10}{'mean fps':>10}")
+        runs = {"party": lambda amount: run_party(port, server.pid, video, amount, args.seconds),
+                "streams": lambda amount: run_streams(port, server.pid, video, amount, args.seconds, args.fps)}
+        # the frames are encoded once into the frame cache of the server, then all the runs take them from there
+        run_party(port, server.pid, video, 1, args.seconds)
+        for amount in args.members:
+            for how, run in runs.items():
+                cpu, slowest, mean = run(amount)
+                print(f"{amount:>8}  {how:<8}{cpu:>14.1f}{slowest:>10.2f}{mean:>10.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare the legacy wire protocol (pickle + decimal header) with the binary protocol:
+messages per second through a local socket pair and bytes on the wire for each message.
+
+    python benchmarks/bench_wire_protocol.py [--messages N] [--frame-size BYTES]
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+import socket_functions  # noqa: E402
+
+
+def messages(frame_size: int) -> dict:
+    """
+    :param frame_size: the size of the encoded frame in the frame message
+    :return: the messages we measure, by name
+    """
+    return {
+        "ask for frame": [socket_functions.ASK_FOR_FRAME, "Lord Of The Rings"],
+        "frame": [socket_functions.ASK_FOR_FRAME, os.urandom(frame_size)],
+        "video details": [socket_functions.ADK_FOR_VIDEO_DETAILS, (23.976, 171234.0)],
+    }
+
+
+def messages_per_second(message: list, protocol: int, amount: int) -> float:
+    """
+    :param message: the message to send
+    :param protocol: the wire protocol
+    :param amount: how many times to send the message
+    :return: how many messages were sent, received and decoded in a second
+    """
+    sender, receiver = socket.socketpair()
+
+    def send():
+        for _ in range(amount):
+            socket_functions.send_data_through_socket(sender, message, protocol)
+
+    thread = threading.Thread(target=send, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    for _ in range(amount):
+        socket_functions.read_data_from_socket(receiver)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    sender.close()
+    receiver.close()
+    return amount / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--frame-size", type=int, default=60000, help="size of a jpeg frame in bytes")
+    args = parser.parse_args()
+
+    protocols = {"legacy": socket_functions.LEGACY_PROTOCOL, "binary": socket_functions.BINARY_PROTOCOL}
+    print(f"{'message':<15}{'protocol':<10}{'bytes':>10}{'overhead':>10}{'msg/s':>12}")
+    for name, message in messages(args.frame_size).items():
+        for protocol_name, protocol in protocols.items():
+            size = len(socket_functions.pack_data(message, protocol))
+            overhead = size - len(message[-1]) if isinstance(message[-1], bytes) else size
+            rate = messages_per_second(message, protocol, args.messages)
+            print(f"{name:<15}{protocol_name:<10}{size:>10}{overhead:>10}{rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
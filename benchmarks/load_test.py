@@ -0,0 +1,675 @@
+"""
+Load test of the server with headless clients. Generates synthetic videos (cv2.VideoWriter), starts the server on
+them with an empty database, and runs clients that sign up, log in, list the videos and stream a video following a
+scripted pattern of playing, seeking and pausing. The clients speak the protocol of the real client (client.py) but
+never decode the frames, they play them against the playback clock.
+
+Reports per client: played fps, frame latency percentiles (from the credit for a frame to its arrival), stalls
+(the next frame was not there when it was due) and seek latency, and the CPU and RSS of the server (with its encode
+processes) and the time it spent in every stage of serving a frame (from its metrics exporter). The results are
+written as JSON so runs of different commits can be compared. With `--nodes` the clients connect to a redirector in
+front of several nodes (server/cluster.py), and the metrics are the totals of the nodes.
+
+    python benchmarks/load_test.py [--clients N] [--duration S] [--patterns watch zap pause mixed]
+                                   [--videos N] [--video-seconds S] [--size WxH] [--mode threaded|asyncio]
+                                   [--nodes N] [--output results.json]
+
+The server is measured through /proc, the CPU and RSS are left out on systems without it.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import deque
+from typing import List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+# the clients switch profiles often under load, keep their logs quiet
+os.environ.setdefault("ABR_LOG_LEVEL", "WARNING")
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import client as client_module  # noqa: E402
+from ClientConfig import BUFFER_MAX_FRAMES, CREDIT_BATCH  # noqa: E402
+from client import Client  # noqa: E402
+from playback_clock import PlaybackClock  # noqa: E402
+
+PLAY = "play"
+PAUSE = "pause"
+SEEK = "seek"
+# the steps of the patterns (seconds for play and pause), a client repeats its pattern until the run ends
+PATTERNS = {
+    "watch": [(PLAY, 10)],
+    "zap": [(PLAY, 3), (SEEK, None)],
+    "pause": [(PLAY, 5), (PAUSE, 2)],
+    "mixed": [(PLAY, 5), (SEEK, None), (PLAY, 5), (PAUSE, 2)],
+}
+# seconds to wait for an answer of the server before the client gives up
+ANSWER_TIMEOUT = 30
+# seconds between the samples of the CPU and the RSS of the server
+SAMPLE_INTERVAL = 1
+
+
+def make_videos(directory: str, amount: int, seconds: float, fps: float, size: tuple) -> List[str]:
+    """
+    :param directory: the directory of the videos, in the layout of server/videos
+    :return: the names of the videos. The videos are made once for every set of parameters and reused after.
+    Moving gradients and shapes with the index of the frame, so every frame differs like in a real video.
+    """
+    width, height = size
+    names = []
+    for video in range(amount):
+        name = f"synthetic-{video}"
+        names.append(name)
+        video_dir = os.path.join(directory, name)
+        if os.path.exists(os.path.join(video_dir, "video_type.txt")):
+            continue
+
+        os.makedirs(video_dir, exist_ok=True)
+        writer = cv2.VideoWriter(os.path.join(video_dir, "video.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        x, y = np.meshgrid(np.arange(width), np.arange(height))
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        for index in range(int(seconds * fps)):
+            shift = index * 4 + video * 50
+            frame[..., 0] = (x + shift) % 256
+            frame[..., 1] = (y + shift // 2) % 256
+            frame[..., 2] = (x + y + video * 80) % 256
+            center = (int(width / 2 + width / 3 * np.cos(index / 20)),
+                      int(height / 2 + height / 3 * np.sin(index / 15)))
+            cv2.circle(frame, center, height // 8, (255, 255, 255), -1)
+            cv2.putText(frame, f"{name} {index}", (10, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+            if index == 0:
+                cv2.imwrite(os.path.join(video_dir, "img.jpg"), frame)
+            writer.write(frame)
+        writer.release()
+        # written last, a video without it is made again
+        with open(os.path.join(video_dir, "video_type.txt"), "w") as file:
+            file.write("mp4")
+    return names
+
+
+def percentiles(values: list, points=(50, 95, 99)) -> dict:
+    """
+    :return: the percentiles and the max of the values (in ms when the values are seconds)
+    """
+    if not values:
+        return {}
+    values_ms = np.array(values) * 1000
+    result = {f"p{point}": round(float(np.percentile(values_ms, point)), 2) for point in points}
+    result["max"] = round(float(values_ms.max()), 2)
+    return result
+
+
+class HeadlessPlayer:
+    """
+    Takes the place of the VideoPlayer for the Client: keeps the encoded frames (only when they came) and never
+    decodes them. Calls `on_frame` with the arrival time of every frame.
+    """
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._frames = deque()
+        self.fps = None
+        self.frames_amount = None
+        self.received_frames = 0
+        self.received_bytes = 0
+        self.on_frame = None
+
+    def set_fps(self, fps: float) -> None:
+        with self._changed:
+            self.fps = fps
+            self._changed.notify_all()
+
+    def set_frames_amount(self, frames_amount: int) -> None:
+        with self._changed:
+            self.frames_amount = int(frames_amount)
+            self._changed.notify_all()
+
+    def set_resolution(self, width: int, height: int) -> None:
+        pass
+
+    def add_frame(self, frame) -> None:
+        now = time.monotonic()
+        with self._changed:
+            self._frames.append(now)
+            self.received_frames += 1
+            self.received_bytes += frame.size
+            if self.on_frame is not None:
+                self.on_frame(now)
+            self._changed.notify_all()
+
+    def buffered_frames(self) -> int:
+        return len(self._frames)
+
+    def capacity(self) -> int:
+        return BUFFER_MAX_FRAMES
+
+    def free_space(self) -> int:
+        return max(0, BUFFER_MAX_FRAMES - len(self._frames))
+
+    def take_frame(self) -> bool:
+        """
+        :return: bool. Take the next frame, False if there is none.
+        """
+        with self._changed:
+            if not self._frames:
+                return False
+            self._frames.popleft()
+            return True
+
+    def wait_for_frame(self, timeout: float) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self._frames, timeout)
+
+    def wait_for_video_details(self, timeout: float) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self.fps is not None and self.frames_amount is not None, timeout)
+
+    def empty(self) -> None:
+        with self._changed:
+            self._frames.clear()
+
+
+class LoadClient:
+    """
+    A headless client that plays a video following a pattern and measures what it got.
+    """
+
+    def __init__(self, number: int, port: int, pattern: str, deadline: float):
+        self._number = number
+        self._port = port
+        self._pattern = pattern
+        # the time (monotonic) the client stops
+        self._deadline = deadline
+        self._player = HeadlessPlayer()
+        self._player.on_frame = self.__frame_arrived
+        self._client: Optional[Client] = None
+        self._video = None
+        self._position = 0
+        # [time of the request, frames of the request that did not arrive yet] of the frames we asked for
+        self._requests = deque()
+        self._requests_lock = threading.Lock()
+        self._latencies = []
+        self._seek_latencies = []
+        self._played = 0
+        self._playing_seconds = 0.0
+        self._stalls = 0
+        self._stall_seconds = 0.0
+        self._loops = 0
+
+    def run(self) -> dict:
+        """
+        :return: the results of the client
+        """
+        result = {"client": self._number, "pattern": self._pattern}
+        try:
+            start = time.monotonic()
+            self.__connect()
+            first_frame = self.__move_to(0)
+            if first_frame is None:
+                raise TimeoutError("no frames from the server")
+            result["startup_s"] = round(first_frame - start, 3)
+            for action, seconds in itertools.cycle(PATTERNS[self._pattern]):
+                if time.monotonic() >= self._deadline:
+                    break
+                if action == PLAY:
+                    self.__play(seconds)
+                elif action == PAUSE:
+                    self.__pause(seconds)
+                else:
+                    self.__seek(random.randrange(max(1, self._player.frames_amount - 1)))
+            result["error"] = None
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+
+        elapsed = max(1e-9, time.monotonic() - start)
+        result.update({
+            "video": self._video,
+            "played_frames": self._played,
+            "fps": round(self._played / self._playing_seconds, 2) if self._playing_seconds else 0.0,
+            "received_frames": self._player.received_frames,
+            "received_kbps": round(self._player.received_bytes * 8 / 1000 / elapsed, 1),
+            "latency_ms": percentiles(self._latencies),
+            "stalls": self._stalls,
+            "stall_s": round(self._stall_seconds, 3),
+            "seeks": len(self._seek_latencies),
+            "seek_ms": percentiles(self._seek_latencies),
+            "loops": self._loops,
+        })
+        return result
+
+    def __connect(self) -> None:
+        """
+        :return: None. Sign up, log in, list the videos and choose one.
+        """
+        self._client = Client("127.0.0.1", self._port, self._player)
+        self._client.threaded_connect_and_listen_to_server()
+        username, password = f"load-{os.getpid()}-{self._number}", "load-test"
+        if not self._client.create_user(username, password) or not self._client.login(username, password):
+            raise RuntimeError("can't sign up and log in")
+        videos = list(self._client.ask_for_all_videos_available())
+        self._video = videos[self._number % len(videos)]
+        self._client.ask_for_video_details(self._video)
+        if not self._player.wait_for_video_details(ANSWER_TIMEOUT):
+            raise TimeoutError("no video details")
+
+    def __move_to(self, position: int) -> Optional[float]:
+        """
+        :param position: the frame to play from
+        :return: the arrival time of the first frame at the position, None if it did not come. Ask the server to
+        move, then start the stream there (the server drops the credit of the stream when it moves).
+        """
+        self._client.ask_for_new_location(self._video, position)
+        if not self._client.wait_for_new_location(ANSWER_TIMEOUT):
+            raise TimeoutError("the server did not move")
+        self._player.empty()
+        with self._requests_lock:
+            self._requests.clear()
+        self._position = position
+        if self._client.streaming:
+            self._client.start_stream(self._video)
+        self.__request_frames()
+        if not self._player.wait_for_frame(ANSWER_TIMEOUT):
+            return None
+        return time.monotonic()
+
+    def __request_frames(self) -> None:
+        """
+        :return: None. Ask for frames (grant credit) until the buffer could take no more, like the real client.
+        """
+        missing = self._player.free_space() - self._client.active_frames_requests
+        if missing < CREDIT_BATCH:
+            return
+        with self._requests_lock:
+            self._requests.append([time.monotonic(), missing])
+        if self._client.streaming:
+            self._client.grant_frames(missing)
+        else:
+            for _ in range(missing):
+                self._client.ask_for_frame(self._video)
+
+    def __frame_arrived(self, now: float) -> None:
+        with self._requests_lock:
+            if not self._requests:
+                return
+            request = self._requests[0]
+            self._latencies.append(now - request[0])
+            request[1] -= 1
+            if request[1] == 0:
+                self._requests.popleft()
+
+    def __play(self, seconds: float) -> None:
+        """
+        :return: None. Play the frames for the seconds at the fps of the video. When the next frame is not there
+        in time the playback stalls until it comes.
+        """
+        end = min(time.monotonic() + seconds, self._deadline)
+        clock = PlaybackClock(self._player.fps)
+        clock.start(self._position)
+        started = time.monotonic()
+        while time.monotonic() < end:
+            self.__request_frames()
+            if self._player.take_frame():
+                self._played += 1
+                self._position += 1
+                if self._position >= self._player.frames_amount - 1:
+                    # the end of the video, play it again
+                    self._loops += 1
+                    self.__move_to(0)
+                    clock.start(self._position)
+            else:
+                self._stalls += 1
+                stalled = time.monotonic()
+                self._player.wait_for_frame(max(0.0, end - stalled))
+                self._stall_seconds += time.monotonic() - stalled
+                clock.start(self._position)
+            time.sleep(min(clock.seconds_until(self._position), max(0.0, end - time.monotonic())))
+        self._playing_seconds += time.monotonic() - started
+
+    def __pause(self, seconds: float) -> None:
+        """
+        :return: None. Take no frames for the seconds, the buffer fills and the stream stops for lack of credit.
+        """
+        end = min(time.monotonic() + seconds, self._deadline)
+        while time.monotonic() < end:
+            self.__request_frames()
+            time.sleep(min(0.1, max(0.0, end - time.monotonic())))
+
+    def __seek(self, position: int) -> None:
+        start = time.monotonic()
+        first_frame = self.__move_to(position)
+        if first_frame is not None:
+            self._seek_latencies.append(first_frame - start)
+
+
+def run_clients(numbers: List[int], port: int, patterns: List[str], duration: float, ramp: float,
+                results: multiprocessing.Queue) -> None:
+    """
+    Runs in a process of clients.
+    :return: None. Run the clients (a thread each) and put their results in the queue.
+    """
+    # every process caches the catalog apart, the processes would write over each other
+    catalog_dir = tempfile.mkdtemp(prefix="load-catalog-")
+    client_module.CATALOG_CACHE_DIR = catalog_dir
+    process_results = []
+
+    def run_client(number: int) -> None:
+        time.sleep(ramp * number)
+        client = LoadClient(number, port, patterns[number % len(patterns)], time.monotonic() + duration)
+        process_results.append(client.run())
+
+    threads = [threading.Thread(target=run_client, args=(number,), daemon=True) for number in numbers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    shutil.rmtree(catalog_dir, ignore_errors=True)
+    for result in process_results:
+        results.put(result)
+
+
+class ServerMonitor:
+    """
+    Samples the CPU and the RSS of the server and its child processes (the encode pool) from /proc.
+    """
+
+    def __init__(self, pid: int):
+        self._pid = pid
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self._cpu_percent = []
+        self._rss_mb = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.__sample, daemon=True)
+
+    @property
+    def available(self) -> bool:
+        return os.path.exists(f"/proc/{self._pid}/stat")
+
+    def start(self) -> None:
+        if self.available:
+            self._thread.start()
+
+    def stop(self) -> dict:
+        """
+        :return: the mean and the max of the CPU (percent of a core) and the max of the RSS (MB)
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if not self._cpu_percent:
+            return {}
+        return {"cpu_percent_mean": round(float(np.mean(self._cpu_percent)), 1),
+                "cpu_percent_max": round(float(np.max(self._cpu_percent)), 1),
+                "rss_mb_max": round(float(np.max(self._rss_mb)), 1),
+                "samples": len(self._cpu_percent)}
+
+    def __processes(self) -> List[int]:
+        """
+        :return: the pids of the server and all the processes under it
+        """
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                stat = self.__read_stat(int(entry))
+                if stat is not None:
+                    parents.setdefault(int(stat[1]), []).append(int(entry))
+        pids, pending = [], [self._pid]
+        while pending:
+            pid = pending.pop()
+            pids.append(pid)
+            pending.extend(parents.get(pid, []))
+        return pids
+
+    @staticmethod
+    def __read_stat(pid: int) -> Optional[list]:
+        """
+        :return: the fields of /proc/pid/stat after the name of the process (state, ppid, ...), None if it is gone
+        """
+        try:
+            with open(f"/proc/{pid}/stat") as file:
+                return file.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+
+    def __usage(self) -> tuple:
+        """
+        :return: a tuple: (CPU seconds, RSS bytes) of the server and its processes
+        """
+        cpu_seconds = rss = 0
+        for pid in self.__processes():
+            stat = self.__read_stat(pid)
+            if stat is not None:
+                # utime and stime, and the resident pages
+                cpu_seconds += (int(stat[11]) + int(stat[12])) / self._ticks
+                rss += int(stat[21]) * self._page_size
+        return cpu_seconds, rss
+
+    def __sample(self) -> None:
+        last_cpu, _ = self.__usage()
+        last_time = time.monotonic()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            cpu, rss = self.__usage()
+            now = time.monotonic()
+            self._cpu_percent.append((cpu - last_cpu) / (now - last_time) * 100)
+            self._rss_mb.append(rss / 2 ** 20)
+            last_cpu, last_time = cpu, now
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(videos_dir: str, database_path: str, mode: str, log_path: str, metrics_port: int,
+                 nodes: int = 0) -> tuple:
+    """
+    :param nodes: 0 starts one server, otherwise a redirector and the nodes (their metrics at the next ports)
+    :return: a tuple: (the server process, its port). The server serves the videos of the directory, the users
+    are kept in the database.
+    """
+    port = free_port()
+    env = dict(os.environ, IP="127.0.0.1", PORT=str(port), VIDEOS_DIR=videos_dir, DATABASE_PATH=database_path,
+               LOG_LEVEL="INFO", METRICS_PORT=str(metrics_port))
+    if nodes:
+        command = [os.path.join(ROOT, "server", "cluster.py"), "--nodes", str(nodes), "--mode", mode]
+        # the clients connect to the redirector and then to a node
+        ports = [port] + [port + node for node in range(1, nodes + 1)]
+    else:
+        command = [os.path.join(ROOT, "server", "server.py"), "--mode", mode]
+        ports = [port]
+    server = subprocess.Popen([sys.executable] + command, env=env, stdout=subprocess.DEVNULL,
+                              stderr=open(log_path, "w"))
+    waiting = list(ports)
+    for _ in range(600):
+        try:
+            socket.create_connection(("127.0.0.1", waiting[0])).close()
+            waiting.pop(0)
+            if not waiting:
+                if nodes:
+                    # the nodes join the redirector with their first heartbeat, a second after they start
+                    time.sleep(2)
+                return server, port
+            continue
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError(f"The server did not start, see {log_path}")
+
+
+def scrape_metrics(metrics_port: int) -> Optional[dict]:
+    """
+    :param metrics_port: the port of the metrics exporter of the server
+    :return: the counters of the server and the count and the mean ms of every stage, None if the exporter did
+    not answer
+    """
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{metrics_port}/metrics", timeout=5) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    stages = {}
+    for name, value in samples.items():
+        if name.startswith("streaming_stage_seconds_count"):
+            stage = name[name.index('"') + 1:name.rindex('"')]
+            total = samples[f'streaming_stage_seconds_sum{{stage="{stage}"}}']
+            stages[stage] = {"count": int(value), "total_s": round(total, 3),
+                             "mean_ms": round(total * 1000 / value, 3) if value else 0.0}
+    counters = {name[len("streaming_"):-len("_total")]: int(value) for name, value in samples.items()
+                if name.endswith("_total")}
+    return {"stages": stages, "counters": counters}
+
+
+def merge_metrics(nodes_metrics: List[Optional[dict]]) -> Optional[dict]:
+    """
+    :param nodes_metrics: the metrics of every node (from `scrape_metrics`)
+    :return: the totals of the nodes that answered, None if none answered
+    """
+    answered = [metrics for metrics in nodes_metrics if metrics is not None]
+    if not answered:
+        return None
+    stages, counters = {}, {}
+    for metrics in answered:
+        for stage, timing in metrics["stages"].items():
+            total = stages.setdefault(stage, {"count": 0, "total_s": 0.0})
+            total["count"] += timing["count"]
+            total["total_s"] = round(total["total_s"] + timing["total_s"], 3)
+        for counter, amount in metrics["counters"].items():
+            counters[counter] = counters.get(counter, 0) + amount
+    for timing in stages.values():
+        timing["mean_ms"] = round(timing["total_s"] * 1000 / timing["count"], 3) if timing["count"] else 0.0
+    return {"stages": stages, "counters": counters, "nodes": len(answered)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(clients: list) -> dict:
+    ok = [client for client in clients if client["error"] is None]
+    latencies = [client["latency_ms"]["p95"] for client in ok if client["latency_ms"]]
+    return {
+        "clients": len(clients),
+        "failed": len(clients) - len(ok),
+        "fps_mean": round(float(np.mean([client["fps"] for client in ok])), 2) if ok else 0.0,
+        "fps_min": round(float(np.min([client["fps"] for client in ok])), 2) if ok else 0.0,
+        "latency_p95_ms_mean": round(float(np.mean(latencies)), 2) if latencies else None,
+        "stalls": sum(client["stalls"] for client in ok),
+        "stall_s": round(sum(client["stall_s"] for client in ok), 3),
+        "received_kbps": round(sum(client["received_kbps"] for client in ok), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--client-processes", type=int, default=min(4, os.cpu_count() or 1),
+                        help="the clients are spread over the processes, a thread each")
+    parser.add_argument("--duration", type=float, default=30, help="seconds every client plays")
+    parser.add_argument("--ramp", type=float, default=0.2, help="seconds between the starts of the clients")
+    parser.add_argument("--patterns", nargs="+", choices=sorted(PATTERNS), default=["watch", "zap", "pause", "mixed"],
+                        help="the patterns are given to the clients in turn")
+    parser.add_argument("--videos", type=int, default=2)
+    parser.add_argument("--video-seconds", type=float, default=60)
+    parser.add_argument("--fps", type=float, default=25)
+    parser.add_argument("--size", default="640x360")
+    parser.add_argument("--videos-dir", help="where the synthetic videos are made (and reused), a temp dir by default")
+    parser.add_argument("--mode", choices=("threaded", "asyncio"), default="threaded")
+    parser.add_argument("--nodes", type=int, default=0,
+                        help="run a redirector and this many nodes instead of one server (server/cluster.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test.json")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    size = tuple(map(int, args.size.split("x")))
+    videos_dir = args.videos_dir or os.path.join(
+        tempfile.gettempdir(), f"load-videos-{args.videos}-{args.video_seconds:g}s-{args.fps:g}fps-{args.size}")
+    print(f"Making the videos in {videos_dir}")
+    make_videos(videos_dir, args.videos, args.video_seconds, args.fps, size)
+
+    log_path = os.path.splitext(args.output)[0] + ".server.log"
+    database_dir = tempfile.mkdtemp(prefix="load-db-")
+    metrics_port = free_port()
+    server, port = start_server(videos_dir, os.path.join(database_dir, "db.sqlite3"), args.mode, log_path,
+                                metrics_port, args.nodes)
+    server_metrics = None
+    monitor = ServerMonitor(server.pid)
+    try:
+        monitor.start()
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_clients,
+                                             args=(list(range(args.clients))[index::args.client_processes], port,
+                                                   args.patterns, args.duration, args.ramp, results))
+                     for index in range(min(args.client_processes, args.clients))]
+        target = f"{args.nodes} {args.mode} nodes behind the redirector" if args.nodes else f"the {args.mode} server"
+        print(f"Running {args.clients} clients for {args.duration:g} s against {target} on port {port}")
+        for process in processes:
+            process.start()
+        clients = [results.get() for _ in range(args.clients)]
+        for process in processes:
+            process.join()
+        if args.nodes:
+            server_metrics = merge_metrics([scrape_metrics(metrics_port + node) for node in range(1, args.nodes + 1)])
+        else:
+            server_metrics = scrape_metrics(metrics_port)
+    finally:
+        server_stats = monitor.stop()
+        server.terminate()
+        server.wait()
+        shutil.rmtree(database_dir, ignore_errors=True)
+
+    clients.sort(key=lambda client: client["client"])
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "cores": os.cpu_count(),
+        "summary": summarize(clients),
+        "server": server_stats,
+        "server_metrics": server_metrics,
+        "clients": clients,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"{'client':<8}{'pattern':<8}{'fps':>7}{'lat p50':>9}{'lat p95':>9}{'lat p99':>9}{'stalls':>8}"
+          f"{'seeks':>7}{'seek p95':>10}  error")
+    for client in clients:
+        latency, seek = client["latency_ms"], client["seek_ms"]
+        print(f"{client['client']:<8}{client['pattern']:<8}{client['fps']:>7.2f}{latency.get('p50', 0):>9.1f}"
+              f"{latency.get('p95', 0):>9.1f}{latency.get('p99', 0):>9.1f}{client['stalls']:>8}{client['seeks']:>7}"
+              f"{seek.get('p95', 0):>10.1f}  {client['error'] or ''}")
+    print(f"summary: {report['summary']}")
+    print(f"server: {server_stats or 'not measured (no /proc)'}")
+    if server_metrics is not None:
+        for stage, timing in server_metrics["stages"].items():
+            print(f"server {stage:<10} {timing['count']:>8} x {timing['mean_ms']:>8.3f} ms "
+                  f"= {timing['total_s']:>8.3f} s")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
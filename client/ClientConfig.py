@@ -1,11 +1,73 @@
-import logging
-import os
-from dotenv import load_dotenv
-
-logging.basicConfig(level=logging.CRITICAL,
-                    format='%(asctime)s [%(levelname)s]: %(message)s')
-logger = logging.getLogger(__name__)
-
-load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
-SERVER_IP = os.environ.get('SERVER_IP')
-SERVER_PORT = int(os.environ.get('SERVER_PORT'))
+import logging
+import os
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.CRITICAL,
+                    format='%(asctime)s [%(levelname)s]: %(message)s')
+logger = logging.getLogger(__name__)
+# the decisions of the adaptive bitrate are logged even when the rest of the client is quiet
+abr_logger = logging.getLogger("abr")
+# the metrics of the decode pool, quiet unless DECODE_LOG_LEVEL asks for them
+decode_logger = logging.getLogger("decode")
+# the counters of the frames that were shown on time, late or dropped, quiet unless PLAYBACK_LOG_LEVEL asks for them
+playback_logger = logging.getLogger("playback")
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+SERVER_IP = os.environ.get('SERVER_IP')
+SERVER_PORT = int(os.environ.get('SERVER_PORT'))
+# seconds to wait for the server to answer HELLO before falling back to the legacy protocol
+HANDSHAKE_TIMEOUT = 2
+# the longest message the server may send (the catalog with its thumbnails is the longest), a longer header drops the
+# connection before anything is allocated for it
+MAX_MESSAGE_SIZE = int(os.environ.get('MAX_MESSAGE_SIZE', 64 * 1024 * 1024))
+# when the connection drops, how many times we connect again to resume the session and the seconds before the
+# first retry (doubled after every failure, up to RECONNECT_MAX_DELAY)
+RECONNECT_ATTEMPTS = int(os.environ.get('RECONNECT_ATTEMPTS', 10))
+RECONNECT_DELAY = 0.25
+RECONNECT_MAX_DELAY = 4
+# let the server push the frames (when it supports it) instead of asking for every frame
+STREAM_FRAMES = os.environ.get('STREAM_FRAMES', "1") == "1"
+# the smallest credit we grant to the server at once, we don't want a message for every frame
+CREDIT_BATCH = 10
+# where the catalog of videos and their thumbnails is cached between runs
+CATALOG_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".catalog_cache")
+# ask the server (when it supports it) to send only the tiles of a frame that changed since the previous frame
+DELTA_FRAMES = os.environ.get('DELTA_FRAMES', "0") == "1"
+# the codecs we ask the server for, the one we prefer first (see frame_codecs.py), and their parameters (empty is
+# the default of the codec)
+CODECS = [codec.strip() for codec in os.environ.get('CODECS', "jpeg").split(",")]
+CODEC_QUALITY = int(os.environ['CODEC_QUALITY']) if os.environ.get('CODEC_QUALITY') else None
+CODEC_SUBSAMPLING = os.environ.get('CODEC_SUBSAMPLING') or None
+# switch between the encoding profiles of the server by the measured goodput and the buffer level
+ADAPTIVE_BITRATE = os.environ.get('ADAPTIVE_BITRATE', "1") == "1"
+abr_logger.setLevel(os.environ.get('ABR_LOG_LEVEL', "INFO"))
+# how many frames the goodput is measured over
+GOODPUT_WINDOW_FRAMES = 20
+# step down when the buffer is below this part of its size and the link is too slow, step up above the other
+ABR_LOW_BUFFER = 0.3
+ABR_HIGH_BUFFER = 0.8
+# a profile is chosen only if it needs less than this part of the goodput
+ABR_SAFETY = 0.8
+# seconds between switches
+ABR_MIN_SWITCH_INTERVAL = 3
+# seconds between the logs of the delivered bitrate
+BITRATE_LOG_INTERVAL = 5
+# the buffer of the video player holds the encoded frames, up to this many frames and bytes
+BUFFER_MAX_FRAMES = int(os.environ.get('BUFFER_MAX_FRAMES', 250))
+BUFFER_MAX_BYTES = int(os.environ.get('BUFFER_MAX_BYTES', 32 * 1024 * 1024))
+# how many frames are decoded ahead of the frame that is shown
+DECODE_AHEAD = int(os.environ.get('DECODE_AHEAD', 8))
+# threads that decode the frames, 0 decodes them on the thread that adds or takes the frames
+DECODE_WORKERS = int(os.environ.get('DECODE_WORKERS', min(4, os.cpu_count() or 1)))
+decode_logger.setLevel(os.environ.get('DECODE_LOG_LEVEL', "WARNING"))
+# how many of the last frames the decode time is measured over, and seconds between the logs of the metrics
+DECODE_STATS_WINDOW = 200
+DECODE_STATS_INTERVAL = 5
+# a frame shown up to this many ms after its deadline is on time, and seconds between the logs of the counters
+LATE_FRAME_TOLERANCE_MS = float(os.environ.get('LATE_FRAME_TOLERANCE_MS', 5))
+PLAYBACK_STATS_INTERVAL = 5
+playback_logger.setLevel(os.environ.get('PLAYBACK_LOG_LEVEL', "WARNING"))
+# "host" hosts a watch party of the chosen video (the server tells its id), an id joins that watch party and empty
+# watches alone
+HOST_PARTY = "host"
+WATCH_PARTY = os.environ.get('WATCH_PARTY', "")
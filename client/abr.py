@@ -0,0 +1,169 @@
+import time
+from collections import deque
+from typing import List, Optional
+from ClientConfig import abr_logger, GOODPUT_WINDOW_FRAMES, ABR_LOW_BUFFER, ABR_HIGH_BUFFER, ABR_SAFETY, \
+    ABR_MIN_SWITCH_INTERVAL, BITRATE_LOG_INTERVAL
+
+
+class BitrateController:
+    """
+    Chooses the encoding profile of the frames (from the quality ladder of the server) by the goodput of the
+    connection and the level of the buffer of the video player. The goodput is measured only while the server is
+    sending frames one after the other, when the buffer is full the link is idle and tells nothing.
+    """
+
+    def __init__(self):
+        # (name, scale, quality) of every profile, from the best to the smallest
+        self._ladder: List[list] = []
+        self._current = 0
+        self._fps = 0.0
+        # (seconds since the previous frame, bytes) of the frames that came while the link was busy
+        self._samples = deque(maxlen=GOODPUT_WINDOW_FRAMES)
+        self._more_frames_coming = False
+        self._last_frame_time = 0.0
+        # the scale of the source resolution the client shows the frames in, the server never sends bigger frames
+        self._resolution = None
+        self._display_scale = None
+        self._goodput = None
+        # average bytes of a frame of every profile we used
+        self._bytes_per_frame = {}
+        self._last_switch = time.monotonic()
+        # what was delivered since the last log
+        self._delivered_bytes = 0
+        self._delivered_frames = 0
+        self._delivered_since = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self._ladder) > 1
+
+    @property
+    def profile(self) -> Optional[str]:
+        """
+        :return: the name of the current profile
+        """
+        return self._ladder[self._current][0] if self._ladder else None
+
+    def set_ladder(self, profiles: List[list], fps: float) -> None:
+        """
+        :param profiles: the quality ladder of the server, from the best profile to the smallest
+        :param fps: the fps of the video
+        """
+        current = self.profile
+        self._ladder = profiles
+        self._fps = fps
+        names = [profile[0] for profile in profiles]
+        self._current = names.index(current) if current in names else 0
+
+    def set_resolution(self, width: int, height: int) -> None:
+        self._resolution = (width, height)
+
+    def set_display_size(self, width: int, height: int) -> None:
+        """
+        :param width: the width the frames are shown in
+        :param height: the height the frames are shown in
+        :return: None. The server scales the frames down to the display size, the sizes we measured so far
+        do not hold anymore.
+        """
+        if self._resolution is None:
+            return
+        self._display_scale = max(width / self._resolution[0], height / self._resolution[1])
+        self._bytes_per_frame.clear()
+
+    def on_frame(self, frame_bytes: int, buffer_level: int, buffer_size: int, more_frames_coming: bool) -> \
+            Optional[str]:
+        """
+        :param frame_bytes: the size of the frame we got
+        :param buffer_level: how many frames are in the buffer of the video player
+        :param buffer_size: how many frames the buffer can hold
+        :param more_frames_coming: are we waiting for more frames (asked for them or granted credit)
+        :return: the name of the profile we should switch to, None to stay with the current profile.
+        """
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        self.__measure(now, frame_bytes, more_frames_coming)
+        self.__log_delivered(now)
+        if self._goodput is None or now - self._last_switch < ABR_MIN_SWITCH_INTERVAL:
+            return None
+
+        target = self._current
+        if buffer_level < buffer_size * ABR_LOW_BUFFER and self.__bitrate(self._current) > self._goodput:
+            # we play faster than we download, step down to the best profile the link can carry
+            target = len(self._ladder) - 1
+            for index in range(self._current + 1, len(self._ladder)):
+                if self.__bitrate(index) <= self._goodput * ABR_SAFETY:
+                    target = index
+                    break
+        elif buffer_level >= buffer_size * ABR_HIGH_BUFFER and self._current > 0 and \
+                self.__bitrate(self._current - 1) <= self._goodput * ABR_SAFETY:
+            target = self._current - 1
+
+        if target == self._current:
+            return None
+
+        abr_logger.info(f"Switching from {self.profile} to {self._ladder[target][0]}: "
+                        f"goodput {self._goodput / 1000:.0f} kbit/s, "
+                        f"needs {self.__bitrate(target) / 1000:.0f} kbit/s, buffer {buffer_level}/{buffer_size}.")
+        self.__log_delivered(now, force=True)
+        self._current = target
+        self._last_switch = now
+        return self.profile
+
+    def __measure(self, now: float, frame_bytes: int, more_frames_coming: bool) -> None:
+        """
+        :return: None. Update the goodput (bits per second) and the bytes per frame of the current profile.
+        """
+        name = self.profile
+        average = self._bytes_per_frame.get(name, frame_bytes)
+        self._bytes_per_frame[name] = 0.9 * average + 0.1 * frame_bytes
+        self._delivered_bytes += frame_bytes
+        self._delivered_frames += 1
+
+        if self._more_frames_coming:
+            # the time since the last frame is transfer time only if the link was not idle before this frame
+            self._samples.append((now - self._last_frame_time, frame_bytes))
+        self._last_frame_time = now
+        self._more_frames_coming = more_frames_coming
+
+        if len(self._samples) == self._samples.maxlen:
+            elapsed = sum(gap for gap, _ in self._samples)
+            if elapsed > 0:
+                self._goodput = sum(sample_bytes for _, sample_bytes in self._samples) * 8 / elapsed
+
+    def __bitrate(self, index: int) -> float:
+        """
+        :param index: the index of a profile in the ladder
+        :return: the bits per second needed to play the profile in real time. Estimated by the pixels from the
+        current profile when we did not use the profile yet.
+        """
+        name, scale, _ = self._ladder[index]
+        if name in self._bytes_per_frame:
+            frame_bytes = self._bytes_per_frame[name]
+        else:
+            _, current_scale, _ = self._ladder[self._current]
+            current_bytes = self._bytes_per_frame.get(self.profile, 0)
+            frame_bytes = current_bytes * (self.__frame_scale(scale) / self.__frame_scale(current_scale)) ** 2
+        return frame_bytes * 8 * self._fps
+
+    def __frame_scale(self, scale: float) -> float:
+        """
+        :param scale: the scale of a profile
+        :return: the scale the server sends the frames of the profile in
+        """
+        return scale if self._display_scale is None else min(scale, self._display_scale)
+
+    def __log_delivered(self, now: float, force: bool = False) -> None:
+        """
+        :return: None. Log the bitrate that was delivered with the current profile since the last log.
+        """
+        elapsed = now - self._delivered_since
+        if not force and elapsed < BITRATE_LOG_INTERVAL:
+            return
+        if self._delivered_frames and elapsed > 0:
+            abr_logger.info(f"Profile {self.profile}: delivered {self._delivered_bytes * 8 / 1000 / elapsed:.0f} "
+                            f"kbit/s, {self._delivered_frames / elapsed:.1f} fps.")
+        self._delivered_bytes = 0
+        self._delivered_frames = 0
+        self._delivered_since = now
@@ -1,193 +1,805 @@
-import functools
-import pickle
-import socket
-import time
-import threading
-from typing import List
-
-from ClientConfig import logger
-from videoplayer import VideoPlayer
-import socket_functions
-from socket_functions import read_data_from_socket, send_data_through_socket
-
-
-class Client:
-
-    def __init__(self, ip: str, port: int, video_player: VideoPlayer):
-        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._server_addr = (ip, port)
-        self._video_player = video_player
-        self._videos_names = []
-        self._active_frames_requests = 0
-        self._video_thumbnails = {}
-        self.server_ended_changing_video_position = False
-        self.created_user = None
-        self.logged_in = None
-
-    def threaded_connect_and_listen_to_server(self):
-        """
-        :return: None, create a thread which is listening to the server
-        """
-        logger.info(f"Connected to {self._server_addr}.")
-        self._sock.connect(self._server_addr)
-        print(self._server_addr)
-        threading.Thread(target=self.__listen_to_server, daemon=True).start()
-
-    def create_user(self, username: str, password: str) -> None:
-        """
-        :param username: the username which we create
-        :param password: the password of the username
-        :return: Asking for creating the username. Returns none.
-        """
-        send_data_through_socket(self._sock, [socket_functions.CREATE_USER, username, password])
-
-    def login(self, username: str, password: str):
-        """
-        :param username: the username which we want to login into.
-        :param password: the password of the username
-        :return: Asking for logging to the username. Returns none.
-        """
-        send_data_through_socket(self._sock, [socket_functions.LOGIN_USER, username, password])
-
-    def ask_for_all_videos_available(self) -> list:
-        """
-        :return: a list of all the videos available
-        """
-        send_data_through_socket(self._sock, [socket_functions.ASK_FOR_VIDEOS_AVAILABLE])
-        while not self._videos_names:  # while there are no videos
-            # wait for response from the server
-            time.sleep(0.001)
-        while len(self._video_thumbnails) != len(self._videos_names):  # waiting for the thumbnails
-            time.sleep(0.001)
-        return self._video_thumbnails
-
-    def ask_for_video_details(self, show: str):
-        """
-        :param show: the show we are asking its details
-        :return: None
-        """
-        send_data_through_socket(self._sock, [socket_functions.ADK_FOR_VIDEO_DETAILS, show])
-
-    def ask_for_frame(self, video: str) -> None:
-        """
-        Asking for the next frame at the video.
-        :param video: the video we are asking from the server.
-        :return: None. Just request the video.
-        """
-        send_data_through_socket(self._sock, [socket_functions.ASK_FOR_FRAME, video])
-        self._active_frames_requests += 1
-
-    def ask_for_new_location(self, vid_name: str, new_location: int):
-        """
-        Asking to change the location of the video. For example from the 101 frame to the 356 frame.
-        :param vid_name: the name of the video.
-        :param new_location: the new location we want.
-        :return: None. Just request it.
-        """
-        send_data_through_socket(self._sock, [socket_functions.CHANGE_VIDEO_LOCATION, vid_name, new_location])
-
-    def can_request_frame(self) -> bool:
-        """
-        :return: bool. Can we ask for more frames from the server.
-        """
-        have_space = self._active_frames_requests < self._video_player.MAX_FRAMES
-        return have_space and self._video_player.can_add_frame()
-
-    def __repr__(self):
-        return f"Active frames request: {self._active_frames_requests}."
-
-    def set_video_player(self, video_player: VideoPlayer):
-        """
-        :param video_player: VideoPlayer object
-        setting the VideoPlayer object.
-        """
-        self._video_player = video_player
-
-    def wait_for_getting_all_requested_frames(self):
-        while self._active_frames_requests != 0:
-            pass
-
-    def __listen_to_server(self):
-        """
-        This function needs to run in a thread. Infinite loop of listening to the server and handle with
-        data that server sent to the client.
-        """
-        while True:
-            try:
-                got_data, data = read_data_from_socket(self._sock, logger)
-            except pickle.UnpicklingError as e:
-                logger.error(e)
-                continue
-
-            if not got_data:
-                time.sleep(0.001)
-                continue
-
-            logger.debug(f"Got data from server")
-            self.__handle_data(data)
-
-    def __handle_data(self, data):
-        """
-        :param data: the data that the user sent
-        :return: None. Handle the data.
-        """
-        func = data[0]
-
-        switch = {
-            socket_functions.CREATE_USER: functools.partial(self.__ask_for_creating_user, data),
-            socket_functions.LOGIN_USER: functools.partial(self.__logged_in, data),
-            socket_functions.ASK_FOR_VIDEOS_AVAILABLE: functools.partial(self.__ask_for_videos_case, data),
-            socket_functions.ADK_FOR_VIDEO_DETAILS: functools.partial(self.__ask_for_details_case, data),
-            socket_functions.ASK_FOR_FRAME: functools.partial(self.__ask_for_frame_case, data),
-            socket_functions.CHANGE_VIDEO_LOCATION: self.__changed_video_location,
-            socket_functions.VIDEO_THUMBNAIL: functools.partial(self.__get_thumbnails, data)
-        }
-
-        switch[func]()
-
-    def __ask_for_creating_user(self, data: List):
-        added_user = data[1]
-        self.created_user = added_user
-
-    def __logged_in(self, data):
-        is_ok = data[1]
-        self.logged_in = is_ok
-
-    def __ask_for_videos_case(self, data: List):
-        """
-        :param data: the data the server send to the client. Have a list of all videos inside.
-        """
-        videos: List = data[1]
-        self._videos_names = videos
-
-    def __ask_for_details_case(self, data: List):
-        """
-        :param data: The data the server sent to the client. Have inside a tuple of fps and how many frames in
-        a video.
-        """
-        fps, frames_amount = data[1]
-        self._video_player.set_fps(fps)
-        self._video_player.set_frames_amount(frames_amount)
-
-    def __ask_for_frame_case(self, data: List):
-        """
-        :param data: The data the server sent to the client. Have inside the image encoded as bytes.
-        """
-        img_bytes = data[1]
-        img_frame = socket_functions.decode_img(img_bytes)
-        self._video_player.add_frame(img_frame)
-        self._active_frames_requests -= 1
-
-    def __changed_video_location(self):
-        # when the server said it ended changing the video location
-        self.server_ended_changing_video_position = True
-
-    def __get_thumbnails(self, data: List):
-        """
-        :param data: list of data which sent from the server. Have the video name and thumbnail image
-        encoded in bytes
-        """
-        vid = data[1]
-        encoded_img = data[2]
-        decoded_img = socket_functions.decode_img(encoded_img)
-        self._video_thumbnails[vid] = decoded_img
+import functools
+import json
+import os
+import pickle
+import socket
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from ClientConfig import logger, HANDSHAKE_TIMEOUT, STREAM_FRAMES, CATALOG_CACHE_DIR, ADAPTIVE_BITRATE, DELTA_FRAMES, \
+    CODECS, CODEC_QUALITY, CODEC_SUBSAMPLING, RECONNECT_ATTEMPTS, RECONNECT_DELAY, RECONNECT_MAX_DELAY, MAX_MESSAGE_SIZE
+from videoplayer import VideoPlayer, EncodedFrame
+from abr import BitrateController
+import socket_functions
+from frame_codecs import CODECS as AVAILABLE_CODECS, DEFAULT_CODEC
+from socket_functions import read_data_from_socket, send_data_through_socket, set_no_delay, SocketReader
+
+
+class Party(NamedTuple):
+    """
+    A watch party we are a member of.
+    """
+    party_id: str
+    video: str
+    # the frame the party continues at, and whether the host paused it
+    position: int
+    paused: bool
+    # we control the party
+    host: bool
+
+
+class Client:
+    """
+    The connection to the server. After a login the server gives a session token, when the connection drops the
+    client connects again and resumes the session with it: no login and no catalog, and the stream continues from
+    the frame after the last frame that arrived, so the frames in the buffer of the video player are kept.
+    The server may be a redirector in front of several nodes, then the client connects to the node the redirector
+    chooses, and moves its session (with the session token) to the node of a video when the video is chosen.
+    In a watch party the server sends the frames at the pace of the video to all the members (PARTY_FRAME) and we
+    don't ask for frames. The host plays, pauses and seeks for all the members (PARTY_CONTROL).
+    """
+
+    def __init__(self, ip: str, port: int, video_player: VideoPlayer):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server_addr = (ip, port)
+        # the redirector that chooses the node we connect to, None when we connect to a server directly
+        self._redirector_addr = None
+        self._protocol = socket_functions.LEGACY_PROTOCOL
+        self._server_capabilities = []
+        # messages are sent from the gui, the frames thread and the listener thread. Held while the session is
+        # resumed, so every message goes either before the drop or after the resume
+        self._send_lock = threading.RLock()
+        self._bitrate_controller = BitrateController()
+        self._display_size = None
+        # the codec the server encodes the frames with
+        self._codec = DEFAULT_CODEC
+        self._video_player = video_player
+        self._videos_names = []
+        self._active_frames_requests = 0
+        # notified whenever the amount of active frames requests changes
+        self._requests_changed = threading.Condition()
+        self._video_thumbnails = {}
+        self._catalog_received = threading.Event()
+        self._catalog = None
+        # set when the server answers a change of the location, and what to call then
+        self._location_changed = threading.Event()
+        self._on_location_changed = None
+        self._user_answer = threading.Event()
+        self.created_user = None
+        self.logged_in = None
+        self._stats_received = threading.Event()
+        self._stats = None
+        # what a resume of the session needs: the token, the video, the index of the next frame that will arrive,
+        # the location we asked for and whether we stream
+        self._session_token = None
+        self._video = None
+        self._next_frame = 0
+        self._requested_location = 0
+        self._streaming_video = None
+        self._resuming = False
+        # the location we asked for did not change on the server before the connection dropped
+        self._resume_completes_location = False
+        # the watch party we are a member of (None when we watch alone), the answer of the server when we create or
+        # join a party, and what to call when the host controls the party
+        self._party = None
+        self._party_answer = threading.Event()
+        self._on_party_control = None
+
+    def threaded_connect_and_listen_to_server(self):
+        """
+        :return: None, create a thread which is listening to the server
+        """
+        logger.info(f"Connected to {self._server_addr}.")
+        self.__connect()
+        print(self._server_addr)
+        threading.Thread(target=self.__listen_to_server, daemon=True).start()
+
+    def __connect(self, video: Optional[str] = None, node: Optional[tuple] = None) -> None:
+        """
+        :param video: the video of the session, a redirector sends us to the node of the video
+        :param node: the node the redirector already chose
+        :return: None. Connect the socket to the server and agree on the protocol, the delta frames and the codec.
+        When the server is a redirector connect to the node it chooses instead.
+        """
+        if self._redirector_addr is not None:
+            self._server_addr = node or self.__locate_node(video)
+        self._sock.connect(self._server_addr)
+        set_no_delay(self._sock)
+        self._protocol = self.__negotiate_protocol()
+        if socket_functions.REDIRECT_CAPABILITY in self._server_capabilities:
+            logger.info(f"{self._server_addr} is a redirector.")
+            self._redirector_addr = self._server_addr
+            self._sock.close()
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.__connect(video)
+            return
+        if DELTA_FRAMES and socket_functions.DELTA_CAPABILITY in self._server_capabilities:
+            self.__send([socket_functions.SET_DELTA_FRAMES, True])
+        if socket_functions.CODECS_CAPABILITY in self._server_capabilities:
+            self.__ask_for_codec()
+
+    def __locate_node(self, video: Optional[str]) -> tuple:
+        """
+        :param video: the video, None when no video was chosen yet
+        :return: the address of the node the redirector chose for the video. Raises ConnectionError when the
+        redirector has no node.
+        """
+        with socket.create_connection(self._redirector_addr, timeout=HANDSHAKE_TIMEOUT) as sock:
+            send_data_through_socket(sock, [socket_functions.HELLO, list(socket_functions.SUPPORTED_PROTOCOLS)])
+            got_data, data = read_data_from_socket(sock, logger, MAX_MESSAGE_SIZE)
+            if got_data:
+                send_data_through_socket(sock, [socket_functions.LOCATE_NODE, video], data[1])
+                got_data, data = read_data_from_socket(sock, logger, MAX_MESSAGE_SIZE)
+        if not got_data or data[2] is None:
+            raise ConnectionRefusedError(f"The redirector has no node for {video}")
+        return data[2], data[3]
+
+    def __move_to_node_of(self, video: str) -> None:
+        """
+        :param video: the chosen video
+        :return: None. Move the session to the node the redirector chooses for the video, the caches of that node
+        hold the frames of the video. The listener continues with the new connection. The session stays where it
+        is when the redirector can't be reached.
+        """
+        try:
+            node = self.__locate_node(video)
+        except OSError as e:
+            logger.warning(f"Can't ask the redirector for the node of {video}: {e}")
+            return
+        if node == self._server_addr:
+            return
+
+        logger.info(f"Moving the session to {node}, the node of {video}.")
+        with self._send_lock:
+            previous = self._sock
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.__connect(video, node)
+            if self._session_token is not None and socket_functions.RESUME_CAPABILITY in self._server_capabilities:
+                self._resume_completes_location = False
+                self.__send([socket_functions.RESUME_SESSION, self._session_token, video, 0, False])
+            self.__restore_session_state()
+        self.__shutdown_socket(previous)
+
+    def __negotiate_protocol(self) -> int:
+        """
+        :return: the wire protocol of the connection. A server which does not know HELLO will not answer, in that
+        case we connect again and use the legacy protocol.
+        """
+        send_data_through_socket(self._sock, [socket_functions.HELLO, list(socket_functions.SUPPORTED_PROTOCOLS)])
+        self._sock.settimeout(HANDSHAKE_TIMEOUT)
+        try:
+            got_data, data = read_data_from_socket(self._sock, logger, MAX_MESSAGE_SIZE)
+            if got_data and data[0] == socket_functions.HELLO:
+                self._sock.settimeout(None)
+                logger.info(f"Using protocol {data[1]}.")
+                self._server_capabilities = data[2]
+                return data[1]
+        except (socket.timeout, ConnectionError):
+            pass
+
+        logger.info("The server does not support HELLO, using the legacy protocol.")
+        self._sock.close()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.connect(self._server_addr)
+        set_no_delay(self._sock)
+        return socket_functions.LEGACY_PROTOCOL
+
+    def __send(self, data: list) -> None:
+        """
+        :param data: the data we send to the server
+        :return: None. Send the data with the protocol of the connection.
+        """
+        with self._send_lock:
+            try:
+                send_data_through_socket(self._sock, data, self._protocol)
+            except OSError as e:
+                if self._session_token is None or self._resuming:
+                    raise
+                # the listener resumes the session, it sends again what the server has to know
+                logger.warning(f"Lost the connection to the server: {e}")
+                self.__shutdown_socket()
+
+    def __shutdown_socket(self, sock: Optional[socket.socket] = None) -> None:
+        """
+        :param sock: the socket, the socket of the connection by default
+        :return: None. Wake up the listener, it sees the connection is gone.
+        """
+        try:
+            (sock or self._sock).shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def __ask_for_codec(self) -> None:
+        """
+        :return: None. Ask the server for the codecs we prefer that we can decode, the server answers with the
+        codec it chose.
+        """
+        codecs = [codec for codec in CODECS if codec in AVAILABLE_CODECS]
+        if codecs == [DEFAULT_CODEC] and CODEC_QUALITY is None and CODEC_SUBSAMPLING is None:
+            return
+        self.__send([socket_functions.SET_CODEC, codecs, {"quality": CODEC_QUALITY, "subsampling": CODEC_SUBSAMPLING}])
+
+    def create_user(self, username: str, password: str) -> bool:
+        """
+        :param username: the username which we create
+        :param password: the password of the username
+        :return: Asking for creating the username. Returns whether the user was created.
+        """
+        self._user_answer.clear()
+        self.__send([socket_functions.CREATE_USER, username, password])
+        self._user_answer.wait()
+        return self.created_user
+
+    def login(self, username: str, password: str) -> bool:
+        """
+        :param username: the username which we want to login into.
+        :param password: the password of the username
+        :return: Asking for logging to the username. Returns whether we logged in.
+        """
+        self._user_answer.clear()
+        self.__send([socket_functions.LOGIN_USER, username, password])
+        self._user_answer.wait()
+        return self.logged_in
+
+    def ask_for_all_videos_available(self) -> dict:
+        """
+        :return: a dict of all the videos available and their thumbnails
+        """
+        if socket_functions.CATALOG_CAPABILITY in self._server_capabilities:
+            return self.__ask_for_catalog()
+
+        self._catalog_received.clear()
+        self.__send([socket_functions.ASK_FOR_VIDEOS_AVAILABLE])
+        # wait for the videos and all their thumbnails
+        self._catalog_received.wait()
+        return self._video_thumbnails
+
+    def __ask_for_catalog(self) -> dict:
+        """
+        :return: a dict of all the videos available and their thumbnails. The catalog is cached on the disk, the
+        server sends it again only when it changed.
+        """
+        etag, videos, thumbnails = self.__load_catalog_cache()
+        self._catalog_received.clear()
+        self.__send([socket_functions.ASK_FOR_CATALOG, etag])
+        self._catalog_received.wait()
+
+        if self._catalog is not None:
+            etag, videos, thumbnails = self._catalog
+            self.__save_catalog_cache(etag, videos, thumbnails)
+        self._video_thumbnails = {video: socket_functions.decode_img(thumbnail)
+                                  for video, thumbnail in zip(videos, thumbnails)}
+        self._videos_names = videos
+        return self._video_thumbnails
+
+    @staticmethod
+    def __load_catalog_cache() -> tuple:
+        """
+        :return: a tuple: (etag, videos, encoded thumbnails) of the cached catalog, (None, [], []) if there is none.
+        """
+        try:
+            with open(os.path.join(CATALOG_CACHE_DIR, "catalog.json"), "r") as file:
+                cached = json.load(file)
+            thumbnails = []
+            for index in range(len(cached["videos"])):
+                with open(os.path.join(CATALOG_CACHE_DIR, f"{index}.jpg"), "rb") as file:
+                    thumbnails.append(file.read())
+            return cached["etag"], cached["videos"], thumbnails
+        except (OSError, ValueError, KeyError):
+            return None, [], []
+
+    @staticmethod
+    def __save_catalog_cache(etag: str, videos: list, thumbnails: list) -> None:
+        try:
+            os.makedirs(CATALOG_CACHE_DIR, exist_ok=True)
+            for index, thumbnail in enumerate(thumbnails):
+                with open(os.path.join(CATALOG_CACHE_DIR, f"{index}.jpg"), "wb") as file:
+                    file.write(thumbnail)
+            # the etag is written last, a broken cache is never used
+            with open(os.path.join(CATALOG_CACHE_DIR, "catalog.json"), "w") as file:
+                json.dump({"etag": etag, "videos": videos}, file)
+        except OSError as e:
+            logger.error(f"Can't cache the catalog: {e}")
+
+    def ask_for_video_details(self, show: str):
+        """
+        :param show: the show we are asking its details
+        :return: None
+        """
+        if self._redirector_addr is not None and self._party is None:
+            self.__move_to_node_of(show)
+        self.__send([socket_functions.ADK_FOR_VIDEO_DETAILS, show])
+
+    def ask_for_stats(self, timeout: float = HANDSHAKE_TIMEOUT) -> Optional[dict]:
+        """
+        :param timeout: seconds to wait for the answer
+        :return: the metrics of this session and the totals of the server ({"session": ..., "server": ...}): the
+        counters and the time of every stage of serving a frame. None if the server has no metrics or did not
+        answer in time.
+        """
+        if socket_functions.STATS_CAPABILITY not in self._server_capabilities:
+            return None
+        self._stats_received.clear()
+        self.__send([socket_functions.ASK_FOR_STATS])
+        if not self._stats_received.wait(timeout):
+            return None
+        return self._stats
+
+    @property
+    def party(self) -> Optional[Party]:
+        """
+        :return: the watch party we are a member of, None when we watch alone
+        """
+        return self._party
+
+    def create_party(self, video: str) -> Optional[Party]:
+        """
+        :param video: the video of the party
+        :return: a new watch party that we host, paused at the first frame. Others join it with its id. None when
+        the server has no watch parties or no such video.
+        """
+        if socket_functions.PARTY_CAPABILITY not in self._server_capabilities:
+            return None
+        if self._redirector_addr is not None:
+            # the party is where the frames of the video are cached
+            self.__move_to_node_of(video)
+        self._video = video
+        self._party_answer.clear()
+        self.__send([socket_functions.CREATE_PARTY, video])
+        self._party_answer.wait()
+        return self._party
+
+    def join_party(self, party_id: str) -> Optional[Party]:
+        """
+        :param party_id: the id of the party, from its host
+        :return: the watch party, None when the server has no such party. The frames of the party come right after
+        the answer.
+        """
+        if socket_functions.PARTY_CAPABILITY not in self._server_capabilities:
+            return None
+        self._party_answer.clear()
+        self.__send([socket_functions.JOIN_PARTY, party_id])
+        self._party_answer.wait()
+        return self._party
+
+    def leave_party(self) -> None:
+        if self._party is not None:
+            self._party = None
+            self.__send([socket_functions.LEAVE_PARTY])
+
+    def control_party(self, action: str, frame_index: int) -> None:
+        """
+        :param action: PARTY_PLAY, PARTY_PAUSE or PARTY_SEEK
+        :param frame_index: the frame the party continues at (the next frame we show, for a pause)
+        :return: None. Only the host controls the party. The server tells all the members, we too.
+        """
+        if self._party is not None and self._party.host:
+            self.__send([socket_functions.PARTY_CONTROL, action, frame_index])
+
+    def set_party_listener(self, on_control: Optional[Callable[[str, int], None]]) -> None:
+        """
+        :param on_control: called (from the thread of the client) with the action and the frame the party continues
+        at when the host played, paused or sought, after the buffer of the video player was emptied. PARTY_END when
+        the host left the party, then we watch alone again.
+        """
+        self._on_party_control = on_control
+
+    def ask_for_frame(self, video: str) -> None:
+        """
+        Asking for the next frame at the video.
+        :param video: the video we are asking from the server.
+        :return: None. Just request the video.
+        """
+        with self._send_lock:
+            self.__send([socket_functions.ASK_FOR_FRAME, video])
+            self.__change_active_requests(1)
+
+    @property
+    def streaming(self) -> bool:
+        """
+        :return: bool. Does the server push the frames (instead of answering a request for every frame).
+        """
+        return STREAM_FRAMES and socket_functions.STREAM_CAPABILITY in self._server_capabilities
+
+    def start_stream(self, video: str) -> None:
+        """
+        Asking the server to push the frames of the video from the current location. The server pushes only
+        as many frames as we granted with `grant_frames`. The server tells us the credit it drops when the stream
+        ends (at the end of the video, or when a stream replaces it).
+        :param video: the video we are asking from the server.
+        """
+        self._streaming_video = video
+        self.__send([socket_functions.START_STREAM, video, 0, True])
+
+    def grant_frames(self, amount: int) -> None:
+        """
+        :param amount: how many more frames the server may push.
+        :return: None. Give credit to the server.
+        """
+        with self._send_lock:
+            self.__send([socket_functions.GRANT_CREDIT, amount])
+            self.__change_active_requests(amount)
+
+    def stop_stream(self) -> None:
+        self._streaming_video = None
+        self.__send([socket_functions.STOP_STREAM])
+
+    def set_display_size(self, width: int, height: int) -> None:
+        """
+        Tell the server the size we show the frames in, the server scales the frames down to it before
+        encoding them.
+        :param width: the width of the shown frames
+        :param height: the height of the shown frames
+        """
+        if socket_functions.DISPLAY_SIZE_CAPABILITY not in self._server_capabilities or \
+                self._display_size == (width, height):
+            return
+        self._display_size = (width, height)
+        self._bitrate_controller.set_display_size(width, height)
+        self.__send([socket_functions.SET_DISPLAY_SIZE, width, height])
+
+    @property
+    def active_frames_requests(self) -> int:
+        """
+        :return: how many frames we asked for (or granted) and did not get yet.
+        """
+        return self._active_frames_requests
+
+    def __change_active_requests(self, amount: int) -> None:
+        with self._requests_changed:
+            self._active_frames_requests += amount
+            self._requests_changed.notify_all()
+
+    def ask_for_new_location(self, vid_name: str, new_location: int, on_changed: Optional[Callable[[], None]] = None):
+        """
+        Asking to change the location of the video. For example from the 101 frame to the 356 frame.
+        :param vid_name: the name of the video.
+        :param new_location: the new location we want.
+        :param on_changed: called (from the thread of the client) when the server changed the location, after
+        all the frames before the new location reached the video player.
+        :return: None. Just request it, see `wait_for_new_location`.
+        """
+        with self._send_lock:
+            self._location_changed.clear()
+            self._on_location_changed = on_changed
+            self._video = vid_name
+            self._requested_location = new_location
+            self.__send([socket_functions.CHANGE_VIDEO_LOCATION, vid_name, new_location])
+
+    def wait_for_new_location(self, timeout: float = None) -> bool:
+        """
+        :param timeout: the most seconds to wait
+        :return: bool. Wait until the server changed the location, False if it did not in time.
+        """
+        return self._location_changed.wait(timeout)
+
+    def can_request_frame(self) -> bool:
+        """
+        :return: bool. Can we ask for more frames from the server.
+        """
+        return self._active_frames_requests < self._video_player.free_space()
+
+    def __repr__(self):
+        return f"Active frames request: {self._active_frames_requests}."
+
+    def set_video_player(self, video_player: VideoPlayer):
+        """
+        :param video_player: VideoPlayer object
+        setting the VideoPlayer object.
+        """
+        self._video_player = video_player
+
+    def wait_for_getting_all_requested_frames(self):
+        with self._requests_changed:
+            self._requests_changed.wait_for(lambda: self._active_frames_requests == 0)
+
+    def __listen_to_server(self):
+        """
+        This function needs to run in a thread. Infinite loop of listening to the server and handle with
+        data that server sent to the client.
+        """
+        reader = None
+        while True:
+            # the connection is replaced with the send lock, when the session moves to another node
+            with self._send_lock:
+                sock = self._sock
+            if reader is None or reader.sock is not sock:
+                # the handshake of the connection was read before, the reader takes the messages after it
+                reader = SocketReader(sock, max_message_size=MAX_MESSAGE_SIZE)
+            try:
+                got_data, data = reader.read(logger)
+            except pickle.UnpicklingError as e:
+                logger.error(e)
+                continue
+            except OSError as e:
+                if sock is self._sock:
+                    logger.warning(f"Lost the connection to the server: {e}")
+                got_data = False
+
+            if not got_data and sock is not self._sock:
+                # the session moved to another node, continue with the new connection
+                sock.close()
+                continue
+            if not got_data:
+                if self.__resume_session():
+                    continue
+                logger.error("The server closed the connection.")
+                return
+
+            logger.debug(f"Got data from server")
+            self.__handle_data(data)
+
+    def __resume_session(self) -> bool:
+        """
+        :return: bool. Connect again and resume the session, False if there is no session to resume or the server
+        can't be reached. The server answers with RESUME_SESSION.
+        """
+        if self._session_token is None or self._video is None:
+            return False
+
+        delay = RECONNECT_DELAY
+        for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+            with self._send_lock:
+                self._resuming = True
+                try:
+                    self._sock.close()
+                    self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    # a redirector may send us to another node, when the node of the video is gone
+                    self.__connect(self._video)
+                    if socket_functions.RESUME_CAPABILITY not in self._server_capabilities:
+                        logger.error("The server can't resume the session.")
+                        return False
+                    self.__ask_to_resume()
+                    return True
+                except OSError as e:
+                    logger.warning(f"Reconnect attempt {attempt} failed: {e}")
+                finally:
+                    self._resuming = False
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        return False
+
+    def __ask_to_resume(self) -> None:
+        """
+        :return: None. Ask the server to continue the session from the next frame we did not get, or from the
+        location we asked for if the server did not change it yet. The credit and the requests of the dropped
+        connection are gone, the frames thread grants them again. Runs with the send lock.
+        """
+        self._resume_completes_location = not self._location_changed.is_set()
+        frame_index = self._requested_location if self._resume_completes_location else self._next_frame
+        logger.info(f"Resuming the session at frame {frame_index} of {self._video}.")
+        self.__send([socket_functions.RESUME_SESSION, self._session_token, self._video, frame_index,
+                     self._streaming_video is not None])
+        self.__restore_session_state()
+
+    def __restore_session_state(self) -> None:
+        """
+        :return: None. Tell a new connection what the previous connection knew, the requests of the previous
+        connection will never be answered. Runs with the send lock.
+        """
+        with self._requests_changed:
+            self._active_frames_requests = 0
+            self._requests_changed.notify_all()
+        if self._display_size is not None:
+            self.__send([socket_functions.SET_DISPLAY_SIZE, *self._display_size])
+        if self._bitrate_controller.profile is not None:
+            self.__send([socket_functions.SET_PROFILE, self._bitrate_controller.profile])
+
+    def __handle_data(self, data):
+        """
+        :param data: the data that the user sent
+        :return: None. Handle the data.
+        """
+        func = data[0]
+
+        switch = {
+            socket_functions.CREATE_USER: functools.partial(self.__ask_for_creating_user, data),
+            socket_functions.LOGIN_USER: functools.partial(self.__logged_in, data),
+            socket_functions.ASK_FOR_VIDEOS_AVAILABLE: functools.partial(self.__ask_for_videos_case, data),
+            socket_functions.ADK_FOR_VIDEO_DETAILS: functools.partial(self.__ask_for_details_case, data),
+            socket_functions.ASK_FOR_FRAME: functools.partial(self.__ask_for_frame_case, data),
+            socket_functions.CHANGE_VIDEO_LOCATION: functools.partial(self.__changed_video_location, data),
+            socket_functions.STOP_STREAM: functools.partial(self.__stream_stopped, data),
+            socket_functions.VIDEO_THUMBNAIL: functools.partial(self.__get_thumbnails, data),
+            socket_functions.ASK_FOR_CATALOG: functools.partial(self.__got_catalog, data),
+            socket_functions.CATALOG_NOT_MODIFIED: functools.partial(self.__got_catalog, None),
+            socket_functions.DELTA_FRAME: functools.partial(self.__delta_frame_case, data),
+            socket_functions.REPEAT_FRAME: self.__repeat_frame_case,
+            socket_functions.SET_CODEC: functools.partial(self.__codec_chosen, data),
+            socket_functions.ASK_FOR_STATS: functools.partial(self.__got_stats, data),
+            socket_functions.RESUME_SESSION: functools.partial(self.__resumed, data),
+            socket_functions.CREATE_PARTY: functools.partial(self.__party_created, data),
+            socket_functions.JOIN_PARTY: functools.partial(self.__party_joined, data),
+            socket_functions.PARTY_FRAME: functools.partial(self.__party_frame_case, data),
+            socket_functions.PARTY_CONTROL: functools.partial(self.__party_controlled, data)
+        }
+
+        switch[func]()
+
+    def __ask_for_creating_user(self, data: List):
+        added_user = data[1]
+        self.created_user = added_user
+        self._user_answer.set()
+
+    def __logged_in(self, data):
+        is_ok = data[1]
+        self.logged_in = is_ok
+        if len(data) > 2:  # servers that resume sessions
+            self._session_token = data[2]
+        self._user_answer.set()
+
+    def __resumed(self, data: List):
+        """
+        :param data: The data the server sent to the client. Whether the session was resumed, the new session token
+        and the location the session continues from.
+        """
+        if not data[1]:
+            logger.error("The server refused to resume the session.")
+            self._session_token = None
+            self.__shutdown_socket()
+            return
+        self._session_token = data[2]
+        logger.info(f"Resumed the session at frame {data[3]}.")
+        if self._party is not None:
+            # the party went on without the dropped connection, we watch alone from here
+            self.__party_controlled([socket_functions.PARTY_CONTROL, socket_functions.PARTY_END, self._next_frame])
+        if self._resume_completes_location:
+            self.__changed_video_location([socket_functions.CHANGE_VIDEO_LOCATION, data[3], 0])
+
+    def __party_created(self, data: List):
+        """
+        :param data: The data the server sent to the client. The id of the party, None when it can't be made.
+        """
+        self._party = None if data[1] is None else Party(data[1], self._video, 0, True, True)
+        self._party_answer.set()
+
+    def __party_joined(self, data: List):
+        """
+        :param data: The data the server sent to the client. The id of the party, its video (None when there is no
+        such party), the frame it continues at, whether it is paused and whether we are its host.
+        """
+        if data[2] is None:
+            self._party = None
+        else:
+            self._party = Party(*data[1:6])
+            self._video = data[2]
+            # the frames of the party come right after the answer
+            self._video_player.empty(data[3])
+            self._next_frame = data[3]
+        self._party_answer.set()
+
+    def __party_frame_case(self, data: List):
+        """
+        :param data: The data the server sent to the client. Have inside the index of the frame and the image encoded
+        as bytes, in the default codec.
+        """
+        index, img_bytes = data[1], data[2]
+        # the server drops the frames our socket could not take, the frame before them is shown in their place
+        for _ in range(index - self._next_frame):
+            self._video_player.add_frame(EncodedFrame(socket_functions.REPEAT_FRAME, DEFAULT_CODEC, (), 0))
+        self._video_player.add_frame(EncodedFrame(socket_functions.ASK_FOR_FRAME, DEFAULT_CODEC, (img_bytes,),
+                                                  len(img_bytes)))
+        self._next_frame = index + 1
+
+    def __party_controlled(self, data: List):
+        """
+        :param data: The data the server sent to the client. What the host did and the frame the party continues at.
+        """
+        action, frame_index = data[1], data[2]
+        if action == socket_functions.PARTY_END:
+            logger.info("The host left the watch party.")
+            self._party = None
+        else:
+            self._video_player.empty(frame_index)
+            self._next_frame = frame_index
+        if self._on_party_control is not None:
+            self._on_party_control(action, frame_index)
+
+    def __ask_for_videos_case(self, data: List):
+        """
+        :param data: the data the server send to the client. Have a list of all videos inside.
+        """
+        videos: List = data[1]
+        self._videos_names = videos
+        if not videos:
+            self._catalog_received.set()
+
+    def __got_catalog(self, data: List):
+        """
+        :param data: the data the server sent to the client. Have the etag, the videos and their encoded
+        thumbnails, None if the catalog we have is not modified.
+        """
+        self._catalog = None if data is None else data[1:]
+        self._catalog_received.set()
+
+    def __ask_for_details_case(self, data: List):
+        """
+        :param data: The data the server sent to the client. Have inside a tuple of fps and how many frames in
+        a video.
+        """
+        fps, frames_amount = data[1]
+        self._video_player.set_fps(fps)
+        self._video_player.set_frames_amount(frames_amount)
+        if len(data) > 2:  # servers that have a quality ladder
+            extra_details = data[2]
+            self._video_player.set_resolution(*extra_details["resolution"])
+            self._bitrate_controller.set_resolution(*extra_details["resolution"])
+            if ADAPTIVE_BITRATE and socket_functions.ABR_CAPABILITY in self._server_capabilities:
+                self._bitrate_controller.set_ladder(extra_details["profiles"], fps)
+
+    def __ask_for_frame_case(self, data: List):
+        """
+        :param data: The data the server sent to the client. Have inside the image encoded as bytes.
+        """
+        img_bytes = data[1]
+        self.__got_frame(EncodedFrame(socket_functions.ASK_FOR_FRAME, self._codec, (img_bytes,), len(img_bytes)))
+
+    def __delta_frame_case(self, data: List):
+        """
+        :param data: The data the server sent to the client. Have inside the tile size, the columns of the mosaic,
+        the indexes of the changed tiles and the mosaic of the changed tiles encoded as bytes.
+        """
+        self.__got_frame(EncodedFrame(socket_functions.DELTA_FRAME, self._codec, tuple(data[1:5]),
+                                      len(data[3]) + len(data[4])))
+
+    def __repeat_frame_case(self):
+        self.__got_frame(EncodedFrame(socket_functions.REPEAT_FRAME, self._codec, (), 0))
+
+    def __codec_chosen(self, data: List):
+        """
+        :param data: The data the server sent to the client. Have inside the codec and the parameters the server
+        encodes the next frames with.
+        """
+        self._codec = data[1]
+        logger.info(f"The server encodes the frames with {data[1]} {data[2]}.")
+
+    def __got_stats(self, data: List):
+        self._stats = {"session": data[1], "server": data[2]}
+        self._stats_received.set()
+
+    def __got_frame(self, frame: EncodedFrame):
+        """
+        :param frame: the frame we got, the video player decodes it just before it is shown
+        :return: None. Hand the frame to the video player and let the bitrate controller know.
+        """
+        self._video_player.add_frame(frame)
+        self._next_frame += 1
+        self.__change_active_requests(-1)
+
+        profile = self._bitrate_controller.on_frame(frame.size, self._video_player.buffered_frames(),
+                                                    self._video_player.capacity(), self._active_frames_requests > 0)
+        if profile is not None:
+            self.__send([socket_functions.SET_PROFILE, profile])
+
+    def __changed_video_location(self, data: List):
+        """
+        :param data: The data the server sent to the client. The new location and (from servers that stream)
+        how much credit of the stream the server dropped.
+        """
+        # when the server said it ended changing the video location
+        self._next_frame = data[1]
+        if len(data) > 2:
+            self.__change_active_requests(-data[2])
+        self._location_changed.set()
+        if self._on_location_changed is not None:
+            self._on_location_changed()
+
+    def __stream_stopped(self, data: List):
+        """
+        :param data: The data the server sent to the client. How much credit of the stream the server dropped, the
+        frames of that credit will never come.
+        """
+        self.__change_active_requests(-data[1])
+
+    def __get_thumbnails(self, data: List):
+        """
+        :param data: list of data which sent from the server. Have the video name and thumbnail image
+        encoded in bytes
+        """
+        vid = data[1]
+        encoded_img = data[2]
+        decoded_img = socket_functions.decode_img(encoded_img)
+        self._video_thumbnails[vid] = decoded_img
+        if len(self._video_thumbnails) == len(self._videos_names):
+            self._catalog_received.set()
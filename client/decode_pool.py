@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from ClientConfig import logger, decode_logger, DECODE_WORKERS, DECODE_STATS_WINDOW, DECODE_STATS_INTERVAL
+
+
+class DecodePool:
+    """
+    Decodes the frames in a pool of threads so the thread that reads the socket never waits for a decode, and
+    many frames are decoded at once. The decoded frames are released one at a time, strictly in the order they
+    were submitted (a delta frame needs the frame before it, and the player shows the frames in order).
+    Messages that have nothing to decode (like the answer to a seek) are submitted too so they keep their place.
+    """
+
+    def __init__(self, workers: int = DECODE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") if workers else None
+        # (future of the decode or None, release function) in the order of submit
+        self._in_order = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._max_pending = 0
+        self._decode_ms = deque(maxlen=DECODE_STATS_WINDOW)
+        self._decoded = 0
+        self._logged_at = time.monotonic()
+        if self._executor is not None:
+            threading.Thread(target=self.__release_in_order, daemon=True).start()
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: how many submitted messages were not released yet
+        """
+        return self._pending
+
+    def submit(self, decode: Optional[Callable[[], Any]], release: Callable[[Any], None]) -> None:
+        """
+        :param decode: decodes the frame in the pool and returns it, None when there is nothing to decode
+        :param release: gets what `decode` returned (None if there is nothing to decode or the decode failed),
+        called in the order of submit
+        """
+        if self._executor is None:
+            release(None if decode is None else self.__decode(decode))
+            self.__log_stats()
+            return
+
+        with self._lock:
+            self._pending += 1
+            self._max_pending = max(self._max_pending, self._pending)
+        future = None if decode is None else self._executor.submit(self.__decode, decode)
+        self._in_order.put((future, release))
+
+    def stats(self) -> dict:
+        """
+        :return: the decode time (ms) of the last frames and the depth of the queue
+        """
+        with self._lock:
+            decode_ms = sorted(self._decode_ms)
+            return {
+                "decoded": self._decoded,
+                "decode_ms_mean": round(sum(decode_ms) / len(decode_ms), 2) if decode_ms else 0.0,
+                "decode_ms_p95": round(decode_ms[int(len(decode_ms) * 0.95) - 1], 2) if decode_ms else 0.0,
+                "decode_ms_max": round(decode_ms[-1], 2) if decode_ms else 0.0,
+                "queue_depth": self._pending,
+                "max_queue_depth": self._max_pending,
+            }
+
+    def __decode(self, decode: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return decode()
+        except Exception as e:
+            logger.error(f"Can't decode a frame: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._decode_ms.append((time.perf_counter() - start) * 1000)
+                self._decoded += 1
+
+    def __release_in_order(self) -> None:
+        """
+        This function needs to run in a thread. Waits for the decode of the oldest message and releases it.
+        """
+        while True:
+            future, release = self._in_order.get()
+            try:
+                release(None if future is None else future.result())
+            except Exception as e:
+                logger.error(f"Can't release a frame: {e}")
+            with self._lock:
+                self._pending -= 1
+            self.__log_stats()
+
+    def __log_stats(self) -> None:
+        if time.monotonic() - self._logged_at >= DECODE_STATS_INTERVAL:
+            self._logged_at = time.monotonic()
+            decode_logger.info(f"Decode pool: {self.stats()}")
+
+    def __repr__(self):
+        return f"DecodePool({self.stats()})"
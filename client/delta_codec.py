@@ -0,0 +1,80 @@
+from typing import Optional
+import numpy as np
+from frame_ring import FrameRing
+
+
+class DeltaDecoder:
+    """
+    Rebuilds the frames from delta frames: the tiles that changed are patched into a canvas that holds the
+    previous frame. Every frame is written to a new array (the next array of the ring when there is one), the
+    frames that wait to be shown never change.
+    """
+
+    def __init__(self, ring: Optional[FrameRing] = None):
+        self._ring = ring
+        # the previous frame, padded to whole tiles after the first delta frame
+        self._canvas: Optional[np.ndarray] = None
+        # the height and the width of the frames (without the padding)
+        self._shape = None
+
+    def whole_frame(self, img_frame: np.ndarray) -> np.ndarray:
+        """
+        :param img_frame: numpy array, a frame that was sent whole
+        :return: the frame. The next delta frames are patched on it.
+        """
+        if self._ring is not None:
+            array = self._ring.next_array(img_frame.shape, img_frame.dtype)
+            np.copyto(array, img_frame)
+            img_frame = array
+        self._canvas = img_frame
+        self._shape = img_frame.shape[:2]
+        return img_frame
+
+    def reset(self) -> None:
+        """
+        :return: None. Forget the previous frame (after a seek the server sends a whole frame).
+        """
+        self._canvas = None
+        self._shape = None
+
+    def repeat_frame(self) -> Optional[np.ndarray]:
+        """
+        :return: the previous frame, None if there is no previous frame.
+        """
+        return None if self._canvas is None else self.__crop(self._canvas)
+
+    def delta_frame(self, tile: int, mosaic_columns: int, tiles_indexes: bytes, mosaic: np.ndarray) -> \
+            Optional[np.ndarray]:
+        """
+        :param tile: the side of a tile
+        :param mosaic_columns: how many tiles are in a row of the mosaic image
+        :param tiles_indexes: the indexes of the changed tiles, big endian uint16 (row * columns + column)
+        :param mosaic: numpy array, the decoded mosaic of the changed tiles
+        :return: the previous frame with the changed tiles, None if there is no previous frame.
+        """
+        if self._canvas is None or mosaic is None:
+            return None
+
+        height, width = self._shape
+        rows, columns = -(-height // tile), -(-width // tile)
+        canvas = self.__new_array((rows * tile, columns * tile) + self._canvas.shape[2:], self._canvas.dtype)
+        canvas[:height, :width] = self._canvas[:height, :width]
+
+        indexes = np.frombuffer(tiles_indexes, dtype=">u2")
+        mosaic_rows = mosaic.shape[0] // tile
+        tiles = mosaic.reshape(mosaic_rows, tile, mosaic_columns, tile, -1).swapaxes(1, 2) \
+            .reshape(mosaic_rows * mosaic_columns, tile, tile, -1)[:len(indexes)]
+        canvas_tiles = canvas.reshape(rows, tile, columns, tile, -1).swapaxes(1, 2)
+        canvas_tiles[indexes // columns, indexes % columns] = tiles
+
+        self._canvas = canvas
+        return self.__crop(canvas)
+
+    def __new_array(self, shape: tuple, dtype) -> np.ndarray:
+        if self._ring is None:
+            return np.empty(shape, dtype=dtype)
+        return self._ring.next_array(shape, dtype)
+
+    def __crop(self, canvas: np.ndarray) -> np.ndarray:
+        height, width = self._shape
+        return canvas[:height, :width]
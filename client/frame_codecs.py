@@ -0,0 +1,173 @@
+import io
+import struct
+import zlib
+from typing import Dict, NamedTuple, Optional
+import cv2
+import numpy as np
+from PIL import Image, features
+
+
+# the codec every client and server has, the pre-encoded archives and the thumbnails use it
+DEFAULT_CODEC = "jpeg"
+# chroma subsampling of the JPEG codecs, None is the default of the encoder
+SUBSAMPLINGS = ("4:4:4", "4:2:2", "4:2:0")
+
+
+class CodecSettings(NamedTuple):
+    """
+    How the frames of a session are encoded: the codec and its parameters (None is the default of the codec).
+    """
+    codec: str = DEFAULT_CODEC
+    quality: Optional[int] = None
+    subsampling: Optional[str] = None
+
+
+DEFAULT_SETTINGS = CodecSettings()
+
+
+class FrameCodec:
+    """
+    Encodes frames (numpy arrays) to bytes and back. A codec only has to give back the same array layout it got,
+    the frames of the capture are BGR and they stay BGR on the client.
+    """
+    name = None
+
+    def encode(self, img_array: np.ndarray, quality: Optional[int], subsampling: Optional[str]) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, img_bytes: bytes) -> np.ndarray:
+        raise NotImplementedError
+
+
+class PILJPEGCodec(FrameCodec):
+    name = DEFAULT_CODEC
+
+    def encode(self, img_array: np.ndarray, quality: Optional[int], subsampling: Optional[str]) -> bytes:
+        img_bytes = io.BytesIO()
+        options = {}
+        if quality is not None:
+            options["quality"] = quality
+        if subsampling is not None:
+            options["subsampling"] = subsampling
+        Image.fromarray(img_array).save(img_bytes, format="jpeg", **options)
+        return img_bytes.getvalue()
+
+    def decode(self, img_bytes: bytes) -> np.ndarray:
+        with Image.open(io.BytesIO(img_bytes)) as img:
+            return np.asarray(img)
+
+
+class CV2JPEGCodec(FrameCodec):
+    name = "cv2-jpeg"
+    _SAMPLING_FACTORS = {
+        "4:4:4": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_444", None),
+        "4:2:2": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_422", None),
+        "4:2:0": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420", None),
+    }
+
+    def encode(self, img_array: np.ndarray, quality: Optional[int], subsampling: Optional[str]) -> bytes:
+        params = []
+        if quality is not None:
+            params += [cv2.IMWRITE_JPEG_QUALITY, quality]
+        if subsampling is not None and self._SAMPLING_FACTORS[subsampling] is not None:
+            params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, self._SAMPLING_FACTORS[subsampling]]
+        ret, encoded = cv2.imencode(".jpg", img_array, params)
+        if not ret:
+            raise ValueError("cv2 can't encode the frame")
+        return encoded.tobytes()
+
+    def decode(self, img_bytes: bytes) -> np.ndarray:
+        return cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+class WebPCodec(FrameCodec):
+    name = "webp"
+
+    def encode(self, img_array: np.ndarray, quality: Optional[int], subsampling: Optional[str]) -> bytes:
+        img_bytes = io.BytesIO()
+        # WebP is always 4:2:0 when it is lossy. The fastest method, the frames are encoded live and the slower
+        # methods make the frames only a little smaller
+        Image.fromarray(img_array).save(img_bytes, format="webp", quality=80 if quality is None else quality,
+                                        method=0)
+        return img_bytes.getvalue()
+
+    def decode(self, img_bytes: bytes) -> np.ndarray:
+        with Image.open(io.BytesIO(img_bytes)) as img:
+            return np.asarray(img)
+
+
+class RawZlibCodec(FrameCodec):
+    """
+    Lossless: the pixels compressed with zlib. Big frames that are cheap to make, for a LAN.
+    """
+    name = "raw-zlib"
+    # height, width, channels
+    _HEADER = struct.Struct("!HHB")
+    _LEVEL = 1
+
+    def encode(self, img_array: np.ndarray, quality: Optional[int], subsampling: Optional[str]) -> bytes:
+        height, width = img_array.shape[:2]
+        channels = img_array.shape[2] if img_array.ndim == 3 else 1
+        pixels = np.ascontiguousarray(img_array, dtype=np.uint8)
+        return self._HEADER.pack(height, width, channels) + zlib.compress(pixels, self._LEVEL)
+
+    def decode(self, img_bytes: bytes) -> np.ndarray:
+        height, width, channels = self._HEADER.unpack_from(img_bytes)
+        pixels = zlib.decompress(memoryview(img_bytes)[self._HEADER.size:])
+        shape = (height, width, channels) if channels != 1 else (height, width)
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(shape)
+
+
+CODECS: Dict[str, FrameCodec] = {}
+
+
+def register_codec(codec: FrameCodec) -> None:
+    """
+    :param codec: a codec, its name is what the client asks for
+    :return: None. Make the codec available to the sessions.
+    """
+    CODECS[codec.name] = codec
+
+
+register_codec(PILJPEGCodec())
+register_codec(CV2JPEGCodec())
+if features.check("webp"):
+    register_codec(WebPCodec())
+register_codec(RawZlibCodec())
+
+
+def valid_settings(codec: str, quality, subsampling) -> CodecSettings:
+    """
+    :param codec: the name of a codec
+    :param quality: the quality the peer asked for
+    :param subsampling: the chroma subsampling the peer asked for
+    :return: the settings, the parameters that are not valid are replaced by the defaults of the codec.
+    """
+    if codec not in CODECS:
+        codec = DEFAULT_CODEC
+    if not isinstance(quality, int) or isinstance(quality, bool) or not 1 <= quality <= 100:
+        quality = None
+    if subsampling not in SUBSAMPLINGS:
+        subsampling = None
+    return CodecSettings(codec, quality, subsampling)
+
+
+def encode_frame(img_array: np.ndarray, settings: CodecSettings = DEFAULT_SETTINGS,
+                 quality: Optional[int] = None) -> bytes:
+    """
+    :param img_array: array of the image.
+    :param settings: the codec of the session and its parameters
+    :param quality: overrides the quality of the settings (the quality of an encoding profile)
+    :return: the encoded frame
+    """
+    codec = CODECS[settings.codec]
+    return codec.encode(img_array, settings.quality if quality is None else quality, settings.subsampling)
+
+
+def decode_frame(img_bytes: bytes, codec: str = DEFAULT_CODEC) -> np.ndarray:
+    """
+    :param img_bytes: the encoded frame
+    :param codec: the name of the codec the frame was encoded with
+    :return: the array of the image
+    """
+    return CODECS[codec].decode(img_bytes)
@@ -0,0 +1,34 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+class FrameRing:
+    """
+    Preallocated arrays that the decoded frames are written to, used in turn. An array is written again only
+    after all the other arrays were, so the ring must have more arrays than the frames that are alive at once
+    (decoded and waiting to be shown, shown, and being written).
+    An array is allocated again only when the size of the frames changes.
+    """
+
+    def __init__(self, slots: int):
+        self._arrays: List[Optional[np.ndarray]] = [None] * slots
+        self._next = 0
+
+    def next_array(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        :param shape: the shape of the frame
+        :param dtype: the type of the pixels
+        :return: the next array of the ring, its content is not defined
+        """
+        array = self._arrays[self._next]
+        if array is None or array.shape != shape or array.dtype != dtype:
+            array = self._arrays[self._next] = np.empty(shape, dtype=dtype)
+        self._next = (self._next + 1) % len(self._arrays)
+        return array
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: the bytes of all the arrays of the ring
+        """
+        return sum(array.nbytes for array in self._arrays if array is not None)
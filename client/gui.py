@@ -1,288 +1,416 @@
-import threading
-import time
-import numpy as np
-from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtGui import QPixmap
-from PyQt5.QtWidgets import QLabel, QPushButton, QSlider, QWidget
-from client import Client
-from videoplayer import VideoPlayer
-import image_functions
-
-
-PAUSE = "PAUSE"
-START = "START"
-
-
-def format_time(minutes: int, seconds: int) -> str:
-    """
-    :param minutes: int
-    :param seconds: int
-    :return: return formatted string at format "[minutes]:[seconds]"
-    """
-    min_str, sec_str = str(minutes), str(seconds)
-    min_str = min_str.zfill(2)
-    sec_str = sec_str.zfill(2)
-    return f"{min_str}:{sec_str}"
-
-
-class AskingForFrameThread(threading.Thread):
-
-    def __init__(self, client: Client, video_player: VideoPlayer, vid_name: str):
-        super(AskingForFrameThread, self).__init__()
-        # Make the thread under the control of the main thread.
-        # Therefore it will be stopped when the main thread will end.
-        self.daemon = True
-        self.client = client
-        self.video_player = video_player
-        self.vid_name = vid_name
-        #
-        self.__paused = False
-        self.__alive = True
-
-    def run(self) -> None:
-        """
-        This function executes when you starting the thread.
-        The functions ask frames from the server
-        """
-        while self.__alive:
-            if self.__paused:
-                continue
-
-            if self.video_player.can_add_frame() and self.client.can_request_frame():
-                self.client.ask_for_frame(self.vid_name)
-
-            # Wait a little
-            time.sleep(0.001)
-
-    def pause(self) -> None:
-        """
-        Pausing the request asking
-        :return:
-        """
-        self.__paused = True
-
-    def unpause(self):
-        """
-        Unpausing the request asking
-        :return:
-        """
-        self.__paused = False
-
-    def kill(self):
-        """
-        Kill the thread (Stopping the loop in the thread)
-        """
-        self.__alive = False
-
-
-class FrameSlider(QSlider):
-
-    def __init__(self, father_widget, video_player: VideoPlayer, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.__father_widget = father_widget
-        self.__video_player = video_player
-
-    def mousePressEvent(self, ev) -> None:
-        """
-        Executes when the user pressing the slider with the mouse.
-        When pressing the slider we pause the streaming because we want
-        to wait for the user to change the time of the video.
-        """
-        super().mousePressEvent(ev)
-        self.__father_widget.stream = False
-
-    def mouseReleaseEvent(self, ev) -> None:
-        """
-        Executes when releasing the mouse from the slider. Get the location that the user pressed
-        and then calculate the selected frame on that location. Than changing the frame to the selected
-        frame on the main window.
-        """
-        super().mouseReleaseEvent(ev)
-        # calculate the frame from the location on the slider
-        new_pos = self.value()
-        selected_frame = round(new_pos * self.__video_player.frames_amount / self.width())
-        self.__father_widget.change_video_frame(selected_frame)
-
-
-class Window(QWidget):
-
-    def __init__(self, client: Client, video_player: VideoPlayer, title: str, asking_frame_thread: AskingForFrameThread):
-        super().__init__()
-        self.__closed = False
-
-        self.client = client
-        self.video_player = video_player
-        self.asking_for_frame_thread = asking_frame_thread
-        self.setWindowTitle(title)
-
-        self.setGeometry(60, 60, 600, 6000)
-        # frames generator
-        self.frames = video_player.get_frames()
-        # timer for changing the frame
-        self.timer = QTimer()
-        self.delay = video_player.time_between_frames_ms
-        self.current_second = 0.0
-        self.last_second = 0.0
-        # img label, where the image will be shown
-        self.img_label = QLabel(self)
-        # buttons
-        self.pause_start_button = QPushButton(START, self)
-        # we streaming?
-        self.stream = True
-        # slider
-        self.frame_slider = FrameSlider(self, video_player, Qt.Horizontal, self)
-        self.slider_last_value = 0
-        # label for time
-        self.video_length_label = QLabel(self)
-        self.current_time_label = QLabel(self)
-        #
-        self.resize_slider = QSlider(Qt.Horizontal, self)
-
-        self.resize_text_label = QLabel(self)
-
-        self.current_frame = 0
-
-        self.initUI()
-
-    def initUI(self):
-        # slider "things" frames_amount
-        self.frame_slider.setFocusPolicy(Qt.NoFocus)
-        self.frame_slider.setFixedWidth(self.window().width())
-
-        # what happens when you click "pause"/"start"
-        self.pause_start_button.clicked.connect(self.pause_start_click)
-        # set labels text
-        self.video_length_label.setText(format_time(*self.video_player.video_length))
-        self.current_time_label.setText(format_time(0, 0))
-
-        self.resize_slider.setFocusPolicy(Qt.NoFocus)
-        self.resize_slider.setFixedWidth(100)
-        self.resize_slider.valueChanged.connect(self.resize_frame)
-        self.resize_slider.setRange(25, 115)
-        self.resize_slider.setValue(100)
-
-        self.resize_text_label.setText("Resize video: ")
-
-        self.timer.timeout.connect(self.timerEvent)
-        self.timer.start(self.delay)
-
-    def show_img(self, img_array: np.array):
-        """
-        :param img_array: numpy array.
-        :return: None. Show the image in the window
-        """
-        qimg = image_functions.convert_numpy_array_to_qimage(img_array)
-        pixmap = QPixmap(qimg)
-
-        width, height = pixmap.width(), pixmap.height()
-        self.img_label.resize(width, height)
-        self.resize(width, height + 100)
-
-        self.pause_start_button.move(0, height + 10)
-        y = self.pause_start_button.height() + height + 30
-
-        slider_width = width - 175
-        self.frame_slider.setFixedWidth(slider_width)
-        self.frame_slider.setRange(1, width - 175)
-        self.frame_slider.move(80, y)
-
-        self.resize_text_label.move(self.pause_start_button.x() + self.pause_start_button.width() + 20,
-                                    self.pause_start_button.y())
-
-        self.resize_slider.move(self.resize_text_label.x() + self.resize_text_label.width() + 20,
-                                self.pause_start_button.y())
-
-        self.current_time_label.move(self.frame_slider.x() - 60, y)
-        self.video_length_label.move(self.frame_slider.x() + self.frame_slider.width() + 30, y)
-        self.img_label.setPixmap(pixmap)
-
-    def timerEvent(self, e=None) -> None:
-        """
-        :param e: not used
-        :return: None. This function executed every n ms. Get the next frame and then show it on the gui.
-        In addition it changes the slider position according to the frame.
-        """
-        try:
-            if not self.stream:
-                return
-
-            img = next(self.frames)
-            self.show_img(img)
-            self.current_frame += 1
-            # change slider position
-            self.change_slider_position()
-
-            # update video timer labels
-            self.current_second += self.video_player.time_between_frames_ms / 1000
-            if int(self.last_second) != int(self.current_second):
-                minutes = int(self.current_second // 60)
-                sec = int(self.current_second % 60)
-                self.current_time_label.setText(format_time(minutes, sec))
-                # get rid from 1.000201 -> 1.0
-                self.current_second = float(int(self.current_second))
-                self.last_second = int(self.current_second)
-
-        except StopIteration:
-            self.end()
-            self.timer.stop()
-            return
-
-    def pause_start_click(self):
-        """
-        This function execute when the user press the "pause" / "start" button.
-        :return: None
-        """
-        button_state = self.pause_start_button.text()
-
-        if button_state == PAUSE:
-            self.pause_start_button.setText(START)
-        else:
-            self.pause_start_button.setText(PAUSE)
-
-        self.stream = not self.stream
-
-    def closeEvent(self, event) -> None:
-        """
-        :param event: event
-        :return: None. Execute before closing
-        """
-        super().closeEvent(event)
-        self.__closed = True
-
-    @property
-    def seconds_in_video(self):
-        min_in_videos, sec = self.video_player.video_length
-        return min_in_videos * 60 + sec
-
-    def end(self):
-        """
-        :return: None. Execute when the video ends.
-        """
-        self.img_label.setText("End of the selectd video !\n"
-                               "Go back to the menu if you would like to\n"
-                               "to see another video or this video again.")
-
-    def change_video_frame(self, new_frame_location: int):
-        self.stream = False
-        self.asking_for_frame_thread.pause()
-        self.client.ask_for_new_location(self.windowTitle(), new_frame_location)
-        while not self.client.server_ended_changing_video_position:
-            pass
-        self.client.server_ended_changing_video_position = False
-        self.video_player.empty(new_frame_location)
-        self.asking_for_frame_thread.unpause()
-        self.current_frame = new_frame_location
-        self.current_second = round(self.current_frame / self.video_player.time_between_frames_ms)
-        self.stream = True
-
-    def change_slider_position(self):
-        self.slider_last_value = self.frame_slider.value()
-        ratio = self.frame_slider.width() / self.video_player.frames_amount
-        new_position = int(ratio * self.current_frame)
-        self.frame_slider.setValue(new_position)
-
-    def resize_frame(self):
-        self.video_player.set_resize_scale(self.resize_slider.value())
-
-    def closed_window(self):
-        return self.__closed
+import threading
+import numpy as np
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QLabel, QPushButton, QSlider, QWidget
+from client import Client
+from ClientConfig import CREDIT_BATCH
+from socket_functions import PARTY_PLAY, PARTY_PAUSE, PARTY_SEEK, PARTY_END
+from videoplayer import VideoPlayer
+from playback_clock import PlaybackClock
+import image_functions
+
+
+PAUSE = "PAUSE"
+START = "START"
+
+
+def format_time(minutes: int, seconds: int) -> str:
+    """
+    :param minutes: int
+    :param seconds: int
+    :return: return formatted string at format "[minutes]:[seconds]"
+    """
+    min_str, sec_str = str(minutes), str(seconds)
+    min_str = min_str.zfill(2)
+    sec_str = sec_str.zfill(2)
+    return f"{min_str}:{sec_str}"
+
+
+class AskingForFrameThread(threading.Thread):
+    # the most seconds between two checks of the requests
+    CHANGE_TIMEOUT = 0.5
+
+    def __init__(self, client: Client, video_player: VideoPlayer, vid_name: str):
+        super(AskingForFrameThread, self).__init__()
+        # Make the thread under the control of the main thread.
+        # Therefore it will be stopped when the main thread will end.
+        self.daemon = True
+        self.client = client
+        self.video_player = video_player
+        self.vid_name = vid_name
+        #
+        # set while the thread may ask for frames
+        self.__unpaused = threading.Event()
+        self.__unpaused.set()
+        self.__alive = True
+
+    def run(self) -> None:
+        """
+        This function executes when you starting the thread.
+        The functions ask frames from the server. When the server pushes the frames we only
+        top up the credit of the stream as the video player drains its queue.
+        A thread that starts paused (the frames come from a watch party) asks for nothing until it is unpaused.
+        """
+        self.__unpaused.wait()
+        if not self.__alive:
+            return
+        streaming = self.client.streaming
+        if streaming:
+            self.client.start_stream(self.vid_name)
+
+        while self.__alive:
+            self.__unpaused.wait()
+            if not self.__alive:
+                break
+
+            if streaming:
+                missing = self.video_player.free_space() - self.client.active_frames_requests
+                if missing >= CREDIT_BATCH:
+                    self.client.grant_frames(missing)
+
+            elif self.video_player.can_add_frame() and self.client.can_request_frame():
+                self.client.ask_for_frame(self.vid_name)
+
+            # Wait until the video player takes or gets a frame. The timeout only covers the requests that the
+            # server dropped, they change without a change of the video player
+            self.video_player.wait_for_change(self.CHANGE_TIMEOUT)
+
+    def pause(self) -> None:
+        """
+        Pausing the request asking
+        :return:
+        """
+        self.__unpaused.clear()
+
+    def unpause(self):
+        """
+        Unpausing the request asking
+        :return:
+        """
+        self.__unpaused.set()
+
+    def kill(self):
+        """
+        Kill the thread (Stopping the loop in the thread)
+        """
+        self.__alive = False
+        self.__unpaused.set()
+        if self.client.streaming:
+            self.client.stop_stream()
+
+
+class FrameSlider(QSlider):
+
+    def __init__(self, father_widget, video_player: VideoPlayer, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__father_widget = father_widget
+        self.__video_player = video_player
+
+    def mousePressEvent(self, ev) -> None:
+        """
+        Executes when the user pressing the slider with the mouse.
+        When pressing the slider we pause the streaming because we want
+        to wait for the user to change the time of the video.
+        """
+        super().mousePressEvent(ev)
+        self.__father_widget.stream = False
+
+    def mouseReleaseEvent(self, ev) -> None:
+        """
+        Executes when releasing the mouse from the slider. Get the location that the user pressed
+        and then calculate the selected frame on that location. Than changing the frame to the selected
+        frame on the main window.
+        """
+        super().mouseReleaseEvent(ev)
+        # calculate the frame from the location on the slider
+        new_pos = self.value()
+        selected_frame = round(new_pos * self.__video_player.frames_amount / self.width())
+        self.__father_widget.change_video_frame(selected_frame)
+
+
+class Window(QWidget):
+    # emitted from the thread of the client when the server changed the location of the video
+    location_changed = pyqtSignal(int)
+    # emitted from the thread of the client when the host of the watch party played, paused or sought (or left)
+    party_controlled = pyqtSignal(str, int)
+
+    def __init__(self, client: Client, video_player: VideoPlayer, title: str, asking_frame_thread: AskingForFrameThread):
+        super().__init__()
+        self.__closed = False
+
+        self.client = client
+        self.video_player = video_player
+        self.asking_for_frame_thread = asking_frame_thread
+        self.setWindowTitle(title)
+
+        self.setGeometry(60, 60, 600, 6000)
+        # frames generator
+        self.frames = video_player.get_frames()
+        # timer for changing the frame, fired at the deadline of the next frame
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.delay = video_player.time_between_frames_ms
+        # when every frame should be shown
+        self.clock = PlaybackClock(video_player.fps)
+        self.current_second = 0
+        # img label, where the image will be shown
+        self.img_label = QLabel(self)
+        # the size of the frame the widgets are placed around
+        self.__frame_size = None
+        # buttons
+        self.pause_start_button = QPushButton(START, self)
+        # we streaming?
+        self.stream = True
+        # slider
+        self.frame_slider = FrameSlider(self, video_player, Qt.Horizontal, self)
+        self.slider_last_value = 0
+        # label for time
+        self.video_length_label = QLabel(self)
+        self.current_time_label = QLabel(self)
+        #
+        self.resize_slider = QSlider(Qt.Horizontal, self)
+
+        self.resize_text_label = QLabel(self)
+
+        self.current_frame = 0
+        # the host of the watch party we are a member of paused it
+        self.__party_paused = False
+
+        self.initUI()
+
+    def initUI(self):
+        # slider "things" frames_amount
+        self.frame_slider.setFocusPolicy(Qt.NoFocus)
+        self.frame_slider.setFixedWidth(self.window().width())
+
+        # what happens when you click "pause"/"start"
+        self.pause_start_button.clicked.connect(self.pause_start_click)
+        # set labels text
+        self.video_length_label.setText(format_time(*self.video_player.video_length))
+        self.current_time_label.setText(format_time(0, 0))
+
+        self.resize_slider.setFocusPolicy(Qt.NoFocus)
+        self.resize_slider.setFixedWidth(100)
+        self.resize_slider.setRange(25, 115)
+        self.resize_slider.setValue(100)
+        self.resize_slider.valueChanged.connect(self.resize_frame)
+        self.resize_frame()
+
+        self.resize_text_label.setText("Resize video: ")
+
+        self.timer.timeout.connect(self.timerEvent)
+        self.__play()
+        self.location_changed.connect(self.video_frame_changed)
+        self.party_controlled.connect(self.party_control_changed)
+        self.client.set_party_listener(self.party_controlled.emit)
+
+    def show_img(self, img_array: np.array):
+        """
+        :param img_array: numpy array (BGR).
+        :return: None. Show the image in the window, the widgets are placed again only when the size of the image
+        changed.
+        """
+        qimg = image_functions.convert_numpy_array_to_qimage(img_array)
+        pixmap = QPixmap.fromImage(qimg)
+
+        size = (pixmap.width(), pixmap.height())
+        if size != self.__frame_size:
+            self.__frame_size = size
+            self.__place_widgets(*size)
+        self.img_label.setPixmap(pixmap)
+
+    def __place_widgets(self, width: int, height: int):
+        """
+        :param width: the width of the frame
+        :param height: the height of the frame
+        :return: None. Place the widgets around a frame in this size.
+        """
+        self.img_label.resize(width, height)
+        self.resize(width, height + 100)
+
+        self.pause_start_button.move(0, height + 10)
+        y = self.pause_start_button.height() + height + 30
+
+        slider_width = width - 175
+        self.frame_slider.setFixedWidth(slider_width)
+        self.frame_slider.setRange(1, width - 175)
+        self.frame_slider.move(80, y)
+
+        self.resize_text_label.move(self.pause_start_button.x() + self.pause_start_button.width() + 20,
+                                    self.pause_start_button.y())
+
+        self.resize_slider.move(self.resize_text_label.x() + self.resize_text_label.width() + 20,
+                                self.pause_start_button.y())
+
+        self.current_time_label.move(self.frame_slider.x() - 60, y)
+        self.video_length_label.move(self.frame_slider.x() + self.frame_slider.width() + 30, y)
+
+    def timerEvent(self, e=None) -> None:
+        """
+        :param e: not used
+        :return: None. This function executed every n ms. Get the next frame and then show it on the gui.
+        In addition it changes the slider position according to the frame.
+        """
+        try:
+            if not self.stream:
+                return
+            if not self.video_player.has_frame():
+                if self.video_player.buffered_frames() == 0:
+                    # the frames did not come from the server yet, the playback waits for them instead of
+                    # dropping them
+                    self.clock.start(self.current_frame)
+                # don't block the gui while waiting for the next frame, look again soon
+                self.timer.start(self.delay // 2)
+                return
+
+            # the frames that are too late to show are dropped, the last decoded frame is always shown
+            while self.clock.is_late(self.current_frame) and self.video_player.decoded_frames() > 1:
+                self.video_player.drop_frame()
+                self.clock.dropped()
+                self.current_frame += 1
+
+            img = next(self.frames)
+            self.clock.presented(self.current_frame)
+            self.show_img(img)
+            self.current_frame += 1
+            # change slider position
+            self.change_slider_position()
+
+            # update video timer labels
+            current_second = int(self.current_frame / self.video_player.fps)
+            if current_second != self.current_second:
+                self.current_second = current_second
+                self.current_time_label.setText(format_time(current_second // 60, current_second % 60))
+
+            self.timer.start(round(self.clock.seconds_until(self.current_frame) * 1000))
+
+        except StopIteration:
+            self.end()
+            self.__pause()
+            return
+
+    def __play(self):
+        """
+        :return: None. Show the frames from the current frame on, the next frame is due now.
+        """
+        self.clock.start(self.current_frame)
+        self.timer.start(0)
+
+    def __pause(self):
+        """
+        :return: None. Stop showing the frames.
+        """
+        self.timer.stop()
+        self.clock.stop()
+
+    def pause_start_click(self):
+        """
+        This function execute when the user press the "pause" / "start" button.
+        :return: None
+        """
+        if self.client.party is not None:
+            # the host pauses the whole party, the window follows when the server tells all the members
+            self.client.control_party(PARTY_PAUSE if self.stream else PARTY_PLAY, self.current_frame)
+            return
+        button_state = self.pause_start_button.text()
+
+        if button_state == PAUSE:
+            self.pause_start_button.setText(START)
+        else:
+            self.pause_start_button.setText(PAUSE)
+
+        self.stream = not self.stream
+        # the timer does nothing while we don't stream
+        if self.stream:
+            self.__play()
+        else:
+            self.__pause()
+
+    def closeEvent(self, event) -> None:
+        """
+        :param event: event
+        :return: None. Execute before closing
+        """
+        super().closeEvent(event)
+        self.__closed = True
+
+    @property
+    def seconds_in_video(self):
+        min_in_videos, sec = self.video_player.video_length
+        return min_in_videos * 60 + sec
+
+    def end(self):
+        """
+        :return: None. Execute when the video ends.
+        """
+        self.img_label.setText("End of the selectd video !\n"
+                               "Go back to the menu if you would like to\n"
+                               "to see another video or this video again.")
+
+    def change_video_frame(self, new_frame_location: int):
+        """
+        :param new_frame_location: the frame the user selected
+        :return: None. Ask the server to change the location, `video_frame_changed` continues when it did.
+        The host of a watch party moves the whole party.
+        """
+        if self.client.party is not None:
+            self.client.control_party(PARTY_SEEK, new_frame_location)
+            return
+        self.stream = False
+        self.asking_for_frame_thread.pause()
+        self.client.ask_for_new_location(self.windowTitle(), new_frame_location,
+                                         lambda: self.location_changed.emit(new_frame_location))
+
+    def video_frame_changed(self, new_frame_location: int):
+        """
+        :param new_frame_location: the frame the server moved to
+        :return: None. Play the video from the new location.
+        """
+        self.video_player.empty(new_frame_location)
+        self.asking_for_frame_thread.unpause()
+        self.current_frame = new_frame_location
+        self.stream = True
+        self.__play()
+
+    def party_control_changed(self, action: str, frame_index: int):
+        """
+        :param action: what the host of the watch party did, PARTY_END when the host left
+        :param frame_index: the frame the party continues at
+        :return: None. Follow the host, the client already emptied the buffer of the video player. Only the host
+        can pause and seek. When the host left we watch alone from the frame we are at.
+        """
+        party = self.client.party
+        self.pause_start_button.setEnabled(party is None or party.host)
+        self.frame_slider.setEnabled(party is None or party.host)
+        if action == PARTY_END:
+            self.change_video_frame(self.current_frame)
+            return
+
+        if action != PARTY_SEEK:
+            self.__party_paused = action == PARTY_PAUSE
+        self.current_frame = frame_index
+        self.change_slider_position()
+        self.stream = not self.__party_paused
+        self.pause_start_button.setText(START if self.stream else PAUSE)
+        if self.stream:
+            self.__play()
+        else:
+            self.__pause()
+
+    def change_slider_position(self):
+        self.slider_last_value = self.frame_slider.value()
+        ratio = self.frame_slider.width() / self.video_player.frames_amount
+        new_position = int(ratio * self.current_frame)
+        self.frame_slider.setValue(new_position)
+
+    def resize_frame(self):
+        self.video_player.set_resize_scale(self.resize_slider.value())
+        display_size = self.video_player.display_size
+        if display_size is not None:
+            # the server sends the frames in the size we show them
+            self.client.set_display_size(*display_size)
+
+    def closed_window(self):
+        return self.__closed
@@ -1,74 +1,112 @@
-import sys
-from typing import Tuple
-from client import Client
-from videoplayer import VideoPlayer
-from dialogs import VideoDialog, HomePageDialog
-from gui import Window, AskingForFrameThread
-from ClientConfig import SERVER_IP, SERVER_PORT
-from PyQt5.QtWidgets import QApplication, QMessageBox, QWidget
-
-
-def make_client() -> Tuple[Client, VideoPlayer]:
-    """
-    :return: Create a video player and a client. Connect the client to the server. Returns a tuple of the objects.
-    """
-    video_player = VideoPlayer()
-    client = Client(SERVER_IP, SERVER_PORT, video_player)
-    client.threaded_connect_and_listen_to_server()
-
-    return client, video_player
-
-
-def make_window(client: Client, video_player: VideoPlayer, videos_dialog: VideoDialog) -> \
-        Tuple[Window, AskingForFrameThread]:
-    """
-    :param client: network client
-    :param video_player: video player
-    :param videos_dialog: videos dialog
-    :return: create the gui window and the frame thread and returns them as a tuple.
-    """
-    vid_name = videos_dialog.video_name()  # get the video that user chose from the videos dialog
-    client.ask_for_video_details(vid_name)
-    client.ask_for_new_location(vid_name, 0)  # set the location of the video at the start - 0
-
-    video_player.wait_for_video_details()
-    # create and starting the asking for frame thread
-    asking_frames_thread = AskingForFrameThread(client, video_player, vid_name)
-    asking_frames_thread.start()
-    # create the gui
-    win = Window(client, video_player, vid_name, asking_frames_thread)
-
-    return win, asking_frames_thread
-
-
-def main():
-    app = QApplication(sys.argv)
-    # create clients and get available videos
-    try:
-        client, video_player = make_client()
-    except ConnectionRefusedError:
-        # if there is not connection with the server (For example, the server is not running).
-        QMessageBox.about(QWidget(), "ERROR", "There is no server available.")
-        return
-    # create homepage for login and register
-    HomePageDialog(client)
-
-    # choose videos dialog
-    videos = client.ask_for_all_videos_available()
-    videos_dialog = VideoDialog(videos)
-
-    while True:
-        win, thread = make_window(client, video_player, videos_dialog)
-        win.show()
-
-        app.exec_()
-
-        videos_dialog = VideoDialog(videos)
-        thread.kill()
-        video_player.empty(0)
-
-    sys.exit(app.exec_())
-
-
-if __name__ == "__main__":
-    main()
+import sys
+from typing import Optional, Tuple
+from client import Client, Party
+from videoplayer import VideoPlayer
+from dialogs import VideoDialog, HomePageDialog
+from gui import Window, AskingForFrameThread
+from ClientConfig import SERVER_IP, SERVER_PORT, HOST_PARTY, WATCH_PARTY
+from socket_functions import PARTY_PLAY, PARTY_PAUSE
+from PyQt5.QtWidgets import QApplication, QMessageBox, QWidget
+
+
+def make_client() -> Tuple[Client, VideoPlayer]:
+    """
+    :return: Create a video player and a client. Connect the client to the server. Returns a tuple of the objects.
+    """
+    video_player = VideoPlayer()
+    client = Client(SERVER_IP, SERVER_PORT, video_player)
+    client.threaded_connect_and_listen_to_server()
+
+    return client, video_player
+
+
+def choose_video(client: Client, videos: dict, party_id: str) -> Tuple[str, Optional[Party]]:
+    """
+    :param client: network client
+    :param videos: the videos and their thumbnails
+    :param party_id: HOST_PARTY hosts a watch party of the chosen video, another id joins that party, empty watches
+    alone
+    :return: a tuple: (the video, the watch party or None). The video of a party we join is the video of the party,
+    otherwise the user chooses it in the videos dialog.
+    """
+    if party_id and party_id != HOST_PARTY:
+        party = client.join_party(party_id)
+        if party is not None:
+            return party.video, party
+        QMessageBox.about(QWidget(), "ERROR", f"There is no watch party {party_id}.")
+
+    vid_name = VideoDialog(videos).video_name()  # get the video that user chose from the videos dialog
+    if party_id != HOST_PARTY:
+        return vid_name, None
+    party = client.create_party(vid_name)
+    if party is None:
+        QMessageBox.about(QWidget(), "ERROR", "The server can't host a watch party.")
+    else:
+        QMessageBox.about(QWidget(), "Watch party", f"The others join the party with WATCH_PARTY={party.party_id}.")
+    return vid_name, party
+
+
+def make_window(client: Client, video_player: VideoPlayer, vid_name: str, party: Optional[Party]) -> \
+        Tuple[Window, AskingForFrameThread]:
+    """
+    :param client: network client
+    :param video_player: video player
+    :param vid_name: the video
+    :param party: the watch party we are a member of, None when we watch alone
+    :return: create the gui window and the frame thread and returns them as a tuple.
+    """
+    client.ask_for_video_details(vid_name)
+    if party is None:
+        client.ask_for_new_location(vid_name, 0)  # set the location of the video at the start - 0
+
+    video_player.wait_for_video_details()
+    # create and starting the asking for frame thread
+    asking_frames_thread = AskingForFrameThread(client, video_player, vid_name)
+    if party is not None:
+        # the party sends the frames, the thread asks for frames only if the host leaves
+        asking_frames_thread.pause()
+    asking_frames_thread.start()
+    # create the gui
+    win = Window(client, video_player, vid_name, asking_frames_thread)
+    if party is not None:
+        win.party_controlled.emit(PARTY_PAUSE if party.paused else PARTY_PLAY, party.position)
+
+    return win, asking_frames_thread
+
+
+def main():
+    app = QApplication(sys.argv)
+    # create clients and get available videos
+    try:
+        client, video_player = make_client()
+    except ConnectionRefusedError:
+        # if there is not connection with the server (For example, the server is not running).
+        QMessageBox.about(QWidget(), "ERROR", "There is no server available.")
+        return
+    # create homepage for login and register
+    HomePageDialog(client)
+
+    # choose videos dialog
+    videos = client.ask_for_all_videos_available()
+    party_id = WATCH_PARTY
+
+    while True:
+        vid_name, party = choose_video(client, videos, party_id)
+        if party_id != HOST_PARTY:
+            # after the party we joined, the user chooses the videos
+            party_id = ""
+        win, thread = make_window(client, video_player, vid_name, party)
+        win.show()
+
+        app.exec_()
+
+        client.set_party_listener(None)
+        client.leave_party()
+        thread.kill()
+        video_player.empty(0)
+
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import time
+from typing import Callable, Optional
+from ClientConfig import playback_logger, LATE_FRAME_TOLERANCE_MS, PLAYBACK_STATS_INTERVAL
+
+
+class PlaybackClock:
+    """
+    Maps the index of a frame to the wall clock time it should be shown at: the clock is started at a frame, and
+    every frame after it is due `1 / fps` seconds after the one before. The deadlines come from the index and not
+    from the time the previous frame was shown, so a slow frame does not push back the frames after it and
+    fractional frame rates (29.97) do not drift.
+    Counts the frames that were shown on time, shown late (after their deadline but before the next frame was due)
+    and dropped (the next frame was already due, they were never shown).
+    """
+
+    def __init__(self, fps: float, tolerance_ms: float = LATE_FRAME_TOLERANCE_MS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param fps: the frames per second of the video
+        :param tolerance_ms: a frame shown up to this many ms after its deadline is on time
+        :param clock: returns the current time in seconds
+        """
+        self._fps = fps
+        self._tolerance = tolerance_ms / 1000
+        self._clock = clock
+        # the time the frame the clock was started at is due, None while the clock is stopped
+        self._start_time: Optional[float] = None
+        self._start_frame = 0
+
+        self._on_time = 0
+        self._late = 0
+        self._dropped = 0
+        # how late (ms) the late frames were
+        self._late_ms = 0.0
+        self._logged_at = self._clock()
+
+    @property
+    def running(self) -> bool:
+        return self._start_time is not None
+
+    def start(self, frame_index: int) -> None:
+        """
+        :param frame_index: the next frame to show
+        :return: None. The frame is due now, the frames after it are due one after the other.
+        """
+        self._start_time = self._clock()
+        self._start_frame = frame_index
+
+    def stop(self) -> None:
+        """
+        :return: None. Stop the clock (paused, or waiting for a seek), `start` continues it.
+        """
+        self._start_time = None
+
+    def deadline(self, frame_index: int) -> float:
+        """
+        :param frame_index: the index of a frame in the video
+        :return: the time (of the clock) the frame should be shown at
+        """
+        return self._start_time + (frame_index - self._start_frame) / self._fps
+
+    def seconds_until(self, frame_index: int) -> float:
+        """
+        :param frame_index: the index of a frame in the video
+        :return: the seconds until the frame is due, 0 if it is already due
+        """
+        return max(0.0, self.deadline(frame_index) - self._clock())
+
+    def is_late(self, frame_index: int) -> bool:
+        """
+        :param frame_index: the index of a frame in the video
+        :return: bool. Is the frame after it already due (showing this frame is pointless).
+        """
+        return self._clock() >= self.deadline(frame_index + 1)
+
+    def presented(self, frame_index: int) -> None:
+        """
+        :param frame_index: the frame that is shown now
+        :return: None. Count the frame as on time or late.
+        """
+        lateness = self._clock() - self.deadline(frame_index)
+        if lateness > self._tolerance:
+            self._late += 1
+            self._late_ms += lateness * 1000
+        else:
+            self._on_time += 1
+        self.__log_stats()
+
+    def dropped(self, amount: int = 1) -> None:
+        """
+        :param amount: how many frames were dropped
+        :return: None. Count frames that were taken from the buffer without showing them.
+        """
+        self._dropped += amount
+
+    def stats(self) -> dict:
+        """
+        :return: the counters of the frames: on time, late and dropped
+        """
+        return {
+            "on_time": self._on_time,
+            "late": self._late,
+            "dropped": self._dropped,
+            "late_ms_mean": round(self._late_ms / self._late, 2) if self._late else 0.0,
+        }
+
+    def __log_stats(self):
+        now = self._clock()
+        if now - self._logged_at < PLAYBACK_STATS_INTERVAL:
+            return
+        self._logged_at = now
+        playback_logger.info(f"Playback: {self.stats()}")
@@ -1,128 +1,322 @@
-from collections import deque
-from typing import Tuple
-import cv2
-import numpy as np
-from ClientConfig import logger
-
-
-class VideoPlayer:
-    MAX_FRAMES = 50
-    __NOT_SET = -1
-
-    def __init__(self):
-        self._queue = deque()
-
-        self._frames_got_counter = 0
-        self._frames_played_counter = 0
-
-        self._time_between_frames_ms = self.__NOT_SET
-        self._frames_amount = self.__NOT_SET
-
-        self._no_frames_from_server = False
-
-        self.__scale_percent = 100
-
-    def add_frame(self, img: np.ndarray) -> None:
-        """
-        :param img: numpy array, the frame we add to the buffer
-        :return: None, add the frame to the buffer
-        """
-        frame = img
-        self._queue.append(frame)
-        self._frames_got_counter += 1
-
-    def end_of_frames_from_server(self):
-        """
-        :return: we will not get more frames
-        """
-        self._no_frames_from_server = True
-
-    def can_add_frame(self):
-        """
-        :return: bool, can we add more frames to the queue
-        """
-        return len(self._queue) < self.MAX_FRAMES
-
-    def get_frames(self):
-        """
-        :return: create generator that return the frames of the video
-        """
-        while not self.__is_end():
-            frame = self.__next_frame()
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            yield self.__resize_img(frame)
-
-            logger.debug(f"Frame {self._frames_played_counter}")
-
-    def __next_frame(self):
-        """
-        :return: numpy array, the next frame that shown in screen
-        """
-        while len(self._queue) == 0:
-            # waiting to get next frame from server
-            pass
-
-        self._frames_played_counter += 1
-        return self._queue.popleft()
-
-    def __is_end(self):
-        """
-        :return: bool, return True if the video ended, else return False
-        """
-        return self._frames_played_counter >= self._frames_amount-1
-
-    def set_fps(self, fps: int):
-        ms_in_sec = 1000
-        self._time_between_frames_ms = round(ms_in_sec / fps)
-
-    def set_frames_amount(self, frames_amount: int):
-        self._frames_amount = frames_amount
-
-    def wait_for_video_details(self):
-        while self.__NOT_SET in (self._time_between_frames_ms, self._frames_amount):
-            # wait for video details
-            pass
-
-    def __resize_img(self, img: np.ndarray):
-        scale_percent = self.__scale_percent  # percent of original size
-        width = int(img.shape[1] * scale_percent / 100)
-        height = int(img.shape[0] * scale_percent / 100)
-        dim = (width, height)
-        # resize the image
-        img = cv2.resize(img, dim, interpolation=cv2.INTER_AREA)
-        return img
-
-    def __repr__(self):
-        return f"frames available: {len(self._queue)}, frame shown: {self._frames_played_counter}" \
-               f", frames got: {self._frames_got_counter}"
-
-    @property
-    def time_between_frames_ms(self):
-        return self._time_between_frames_ms
-
-    @property
-    def frames_amount(self):
-        return int(self._frames_amount)
-
-    @property
-    def video_length(self) -> Tuple[int, int]:
-        """
-        :return: Tuple of integers. The length of the video, minutes and seconds.
-        """
-        frames_each_sec = 1000 / self.time_between_frames_ms
-        all_seconds = int(self.frames_amount / frames_each_sec)
-        minutes = all_seconds // 60
-        seconds = all_seconds % 60
-        return int(minutes), int(seconds)
-
-    def wait_for_buffer(self):
-        while len(self._queue) < self.MAX_FRAMES:
-            pass
-
-    def empty(self, frame_location: int):
-        self._queue = deque()
-        self._frames_got_counter = frame_location
-        self._frames_played_counter = frame_location
-
-    def set_resize_scale(self, val: int):
-        self.__scale_percent = val
+import functools
+import threading
+from collections import deque
+from typing import NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+from ClientConfig import logger, BUFFER_MAX_FRAMES, BUFFER_MAX_BYTES, DECODE_AHEAD
+import socket_functions
+from decode_pool import DecodePool
+from delta_codec import DeltaDecoder
+from frame_ring import FrameRing
+
+
+class EncodedFrame(NamedTuple):
+    """
+    A frame as it came from the server. It is decoded only a few frames before it is shown.
+    """
+    # ASK_FOR_FRAME (a whole frame), DELTA_FRAME or REPEAT_FRAME
+    kind: str
+    codec: str
+    # (img_bytes,) of a whole frame, (tile, mosaic columns, tiles indexes, img_bytes) of a delta frame
+    args: tuple
+    # the bytes of the encoded frame
+    size: int
+
+
+class VideoPlayer:
+    """
+    The buffer of the frames between the client (the producer) and the window (the consumer). Every change of
+    the buffer or the video details notifies the condition, the waits block on it instead of spinning.
+
+    The buffer holds the encoded frames, limited by frames and by bytes, so a deep buffer costs megabytes.
+    Only `DECODE_AHEAD` frames before the frame that is shown are decoded (in the decode pool), into the
+    arrays of a ring that are allocated once.
+    """
+    MAX_FRAMES = BUFFER_MAX_FRAMES
+    MAX_BYTES = BUFFER_MAX_BYTES
+    __NOT_SET = -1
+
+    def __init__(self):
+        # the encoded frames, and the decoded frames that are next to be shown
+        self._queue = deque()
+        self._decoded = deque()
+        # how many frames are in the decode pool, and the bytes of the encoded frames in the queue
+        self._decoding = 0
+        self._buffered_bytes = 0
+        # the average bytes of an encoded frame
+        self._frame_bytes = None
+        # changes when the buffer is emptied, frames that were decoding before are dropped
+        self._generation = 0
+        # a frame is alive while it is decoded ahead, shown, or written
+        self._ring = FrameRing(DECODE_AHEAD + 3)
+        self._delta_decoder = DeltaDecoder(self._ring)
+        self._decode_pool = DecodePool()
+        # reentrant, a decode pool without workers releases the frame inside `__decode_ahead`
+        self._changed = threading.Condition(threading.RLock())
+
+        self._frames_got_counter = 0
+        self._frames_played_counter = 0
+
+        self._time_between_frames_ms = self.__NOT_SET
+        self._fps = self.__NOT_SET
+        self._frames_amount = self.__NOT_SET
+
+        self._no_frames_from_server = False
+
+        self.__scale_percent = 100
+        # the resolution of the source video, the frames may come smaller (see abr.py)
+        self._resolution = None
+
+    def add_frame(self, frame: EncodedFrame) -> None:
+        """
+        :param frame: the encoded frame we add to the buffer
+        :return: None, add the frame to the buffer
+        """
+        with self._changed:
+            self._queue.append(frame)
+            self._buffered_bytes += frame.size
+            self._frames_got_counter += 1
+            if frame.kind != socket_functions.REPEAT_FRAME:
+                self._frame_bytes = frame.size if self._frame_bytes is None else \
+                    0.9 * self._frame_bytes + 0.1 * frame.size
+            self.__decode_ahead()
+            self._changed.notify_all()
+
+    def __decode_ahead(self) -> None:
+        """
+        :return: None. Hand the next encoded frames to the decode pool, until `DECODE_AHEAD` frames are decoded or
+        decoding. Called with the condition held.
+        """
+        while self._queue and len(self._decoded) + self._decoding < DECODE_AHEAD:
+            frame = self._queue.popleft()
+            self._buffered_bytes -= frame.size
+            self._decoding += 1
+            decode = None
+            if frame.kind != socket_functions.REPEAT_FRAME:
+                decode = functools.partial(socket_functions.decode_img, frame.args[-1], frame.codec)
+            self._decode_pool.submit(decode, functools.partial(self.__frame_decoded, frame, self._generation))
+
+    def __frame_decoded(self, frame: EncodedFrame, generation: int, img: Optional[np.ndarray]) -> None:
+        """
+        :param frame: the encoded frame
+        :param generation: the generation of the buffer when the frame was handed to the decode pool
+        :param img: numpy array, the decoded image (the mosaic of a delta frame), None if it could not be decoded
+        :return: None. Write the frame to the ring, called in the order of the frames.
+        """
+        with self._changed:
+            if generation != self._generation:
+                # the buffer was emptied while the frame was decoding
+                return
+            self._decoding -= 1
+
+            if frame.kind == socket_functions.ASK_FOR_FRAME:
+                img_frame = None if img is None else self._delta_decoder.whole_frame(img)
+            elif frame.kind == socket_functions.DELTA_FRAME:
+                img_frame = self._delta_decoder.delta_frame(*frame.args[:3], img)
+            else:
+                img_frame = self._delta_decoder.repeat_frame()
+
+            if img_frame is None:
+                logger.error("Lost a frame that could not be decoded.")
+                self._frames_played_counter += 1
+            else:
+                self._decoded.append(img_frame)
+            self.__decode_ahead()
+            self._changed.notify_all()
+
+    def end_of_frames_from_server(self):
+        """
+        :return: we will not get more frames
+        """
+        with self._changed:
+            self._no_frames_from_server = True
+            self._changed.notify_all()
+
+    def can_add_frame(self):
+        """
+        :return: bool, can we add more frames to the queue
+        """
+        return self.free_space() > 0
+
+    def buffered_frames(self) -> int:
+        """
+        :return: int, how many frames are in the buffer (encoded, decoding and decoded)
+        """
+        return len(self._queue) + self._decoding + len(self._decoded)
+
+    def free_space(self) -> int:
+        """
+        :return: int, how many more frames the buffer can take, by the frames and by the bytes (estimated with the
+        average size of a frame)
+        """
+        space = self.MAX_FRAMES - self.buffered_frames()
+        if self._frame_bytes:
+            space = min(space, int((self.MAX_BYTES - self._buffered_bytes) / self._frame_bytes))
+        return max(0, space)
+
+    def capacity(self) -> int:
+        """
+        :return: int, how many frames the buffer can hold with the current size of the frames
+        """
+        return self.buffered_frames() + self.free_space()
+
+    def decoded_frames(self) -> int:
+        """
+        :return: int, how many frames are decoded and ready to be shown
+        """
+        return len(self._decoded)
+
+    def drop_frame(self) -> None:
+        """
+        :return: None. Take the next frame without showing it (it is too late to show it).
+        """
+        self.__next_frame()
+
+    def has_frame(self) -> bool:
+        """
+        :return: bool, is the next frame decoded and ready to be shown
+        """
+        return len(self._decoded) > 0
+
+    def wait_for_change(self, timeout: float = None) -> None:
+        """
+        :param timeout: the most seconds to wait
+        :return: None. Wait until a frame is added to the queue or taken from it, or the queue is emptied.
+        """
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def get_frames(self):
+        """
+        :return: create generator that return the frames of the video. A frame is valid until the next frames are
+        decoded, show it before taking the next one.
+        """
+        while not self.__is_end():
+            # BGR, a view of an array of the ring when the frame is shown in the size it came
+            frame = self.__next_frame()
+            yield self.__resize_img(frame)
+
+            logger.debug(f"Frame {self._frames_played_counter}")
+
+    def __next_frame(self):
+        """
+        :return: numpy array, the next frame that shown in screen
+        """
+        with self._changed:
+            # waiting to get next frame from server
+            self._changed.wait_for(lambda: len(self._decoded) > 0)
+            self._frames_played_counter += 1
+            frame = self._decoded.popleft()
+            self.__decode_ahead()
+            self._changed.notify_all()
+        return frame
+
+    def __is_end(self):
+        """
+        :return: bool, return True if the video ended, else return False
+        """
+        return self._frames_played_counter >= self._frames_amount-1
+
+    def set_fps(self, fps: float):
+        ms_in_sec = 1000
+        with self._changed:
+            self._fps = fps
+            self._time_between_frames_ms = round(ms_in_sec / fps)
+            self._changed.notify_all()
+
+    def set_frames_amount(self, frames_amount: int):
+        with self._changed:
+            self._frames_amount = frames_amount
+            self._changed.notify_all()
+
+    def set_resolution(self, width: int, height: int):
+        self._resolution = (width, height)
+
+    def wait_for_video_details(self):
+        with self._changed:
+            # wait for video details
+            self._changed.wait_for(lambda: self.__NOT_SET not in (self._time_between_frames_ms, self._frames_amount))
+
+    def __resize_img(self, img: np.ndarray):
+        # the size is relative to the source video and not to the frame, the server may send smaller frames
+        dim = self.__display_size(img.shape[1], img.shape[0])
+        if dim == (img.shape[1], img.shape[0]):
+            # the server already sent the frame in the size we show
+            return img
+        # resize the image
+        img = cv2.resize(img, dim, interpolation=cv2.INTER_AREA)
+        return img
+
+    def __display_size(self, frame_width: int, frame_height: int) -> Tuple[int, int]:
+        """
+        :param frame_width: the width of the frame, used when the resolution of the source video is unknown
+        :param frame_height: the height of the frame, used when the resolution of the source video is unknown
+        :return: Tuple of integers. The width and the height the frames are shown in.
+        """
+        scale_percent = self.__scale_percent  # percent of original size
+        source_width, source_height = self._resolution or (frame_width, frame_height)
+        return int(source_width * scale_percent / 100), int(source_height * scale_percent / 100)
+
+    def __repr__(self):
+        return f"frames available: {self.buffered_frames()} ({self._buffered_bytes} bytes encoded, " \
+               f"{len(self._decoded)} decoded), frame shown: {self._frames_played_counter}" \
+               f", frames got: {self._frames_got_counter}"
+
+    @property
+    def buffered_bytes(self) -> int:
+        """
+        :return: the bytes of the buffer: the encoded frames and the arrays of the decoded frames
+        """
+        return self._buffered_bytes + self._ring.nbytes
+
+    @property
+    def time_between_frames_ms(self):
+        return self._time_between_frames_ms
+
+    @property
+    def fps(self) -> float:
+        return self._fps
+
+    @property
+    def display_size(self) -> Optional[Tuple[int, int]]:
+        """
+        :return: Tuple of integers. The width and the height the frames are shown in, None if the resolution of
+        the video is unknown.
+        """
+        if self._resolution is None:
+            return None
+        return self.__display_size(*self._resolution)
+
+    @property
+    def frames_amount(self):
+        return int(self._frames_amount)
+
+    @property
+    def video_length(self) -> Tuple[int, int]:
+        """
+        :return: Tuple of integers. The length of the video, minutes and seconds.
+        """
+        all_seconds = int(self.frames_amount / self.fps)
+        minutes = all_seconds // 60
+        seconds = all_seconds % 60
+        return int(minutes), int(seconds)
+
+    def wait_for_buffer(self):
+        with self._changed:
+            self._changed.wait_for(lambda: self.free_space() == 0)
+
+    def empty(self, frame_location: int):
+        with self._changed:
+            self._queue = deque()
+            self._decoded = deque()
+            self._decoding = 0
+            self._buffered_bytes = 0
+            self._generation += 1
+            self._delta_decoder.reset()
+            self._frames_got_counter = frame_location
+            self._frames_played_counter = frame_location
+            self._changed.notify_all()
+
+    def set_resize_scale(self, val: int):
+        self.__scale_percent = val
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from ServerConfig import logger, PARTY_MAX_QUEUED_BYTES, MAX_MESSAGE_SIZE
+from ClientHandler import ClientHandler
+import socket_functions
+from metrics import SERIALISE_STAGE, SEND_STAGE, BYTES_SENT
+from socket_functions import read_data_from_stream, MessageTooLargeError
+
+
+class AsyncClient(ClientHandler):
+    """
+    Serve a client from the event loop. The handlers are blocking (OpenCV decode, JPEG encode, the database),
+    therefore every message is handled in the executor and only the socket I/O runs on the loop.
+    The frames of a stream are pushed by a task, the lock makes sure it never runs together with a handler.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, executor: Executor):
+        super().__init__(writer.get_extra_info("peername"))
+        self.__reader = reader
+        self.__writer = writer
+        self.__executor = executor
+        self.__loop = asyncio.get_running_loop()
+        self.__lock = asyncio.Lock()
+        self.__pusher = None
+        # the handler that runs in the executor (None when none ran yet)
+        self.__handling = None
+
+    async def run(self) -> None:
+        """
+        :return: None. Read the messages of the client and handle them one after the other.
+        """
+        logger.info("Starting new async client!")
+        try:
+            while True:
+                got_data, data = await read_data_from_stream(self.__reader, MAX_MESSAGE_SIZE)
+                if not got_data:
+                    break
+
+                logger.debug(f"Got new data from {self._addr}.")
+                await self.__run_in_executor(self.handle_data, data)
+
+                if self.wants_to_push() and (self.__pusher is None or self.__pusher.done()):
+                    self.__pusher = asyncio.create_task(self.__push_frames())
+
+        except MessageTooLargeError as e:
+            logger.warning(f"Client {self._addr} sent a message that is too long, closing the connection: {e}")
+        except ConnectionResetError:
+            pass
+        finally:
+            logger.info(f"Client {self._addr} disconnected. ")
+            if self.__pusher is not None:
+                self.__pusher.cancel()
+            self.__writer.close()
+            # cancelling the pusher does not stop its handler, it must be done with the capture before the capture
+            # is kept for a resume of the session
+            if self.__handling is not None:
+                await asyncio.gather(self.__handling, return_exceptions=True)
+            # joins the read-ahead thread and the thread of a party the client hosts, never on the loop
+            await self.__loop.run_in_executor(self.__executor, self._disconnected)
+
+    async def __push_frames(self) -> None:
+        """
+        :return: None. Push the frames of the stream until the credit runs out.
+        """
+        try:
+            while self.wants_to_push():
+                await self.__run_in_executor(self.push_frame)
+        except ConnectionResetError:
+            pass
+
+    async def __run_in_executor(self, func, *args) -> None:
+        """
+        :param func: a blocking function that may send data to the client
+        :return: None. Run the function in the executor and wait until the socket can take more data.
+        """
+        async with self.__lock:
+            self.__handling = self.__loop.run_in_executor(self.__executor, func, *args)
+            await asyncio.shield(self.__handling)
+            # the function queued its data, wait until the socket can take more
+            await self.__writer.drain()
+
+    def _send(self, data) -> None:
+        # runs in the executor, the writer can be used only from the loop
+        with self._metrics.time(SERIALISE_STAGE):
+            message = socket_functions.pack_buffers(data, self._protocol)
+        self.send_packed(message)
+
+    def send_packed(self, message: list, may_drop: bool = False) -> bool:
+        """
+        A message that may be dropped is dropped while the transport already buffers PARTY_MAX_QUEUED_BYTES.
+        """
+        if self.__writer.is_closing():
+            raise ConnectionResetError(f"The connection to {self._addr} is closed")
+        if may_drop and self.__writer.transport.get_write_buffer_size() >= PARTY_MAX_QUEUED_BYTES:
+            return False
+        self.__loop.call_soon_threadsafe(self.__write, message)
+        return True
+
+    def __write(self, message: list) -> None:
+        """
+        :param message: the buffers of a packed message
+        :return: None. Write the message to the socket (as much as it takes now, the rest is buffered by the
+        transport). Runs on the loop.
+        """
+        started = time.perf_counter()
+        self.__writer.writelines(message)
+        self._metrics.observe(SEND_STAGE, time.perf_counter() - started)
+        self._metrics.count(BYTES_SENT, sum(len(buffer) for buffer in message))
@@ -0,0 +1,572 @@
+import functools
+import time
+from typing import Optional
+from ServerConfig import logger, BITRATE_LOG_INTERVAL, ENCODE_AHEAD
+import socket_functions
+from database import User
+from metrics import METRICS, ENCODE_STAGE, FRAME_STAGE, FRAMES_SERVED, SEEKS
+from read_ahead import ReadAhead
+from watch_party import PARTIES
+from session_tokens import PARKED_CAPTURES, issue_token, verify_token
+from catalog import CATALOG
+from frame_archive import open_archive
+from frame_source import FrameSource
+from thumbnails import get_thumbnail_bundle
+from delta_codec import DeltaEncoder
+from frame_codecs import CODECS, DEFAULT_SETTINGS, valid_settings
+from encoding_profiles import EncodingProfile, SOURCE_PROFILE, QUALITY_LADDER, PROFILES, output_scale
+
+
+class ClientHandler:
+    """
+    The protocol handlers of a single client. The handlers do not know how the client is served,
+    the subclasses decide how the data is read from the client and how it is sent back (see `_send`).
+
+    A client may open a stream instead of asking for every frame. The client grants credit (how many frames
+    it can take) and the subclasses push frames with `push_frame` while `wants_to_push` is True.
+
+    The frames are served from the pre-encoded archive of the video when there is one. Otherwise they are served
+    from the frame cache that is shared by all the clients, only a miss is decoded with the capture of this client.
+    The misses are encoded in the encode pool (other processes). A stream has a read-ahead thread that decodes its
+    next frames and hands them to the pool ahead of demand, so serving a frame of a stream is taking it from the
+    read-ahead and sending it. The read-ahead is the only user of the capture while the stream is open.
+    The client may switch to another encoding profile of the quality ladder at any frame, and tells the size it
+    shows the frames in so we never send bigger frames than shown.
+    A client may ask for delta frames, then only the tiles that changed since the previous frame are sent. Delta
+    frames depend on what this client already has, so they are encoded for the client and not cached.
+    The codec of the frames (and its quality and chroma subsampling) is chosen per client, see frame_codecs.py.
+    The time of every stage of serving a frame is recorded in the metrics of the session, the subclasses record
+    the serialisation and the sending (see metrics.py). Call `_disconnected` when the client is gone.
+    A client that logged in gets a session token. When its connection drops it connects again and resumes the
+    session with the token: no login, and the stream continues at the frame it asks for, with the capture of its
+    previous connection when it comes back in time (see session_tokens.py).
+    A client may host or join a watch party instead of streaming by itself. The producer of the party sends the
+    frames to all the members with `send_packed`, from the thread of the party (see watch_party.py).
+    """
+    CAPABILITIES = (socket_functions.STREAM_CAPABILITY, socket_functions.CATALOG_CAPABILITY,
+                    socket_functions.ABR_CAPABILITY, socket_functions.DISPLAY_SIZE_CAPABILITY,
+                    socket_functions.DELTA_CAPABILITY, socket_functions.CODECS_CAPABILITY,
+                    socket_functions.STATS_CAPABILITY, socket_functions.RESUME_CAPABILITY,
+                    socket_functions.PARTY_CAPABILITY)
+
+    def __init__(self, client_addr: tuple):
+        self._addr = client_addr
+        self._protocol = socket_functions.LEGACY_PROTOCOL
+        # the index of the next frame we send to the client
+        self.__position = 0
+        # the video of the stream (None when there is no stream) and how many frames we may push
+        self.__stream_video = None
+        self.__credit = 0
+        # does the client want to know about the credit that a stream drops (STOP_STREAM), older clients do not
+        self.__reports_dropped_credit = False
+        # the encoding profile of the frames, and what was delivered with it since the last report
+        self.__profile = SOURCE_PROFILE
+        self.__delivered_bytes = 0
+        self.__delivered_frames = 0
+        self.__delivered_since = time.monotonic()
+        # the resolution of the video the client asked details about, and the size the client shows the frames in
+        self.__resolution = None
+        self.__display_size = None
+        # the encoder of the delta frames (None when the client wants whole frames) and the frame it
+        # continues from (video, index, profile name, scale)
+        self.__delta_encoder = None
+        self.__delta_next = None
+        # the codec of the frames and its parameters
+        self.__codec = DEFAULT_SETTINGS
+        # prepares the next frames of the stream, None until the stream needs a frame
+        self.__read_ahead = None
+        self._metrics = METRICS.open_session()
+        # reads the frames of the client with its own capture
+        self.__frames = FrameSource(self._metrics)
+        # the session token of the client, None until it logs in or resumes a session
+        self.__token = None
+        # the watch party the client is a member of, None when it watches alone
+        self.__party = None
+
+    @property
+    def protocol(self) -> int:
+        """
+        :return: the wire protocol of the connection, what `send_packed` takes
+        """
+        return self._protocol
+
+    def _send(self, data) -> None:
+        """
+        :param data: the data, can be int, string, list, etc.
+        :return: None. Send the data to the client.
+        """
+        raise NotImplementedError
+
+    def send_packed(self, message: list, may_drop: bool = False) -> bool:
+        """
+        :param message: the buffers of a message packed with the protocol of the client (see `pack_buffers`), the
+        same buffers may be sent to many clients
+        :param may_drop: the message may be dropped when the socket can't take it now. A frame of a watch party is
+        dropped for a slow member, so the member does not hold back the others.
+        :return: bool. Was the message sent. Can be called from any thread.
+        """
+        raise NotImplementedError
+
+    def _disconnected(self) -> None:
+        """
+        :return: None. The client is gone, keep its metrics only in the totals of the server. The capture is kept
+        for a while when the client may resume the session.
+        """
+        # the party of a host records into its metrics until it ended
+        self.__leave_party()
+        METRICS.close_session(self._metrics)
+        self.__stop_read_ahead()
+        if self.__token is not None:
+            parked = self.__frames.detach_capture()
+            if parked is not None:
+                PARKED_CAPTURES.park(self.__token, *parked)
+
+    def handle_data(self, data: list) -> None:
+        """
+        :param data: The data that the user send to the server.
+        :return: None. Handle the data in accordance to the data
+        """
+        logger.debug(f"Client {self._addr} said: {data}.")
+        # what function does the client wants
+        func = data[0]
+
+        switch = {
+            socket_functions.CREATE_USER: functools.partial(self.__create_user, data),
+            socket_functions.LOGIN_USER: functools.partial(self.__check_login, data),
+            socket_functions.ASK_FOR_VIDEOS_AVAILABLE: self.__get_videos_list,
+            socket_functions.ADK_FOR_VIDEO_DETAILS: functools.partial(self.__get_show_details, data),
+            socket_functions.ASK_FOR_FRAME: functools.partial(self.__get_frame, data),
+            socket_functions.CHANGE_VIDEO_LOCATION: functools.partial(self.__change_frame_location, data),
+            socket_functions.HELLO: functools.partial(self.__hello, data),
+            socket_functions.START_STREAM: functools.partial(self.__start_stream, data),
+            socket_functions.GRANT_CREDIT: functools.partial(self.__grant_credit, data),
+            socket_functions.STOP_STREAM: self.__stop_stream,
+            socket_functions.ASK_FOR_CATALOG: functools.partial(self.__get_catalog, data),
+            socket_functions.SET_PROFILE: functools.partial(self.__set_profile, data),
+            socket_functions.SET_DISPLAY_SIZE: functools.partial(self.__set_display_size, data),
+            socket_functions.SET_DELTA_FRAMES: functools.partial(self.__set_delta_frames, data),
+            socket_functions.SET_CODEC: functools.partial(self.__set_codec, data),
+            socket_functions.ASK_FOR_STATS: self.__get_stats,
+            socket_functions.RESUME_SESSION: functools.partial(self.__resume_session, data),
+            socket_functions.CREATE_PARTY: functools.partial(self.__create_party, data),
+            socket_functions.JOIN_PARTY: functools.partial(self.__join_party, data),
+            socket_functions.LEAVE_PARTY: self.__leave_party,
+            socket_functions.PARTY_CONTROL: functools.partial(self.__party_control, data)
+        }
+
+        if func not in switch:
+            logger.warning(f"Client {self._addr} sent unknown request {func}.")
+            return
+        switch[func]()
+
+    def __hello(self, data: list) -> None:
+        """
+        :param data: The data that the user sent. Contains the wire protocols that the client can use.
+        :return: None. Choose the protocol of the connection and tell the client about it.
+        """
+        protocol = socket_functions.choose_protocol(data[1])
+        # the client switches only after it gets the answer, so the answer uses the current protocol
+        self._send([socket_functions.HELLO, protocol, list(self.CAPABILITIES)])
+        self._protocol = protocol
+        logger.info(f"Client {self._addr} uses protocol {protocol}.")
+
+    def wants_to_push(self) -> bool:
+        """
+        :return: bool. Is there a stream with credit left.
+        """
+        return self.__stream_video is not None and self.__credit > 0
+
+    def push_frame(self) -> None:
+        """
+        :return: None. Send the next frame of the stream and use one credit. The stream ends with the video.
+        """
+        if not self.wants_to_push():
+            return
+
+        self.__credit -= 1
+        with self._metrics.time(FRAME_STAGE):
+            sent = self.__send_next_frame(self.__stream_video)
+        if not sent:
+            logger.debug(f"Stream of {self._addr} reached the end of the video.")
+            # no frame was sent for the credit
+            self.__credit += 1
+            self.__stop_stream()
+
+    def __start_stream(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the video, the initial credit and (from newer clients)
+        whether the client wants to know about the credit that the stream drops.
+        :return: None. Start pushing the frames of the video from the current location. The credit left from a
+        previous stream is dropped.
+        """
+        self.__reports_dropped_credit = len(data) > 3 and data[3]
+        if self.__stream_video != data[1]:
+            self.__stop_read_ahead()
+        self.__drop_credit()
+        self.__stream_video = data[1]
+        self.__credit = data[2]
+        logger.debug(f"Client {self._addr} started a stream of {self.__stream_video}.")
+
+    def __grant_credit(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains how many more frames the client can take.
+        :return: None.
+        """
+        self.__credit += data[1]
+
+    def __stop_stream(self) -> None:
+        """
+        :return: None. End the stream, when the client asked or at the end of the video.
+        """
+        self.__stream_video = None
+        self.__drop_credit()
+        self.__stop_read_ahead()
+
+    def __drop_credit(self) -> None:
+        """
+        :return: None. Drop the credit of the stream and tell the client how much (STOP_STREAM), so it does not
+        wait for frames that will never come.
+        """
+        dropped_credit, self.__credit = self.__credit, 0
+        if dropped_credit and self.__reports_dropped_credit:
+            self._send([socket_functions.STOP_STREAM, dropped_credit])
+
+    def __stop_read_ahead(self) -> None:
+        """
+        :return: None. Stop the read-ahead thread of the stream, the capture is free after it.
+        """
+        if self.__read_ahead is not None:
+            self.__read_ahead.close()
+            self.__read_ahead = None
+
+    def __create_user(self, data):
+        username = data[1]
+        password = data[2]
+        if User.find(username) is None:  # user does not exists - good
+            User.add_user(username, password)
+            self._send([socket_functions.CREATE_USER, True])
+        else:  # username already exists
+            self._send([socket_functions.CREATE_USER, False])
+
+    def __check_login(self, data):
+        username = data[1]
+        password = data[2]
+
+        is_ok = User.valid_user(username, password)
+        self.__token = issue_token(username) if is_ok else None
+        self._send([socket_functions.LOGIN_USER, is_ok, self.__token])
+
+    def __resume_session(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the session token, the video, the frame to continue
+        from and whether the frames are streamed.
+        :return: None. Continue the session of a previous connection without a login. The client gets a new token
+        and the new location, and grants new credit for the stream.
+        """
+        token, video, frame_index, stream = data[1:5]
+        username = verify_token(token)
+        if username is None:
+            logger.warning(f"Client {self._addr} tried to resume a session with a bad or expired token.")
+            self._send([socket_functions.RESUME_SESSION, False, None, frame_index])
+            return
+
+        # the read-ahead is the only user of the capture, it stops before the parked capture replaces it
+        self.__stop_read_ahead()
+        parked = PARKED_CAPTURES.adopt(token)
+        if parked is not None:
+            self.__frames.attach_capture(*parked)
+        details = self.__video_details(video)
+        self.__resolution = None if details is None else details[2]
+        self.__position = frame_index
+        self.__delta_next = None
+        self.__stream_video = video if stream else None
+        self.__credit = 0
+        self.__token = issue_token(username)
+        self._send([socket_functions.RESUME_SESSION, True, self.__token, frame_index])
+        logger.info(f"Client {self._addr} resumed the session of {username} at frame {frame_index} of {video}"
+                    f"{' with its previous capture' if parked is not None else ''}.")
+
+    def __create_party(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the video.
+        :return: None. Start a watch party of the video with the client as its host, and tell the client the id of
+        the party (None when there is no such video). The party starts paused at the first frame.
+        """
+        self.__leave_party()
+        details = self.__video_details(data[1])
+        if details is None:
+            logger.warning(f"Client {self._addr} asked for a party of unknown video {data[1]}.")
+            self._send([socket_functions.CREATE_PARTY, None])
+            return
+        self.__stop_stream()
+        self.__party = PARTIES.create(data[1], details[0], self, self._metrics)
+        self._send([socket_functions.CREATE_PARTY, self.__party.party_id])
+        logger.info(f"Client {self._addr} hosts the party {self.__party.party_id} of {data[1]}.")
+
+    def __join_party(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the id of the party.
+        :return: None. Watch the video of the party with its members, the party answers with the video, the frame it
+        continues at and whether it is paused, and sends the frames. The video is None when there is no such party.
+        """
+        self.__leave_party()
+        party = PARTIES.get(data[1])
+        self.__stop_stream()
+        if party is None or not party.join(self):
+            logger.warning(f"Client {self._addr} asked to join unknown party {data[1]}.")
+            self._send([socket_functions.JOIN_PARTY, data[1], None, 0, True, False])
+            return
+        self.__party = party
+        logger.info(f"Client {self._addr} joined the party {party.party_id} of {party.video}.")
+
+    def __leave_party(self) -> None:
+        """
+        :return: None. Leave the watch party, the party ends when its host leaves.
+        """
+        if self.__party is not None:
+            PARTIES.leave(self.__party, self)
+            self.__party = None
+
+    def __party_control(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains what the host does (play, pause or seek) and the
+        frame the party continues at.
+        :return: None. Only the host controls the party, the party tells all the members.
+        """
+        if self.__party is None or self.__party.host is not self:
+            logger.warning(f"Client {self._addr} tried to control a party it does not host.")
+            return
+        if not self.__party.control(data[1], data[2]):
+            logger.warning(f"Client {self._addr} sent unknown party control {data[1]}.")
+
+    def __get_videos_list(self) -> None:
+        """
+        :return: None. sednd list of all the videos available
+        """
+        bundle = get_thumbnail_bundle()
+        # videos available are the list that in the thumbnail bundle, send a list of all of them
+        self._send([socket_functions.ASK_FOR_VIDEOS_AVAILABLE, bundle.videos])
+        # send thumbnails
+        for vid_dir, encoded_img in zip(bundle.videos, bundle.thumbnails):
+            self._send([socket_functions.VIDEO_THUMBNAIL, vid_dir, encoded_img])
+
+    def __get_catalog(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the etag of the catalog the client has (or None).
+        :return: None. Send all the videos with their thumbnails in one message, or only that the catalog was
+        not modified when the client already has it.
+        """
+        bundle = get_thumbnail_bundle()
+        if data[1] == bundle.etag:
+            self._send([socket_functions.CATALOG_NOT_MODIFIED, bundle.etag])
+        else:
+            self._send([socket_functions.ASK_FOR_CATALOG, bundle.etag, bundle.videos, bundle.thumbnails])
+
+    def __get_show_details(self, data: list) -> None:
+        """
+        :param data: The data that the user send. Contains the video which he selected.
+        :return: None. Send video details (fps and how many frames) to the client. Clients that know more
+        get also the resolution and the profiles of the quality ladder.
+        """
+        vid = data[1]
+        details = self.__video_details(vid)
+        if details is None:
+            logger.warning(f"Client {self._addr} asked about unknown video {vid}.")
+            return
+        fps, frames_amount, resolution = details
+        self.__resolution = resolution
+        logger.debug("Send video details!")
+        extra_details = {"resolution": resolution, "profiles": [list(profile) for profile in QUALITY_LADDER]}
+        self._send([socket_functions.ADK_FOR_VIDEO_DETAILS, (fps, frames_amount), extra_details])
+
+    @staticmethod
+    def __video_details(video: str) -> Optional[tuple]:
+        """
+        :param video: the video name
+        :return: a tuple: (fps, how many frames, resolution), None if there is no such video. From the archive of
+        the video when there is one, otherwise as the catalog probed it.
+        """
+        archive = open_archive(video)
+        if archive is not None:
+            return archive.fps, float(archive.frames_amount), (archive.width, archive.height)
+
+        entry = CATALOG.get(video)
+        if entry is None:
+            return None
+        return entry.fps, float(entry.frames_amount), entry.resolution
+
+    def __set_profile(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the name of the profile.
+        :return: None. The next frames are encoded with the profile.
+        """
+        profile = PROFILES.get(data[1])
+        if profile is None:
+            logger.warning(f"Client {self._addr} asked for unknown profile {data[1]}.")
+            return
+        self.__report_delivered_bitrate()
+        logger.info(f"Client {self._addr} switched from profile {self.__profile.name} to {profile.name}.")
+        self.__profile = profile
+
+    def __set_display_size(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the width and the height the client shows the
+        frames in.
+        :return: None. The next frames are scaled down to the display size before they are encoded.
+        """
+        self.__display_size = (data[1], data[2])
+        logger.debug(f"Client {self._addr} shows the frames in {data[1]}x{data[2]}.")
+
+    def __set_delta_frames(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains whether the client wants delta frames.
+        :return: None.
+        """
+        self.__delta_encoder = DeltaEncoder() if data[1] else None
+        self.__delta_next = None
+        # the read-ahead prepares decoded frames for delta frames and encoded frames otherwise
+        self.__stop_read_ahead()
+        logger.info(f"Client {self._addr} {'wants' if data[1] else 'does not want'} delta frames.")
+
+    def __set_codec(self, data: list) -> None:
+        """
+        :param data: The data that the client sent. Contains the codecs the client can decode (the one it prefers
+        first) and the parameters it wants (quality and chroma subsampling).
+        :return: None. Choose the codec and tell the client which codec and parameters it gets.
+        """
+        codec = next((name for name in data[1] if name in CODECS), DEFAULT_SETTINGS.codec)
+        parameters = data[2]
+        self.__codec = valid_settings(codec, parameters.get("quality"), parameters.get("subsampling"))
+        self._send([socket_functions.SET_CODEC, self.__codec.codec,
+                    {"quality": self.__codec.quality, "subsampling": self.__codec.subsampling}])
+        logger.info(f"Client {self._addr} uses codec {self.__codec}.")
+
+    def __get_stats(self) -> None:
+        """
+        :return: None. Send the metrics of this session and the totals of the server.
+        """
+        self._send([socket_functions.ASK_FOR_STATS, self._metrics.summary(), METRICS.summary()])
+
+    def __get_frame(self, data: list):
+        """
+        :param data: The data that the client sent.
+        :return: None. Send the next frame to the client.
+        """
+        with self._metrics.time(FRAME_STAGE):
+            self.__send_next_frame(data[1])
+
+    def __send_next_frame(self, video: str) -> bool:
+        """
+        :param video: the video name
+        :return: bool. Send the next frame of the video to the client, False if there are no more frames.
+        """
+        index = self.__position
+        profile = self.__profile
+        scale = output_scale(profile, self.__resolution, self.__display_size)
+        if self.__delta_encoder is not None:
+            return self.__send_delta_frame(video, index, profile, scale)
+
+        archive = open_archive(video)
+        if profile == SOURCE_PROFILE and scale == 1 and self.__codec == DEFAULT_SETTINGS and archive is not None and \
+                archive.profile == socket_functions.IMAGE_FORMAT:
+            img_bytes = archive.frame(index)
+            if img_bytes is not None and self._protocol == socket_functions.LEGACY_PROTOCOL:
+                # pickle can't take a slice of the memory map
+                img_bytes = bytes(img_bytes)
+        else:
+            img_bytes = self.__encoded_frame((video, index, profile.name, scale, self.__codec))
+        if img_bytes is None:
+            return False
+
+        self.__position += 1
+        self._send([socket_functions.ASK_FOR_FRAME, img_bytes])
+        self.__count_delivered(len(img_bytes))
+        return True
+
+    def __send_delta_frame(self, video: str, index: int, profile: EncodingProfile, scale: float) -> bool:
+        """
+        :param video: the video name
+        :param index: the index of the frame
+        :param profile: the encoding profile
+        :param scale: the scale of the source resolution (see `output_scale`)
+        :return: bool. Send the tiles of the frame that changed since the previous frame the client got, False if
+        there is no such frame. After a seek or a change of the profile the whole frame is sent.
+        """
+        if self.__delta_next != (video, index, profile.name, scale, self.__codec):
+            self.__delta_encoder.reset()
+        img_frame = self.__next_frame((video, index, profile.name, scale, self.__codec))
+        if img_frame is None:
+            return False
+
+        with self._metrics.time(ENCODE_STAGE):
+            message, frame_bytes = self.__delta_encoder.encode(img_frame, profile.quality, self.__codec)
+        self.__delta_next = (video, index + 1, profile.name, scale, self.__codec)
+        self.__position += 1
+        self._send(message)
+        self.__count_delivered(frame_bytes)
+        return True
+
+    def __count_delivered(self, frame_bytes: int) -> None:
+        self.__delivered_bytes += frame_bytes
+        self.__delivered_frames += 1
+        self._metrics.count(FRAMES_SERVED)
+        if time.monotonic() - self.__delivered_since >= BITRATE_LOG_INTERVAL:
+            self.__report_delivered_bitrate()
+
+    def __report_delivered_bitrate(self) -> None:
+        """
+        :return: None. Log the bitrate that was delivered with the current profile since the last report.
+        """
+        now = time.monotonic()
+        elapsed = now - self.__delivered_since
+        if self.__delivered_frames and elapsed > 0:
+            kbits = self.__delivered_bytes * 8 / 1000 / elapsed
+            logger.info(f"Client {self._addr} profile {self.__profile.name}: delivered {kbits:.0f} kbit/s, "
+                        f"{self.__delivered_frames / elapsed:.1f} fps.")
+        self.__delivered_bytes = 0
+        self.__delivered_frames = 0
+        self.__delivered_since = now
+
+    def __encoded_frame(self, key: tuple) -> Optional[bytes]:
+        """
+        :param key: the key of the frame in the frame cache (video, index, profile name, scale, codec)
+        :return: the encoded frame, None if there is no such frame. From the cache, or from the encode pool (the
+        fill of the frame is shared with the other readers of the frame, see FrameCache). The frames of a stream are
+        handed to the pool ahead by the read-ahead thread.
+        """
+        future = self.__next_frame(key)
+        return None if future is None else future.result()
+
+    def __next_frame(self, key: tuple):
+        """
+        :param key: the key of the frame in the frame cache (video, index, profile name, scale, codec)
+        :return: the future of the encoded frame, or the decoded frame in the scale for delta frames. None if there
+        is no such frame. Taken from the read-ahead when there is a stream, otherwise prepared now. The read-ahead
+        of a stream joins the frames that other readers are making (see FrameSource.prepare_ahead).
+        """
+        delta = self.__delta_encoder is not None
+        if self.__stream_video is None or ENCODE_AHEAD <= 0:
+            return self.__frames.prepare_decoded(key) if delta else self.__frames.prepare_encoded(key)
+        if self.__read_ahead is None:
+            prepare = self.__frames.prepare_decoded if delta else self.__frames.prepare_ahead
+            self.__read_ahead = ReadAhead(prepare, ENCODE_AHEAD, f"read-ahead-{self._addr}")
+        return self.__read_ahead.take(key)
+
+    def __change_frame_location(self, data: list):
+        """
+        :param data: The data that the user sent to the client.
+        :return: None. Move to the new location and sending approval to the client. The capture moves only
+        when a frame is not in the cache.
+        The credit of the stream is dropped, the client grants new credit after it gets the approval.
+        """
+        frame_index = data[2]
+        self.__position = frame_index
+        self._metrics.count(SEEKS)
+        # the client forgets its previous frame, the next frame is sent whole
+        self.__delta_next = None
+        if self.__read_ahead is not None:
+            # the frames of the old location are not needed, the read-ahead restarts at the first frame we send
+            self.__read_ahead.flush()
+        # tell the client how much credit was dropped so it knows which frames will never come
+        dropped_credit, self.__credit = self.__credit, 0
+        self._send([socket_functions.CHANGE_VIDEO_LOCATION, frame_index, dropped_credit])
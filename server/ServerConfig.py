@@ -1,52 +1,111 @@
-import logging
-import os
-from typing import Tuple, List
-from dotenv import load_dotenv
-
-
-# create the logger
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s [%(levelname)s]: %(message)s')
-logger = logging.getLogger(__name__)
-
-
-load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
-
-
-IP = os.environ.get("IP")
-PORT = int(os.environ.get("PORT"))
-MAX_LISTENERS = 10
-SERVER_TIMEOUT = 10
-VIDEOS_DIR_PATH = os.path.join(os.path.dirname(__file__), "videos")
-
-
-def all_videos() -> List[str]:
-    """
-    :return: all the videos available
-    """
-    files_and_sub_dirs = os.listdir(VIDEOS_DIR_PATH)
-    files = filter(lambda potential_dir:
-                   os.path.isdir(os.path.join(VIDEOS_DIR_PATH, potential_dir)),
-                   files_and_sub_dirs)
-    return list(files)
-
-
-def get_video_and_thumbnail_path(video_dir: str) -> Tuple[str, str]:
-    """
-    :param video_dir: the video dir
-    :return: the path to the video and the path to the video thumbnail
-    """
-    video_dir = os.path.join(VIDEOS_DIR_PATH, video_dir)
-    video_type_file = os.path.join(video_dir, "video_type.txt")
-    with open(video_type_file, "r") as file:
-        video_extension = file.read()
-
-    vid = f"video.{video_extension}"
-    video_path = os.path.join(video_dir, vid)
-    thumbnail_path = os.path.join(video_dir, "img.jpg")
-
-    return video_path, thumbnail_path
-
-
-ALL_VIDEOS_DIRECTORIES = all_videos()
-
+import logging
+import os
+from typing import Tuple, List
+from dotenv import load_dotenv
+
+
+# create the logger
+logging.basicConfig(level=logging.DEBUG,
+                    format='%(asctime)s [%(levelname)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+logger.setLevel(os.environ.get("LOG_LEVEL", "DEBUG"))
+
+
+IP = os.environ.get("IP")
+PORT = int(os.environ.get("PORT"))
+MAX_LISTENERS = 10
+SERVER_TIMEOUT = 10
+# the longest message a client may send, a longer header closes the connection before anything is allocated for it
+MAX_MESSAGE_SIZE = int(os.environ.get("MAX_MESSAGE_SIZE", 64 * 1024 * 1024))
+VIDEOS_DIR_PATH = os.environ.get("VIDEOS_DIR", os.path.join(os.path.dirname(__file__), "videos"))
+# how the clients are served: a thread per client or one event loop for all of them
+THREADED_MODE = "threaded"
+ASYNCIO_MODE = "asyncio"
+SERVER_MODE = os.environ.get("SERVER_MODE", THREADED_MODE)
+# threads that run the blocking handlers (decode, encode, database) in asyncio mode
+EXECUTOR_WORKERS = int(os.environ.get("EXECUTOR_WORKERS", os.cpu_count() or 4))
+# processes that encode the frames (see encode_pool.py), 0 encodes on the thread of the client. One core gains
+# nothing from the processes
+ENCODE_WORKERS = int(os.environ.get("ENCODE_WORKERS", os.cpu_count() if (os.cpu_count() or 1) > 1 else 0))
+# how many frames of a stream the read-ahead thread of the client prepares (decodes and hands to the encode pool)
+# before they are sent, 0 prepares every frame on the thread of the client when it is sent
+ENCODE_AHEAD = int(os.environ.get("ENCODE_AHEAD", 8))
+# the height of the thumbnails in the videos dialog of the client
+THUMBNAIL_HEIGHT = 250
+# seconds between the logs of the bitrate delivered to each client
+BITRATE_LOG_INTERVAL = 5
+# bytes of encoded frames that are kept in memory for all the clients
+FRAME_CACHE_MAX_BYTES = int(os.environ.get("FRAME_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# delta frames (for clients that ask for them): the side of a tile, how much a pixel may change before its tile
+# is sent again, and above which part of changed tiles the whole frame is sent instead
+DELTA_TILE_SIZE = int(os.environ.get("DELTA_TILE_SIZE", 32))
+DELTA_THRESHOLD = int(os.environ.get("DELTA_THRESHOLD", 8))
+DELTA_MAX_CHANGED = 0.5
+# the exporter of the metrics of the server (Prometheus text format) listens only on the local host, port 0 turns it
+# off
+METRICS_IP = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9464))
+# the secret that signs the session tokens (see session_tokens.py). Without SESSION_SECRET a random secret is made
+# once and kept in SESSION_SECRET_PATH, so the tokens stay valid when the server restarts
+SESSION_SECRET = os.environ.get("SESSION_SECRET")
+SESSION_SECRET_PATH = os.environ.get("SESSION_SECRET_PATH", os.path.join(os.path.dirname(__file__), ".session_secret"))
+# seconds a session token is valid, and seconds the capture of a client that dropped is kept for its resume
+SESSION_TOKEN_TTL = int(os.environ.get("SESSION_TOKEN_TTL", 12 * 60 * 60))
+RESUME_GRACE = int(os.environ.get("RESUME_GRACE", 60))
+# seconds between the scans of the videos directory for added, removed and changed videos (see catalog.py)
+CATALOG_SCAN_INTERVAL = float(os.environ.get("CATALOG_SCAN_INTERVAL", 5))
+# the redirector a node registers with (see redirector.py), a server without it serves the clients by itself. The
+# node is known to the redirector by NODE_ID and the clients connect to it at IP and PORT
+REDIRECTOR_IP = os.environ.get("REDIRECTOR_IP", "127.0.0.1")
+REDIRECTOR_PORT = int(os.environ.get("REDIRECTOR_PORT", 0))
+NODE_ID = os.environ.get("NODE_ID", f"{IP}:{PORT}")
+# seconds between the heartbeats of a node, a node that missed NODE_TIMEOUT seconds of heartbeats is dropped
+HEARTBEAT_INTERVAL = float(os.environ.get("HEARTBEAT_INTERVAL", 1))
+NODE_TIMEOUT = float(os.environ.get("NODE_TIMEOUT", 3 * HEARTBEAT_INTERVAL))
+# the heartbeats are signed with the session secret, the redirector takes a heartbeat only within HEARTBEAT_MAX_AGE
+# seconds of the time it was sent (on the clock of the node), so an old heartbeat can't be sent again
+HEARTBEAT_MAX_AGE = float(os.environ.get("HEARTBEAT_MAX_AGE", 30))
+# points of every node on the hash ring, and how much more than the average amount of sessions a node takes
+# before the videos it owns go to the next node on the ring
+RING_POINTS = 100
+LOAD_FACTOR = float(os.environ.get("LOAD_FACTOR", 1.25))
+# watch parties (see watch_party.py): the frames are sent PARTY_LEAD seconds before they are due, so the members keep
+# that much in their buffers. A member that already has PARTY_MAX_QUEUED_BYTES waiting to be sent misses the frames
+# until it catches up, so a slow member does not hold back the others
+PARTY_LEAD = float(os.environ.get("PARTY_LEAD", 0.5))
+PARTY_MAX_QUEUED_BYTES = int(os.environ.get("PARTY_MAX_QUEUED_BYTES", 2 * 1024 * 1024))
+
+
+def all_videos() -> List[str]:
+    """
+    :return: all the videos available
+    """
+    files_and_sub_dirs = os.listdir(VIDEOS_DIR_PATH)
+    files = filter(lambda potential_dir:
+                   os.path.isdir(os.path.join(VIDEOS_DIR_PATH, potential_dir)),
+                   files_and_sub_dirs)
+    return list(files)
+
+
+def get_video_and_thumbnail_path(video_dir: str) -> Tuple[str, str]:
+    """
+    :param video_dir: the video dir
+    :return: the path to the video and the path to the video thumbnail
+    """
+    video_dir = os.path.join(VIDEOS_DIR_PATH, video_dir)
+    video_type_file = os.path.join(video_dir, "video_type.txt")
+    with open(video_type_file, "r") as file:
+        video_extension = file.read()
+
+    vid = f"video.{video_extension}"
+    video_path = os.path.join(video_dir, vid)
+    thumbnail_path = os.path.join(video_dir, "img.jpg")
+
+    return video_path, thumbnail_path
+
+
+ALL_VIDEOS_DIRECTORIES = all_videos()
+
@@ -1,137 +1,126 @@
-import socket
-import threading
-import time
-import functools
-import cv2
-from PIL import Image
-import numpy as np
-from ServerConfig import logger, ALL_VIDEOS_DIRECTORIES, get_video_and_thumbnail_path
-import socket_functions
-from socket_functions import read_data_from_socket, send_data_through_socket
-from database import User
-
-
-class ClientThread(threading.Thread):
-
-    def __init__(self, client_sock: socket.socket, client_addr: tuple):
-        super().__init__(daemon=True)
-        self.__sock = client_sock
-        self.__addr = client_addr
-        self.__cap = None
-
-    def run(self) -> None:
-        """
-        :return: None. Running the thread.
-        """
-        logger.info("Starting new client thread!")
-        self.__sock.setblocking(True)
-        try:
-            while True:
-                got_data, data = read_data_from_socket(self.__sock)
-                if not got_data:
-                    time.sleep(0.001)
-                    continue
-
-                logger.debug(f"Got new data from {self.__addr}.")
-                self.__handle_data(data)
-
-        except ConnectionResetError:
-            logger.info(f"Client {self.__addr} disconnected. ")
-
-    def __handle_data(self, data: list) -> None:
-        """
-        :param data: The data that the user send to the server.
-        :return: None. Handle the data in accordance to the data
-        """
-        logger.debug(f"Client {self.__addr} said: {data}.")
-        # what function does the client wants
-        func = data[0]
-
-        switch = {
-            socket_functions.CREATE_USER: functools.partial(self.__create_user, data),
-            socket_functions.LOGIN_USER: functools.partial(self.__check_login, data),
-            socket_functions.ASK_FOR_VIDEOS_AVAILABLE: self.__get_videos_list,
-            socket_functions.ADK_FOR_VIDEO_DETAILS: functools.partial(self.__get_show_details, data),
-            socket_functions.ASK_FOR_FRAME: functools.partial(self.__get_frame, data),
-            socket_functions.CHANGE_VIDEO_LOCATION: functools.partial(self.__change_frame_location, data)
-        }
-
-        switch[func]()
-
-    def __create_user(self, data):
-        username = data[1]
-        password = data[2]
-        if User.find(username) is None:  # user does not exists - good
-            User.add_user(username, password)
-            send_data_through_socket(self.__sock, [socket_functions.CREATE_USER, True])
-        else:  # username already exists
-            send_data_through_socket(self.__sock, [socket_functions.CREATE_USER, False])
-
-    def __check_login(self, data):
-        username = data[1]
-        password = data[2]
-
-        is_ok = User.valid_user(username, password)
-        send_data_through_socket(self.__sock, [socket_functions.LOGIN_USER, is_ok])
-
-    def __get_videos_list(self) -> None:
-        """
-        :return: None. sednd list of all the videos available
-        """
-        # videos available are the list that in the variable ALL_VIDEOS, send a list of all of them
-        send_data_through_socket(self.__sock, [socket_functions.ASK_FOR_VIDEOS_AVAILABLE, list(ALL_VIDEOS_DIRECTORIES)])
-        # send thumbnails
-        for vid_dir in ALL_VIDEOS_DIRECTORIES:
-            _, thumbnail_path = get_video_and_thumbnail_path(vid_dir)
-            with Image.open(thumbnail_path) as img:
-                encoded_img = socket_functions.encode_img(np.array(img))
-                send_data_through_socket(self.__sock, [socket_functions.VIDEO_THUMBNAIL, vid_dir, encoded_img])
-
-    def __get_show_details(self, data: list) -> None:
-        """
-        :param data: The data that the user send. Contains the video which he selected.
-        :return: None. Send video details (fps and how many frames) to the client.
-        """
-        vid = data[1]
-        vid_path, _ = get_video_and_thumbnail_path(vid)
-        if self.__cap is None:
-            self.__cap = cv2.VideoCapture(vid_path)
-
-        fps = self.__cap.get(cv2.CAP_PROP_FPS)
-        frames_amount = self.__cap.get(cv2.CAP_PROP_FRAME_COUNT)
-
-        logger.debug("Send video details!")
-        send_data_through_socket(self.__sock, [socket_functions.ADK_FOR_VIDEO_DETAILS, (fps, frames_amount)])
-
-    def __get_frame(self, data: list):
-        """
-        :param data: The data that the client sent.
-        :return: None. Send the next frame to the client.
-        """
-        video = data[1]
-        video, _ = get_video_and_thumbnail_path(video)
-
-        if self.__cap is None:
-            self.__cap = cv2.VideoCapture(video)
-        elif not self.__cap.isOpened():
-            self.__cap = cv2.VideoCapture(video)
-
-        ret, img_frame = self.__cap.read()
-
-        if ret:
-            img_bytes = socket_functions.encode_img(img_frame)
-            send_data_through_socket(self.__sock, [socket_functions.ASK_FOR_FRAME, img_bytes])
-
-    def __change_frame_location(self, data: list):
-        """
-        :param data: The data that the user sent to the client.
-        :return: None. Make a new cap from the new location and sending approval to the client.
-        """
-        vid_name = data[1]
-        frame_index = data[2]
-        video_location, _ = get_video_and_thumbnail_path(vid_name)
-
-        self.__cap = cv2.VideoCapture(video_location)
-        # set the cap to display frames from "frame_index" and forward.
-        self.__cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-        send_data_through_socket(self.__sock, [socket_functions.CHANGE_VIDEO_LOCATION, frame_index])
+import select
+import socket
+import threading
+from collections import deque
+from ServerConfig import logger, PARTY_MAX_QUEUED_BYTES, MAX_MESSAGE_SIZE
+from ClientHandler import ClientHandler
+from metrics import SERIALISE_STAGE, SEND_STAGE, BYTES_SENT
+from socket_functions import SocketReader, MessageTooLargeError, pack_buffers, send_buffers
+
+
+class ClientThread(ClientHandler, threading.Thread):
+
+    def __init__(self, client_sock: socket.socket, client_addr: tuple):
+        threading.Thread.__init__(self, daemon=True)
+        ClientHandler.__init__(self, client_addr)
+        self.__sock = client_sock
+        self.__reader = SocketReader(client_sock, max_message_size=MAX_MESSAGE_SIZE)
+        # the messages that wait for the writer thread and their bytes. The writer starts with the first message that
+        # may be dropped (a frame of a watch party), then all the messages go through it in order
+        self.__outbox = deque()
+        self.__outbox_bytes = 0
+        self.__outbox_changed = threading.Condition()
+        # one message is written to the socket at a time
+        self.__write_lock = threading.Lock()
+        self.__writer = None
+        self.__write_error = None
+        self.__closed = False
+
+    def run(self) -> None:
+        """
+        :return: None. Running the thread.
+        """
+        logger.info("Starting new client thread!")
+        self.__sock.setblocking(True)
+        try:
+            while True:
+                # push the frames of the stream as long as the client has nothing to say
+                if self.wants_to_push() and not self.__has_pending_data():
+                    self.push_frame()
+                    continue
+
+                got_data, data = self.__reader.read()
+                if not got_data:
+                    # the client closed the socket
+                    break
+
+                logger.debug(f"Got new data from {self._addr}.")
+                self.handle_data(data)
+
+        except MessageTooLargeError as e:
+            logger.warning(f"Client {self._addr} sent a message that is too long, closing the connection: {e}")
+        except ConnectionResetError:
+            pass
+        finally:
+            self._disconnected()
+            with self.__outbox_changed:
+                self.__closed = True
+                self.__outbox_changed.notify_all()
+            self.__sock.close()
+        logger.info(f"Client {self._addr} disconnected. ")
+
+    def __has_pending_data(self) -> bool:
+        """
+        :return: bool. Did the client send data that we did not read yet, in the reader or in the socket.
+        """
+        if self.__reader.buffered:
+            return True
+        readable, _, _ = select.select([self.__sock], [], [], 0)
+        return bool(readable)
+
+    def _send(self, data) -> None:
+        with self._metrics.time(SERIALISE_STAGE):
+            message = pack_buffers(data, self._protocol)
+        self.send_packed(message)
+
+    def send_packed(self, message: list, may_drop: bool = False) -> bool:
+        """
+        The messages are sent by the thread that sends them, until the first message that may be dropped. From then
+        on a writer thread sends them from an outbox, and a message that may be dropped is dropped while the outbox
+        holds PARTY_MAX_QUEUED_BYTES (like the transport of an async client), so the sender never waits for a slow
+        client.
+        """
+        with self.__outbox_changed:
+            if self.__closed or self.__write_error is not None:
+                raise ConnectionResetError(f"The connection to {self._addr} is closed")
+            if self.__writer is None and may_drop:
+                self.__writer = threading.Thread(target=self.__write_outbox, name=f"writer-{self._addr}", daemon=True)
+                self.__writer.start()
+            if self.__writer is not None:
+                if may_drop and self.__outbox_bytes >= PARTY_MAX_QUEUED_BYTES:
+                    return False
+                self.__outbox.append(message)
+                self.__outbox_bytes += sum(len(buffer) for buffer in message)
+                self.__outbox_changed.notify_all()
+                return True
+
+        # written without the lock of the outbox, so a party that sends to the client meanwhile only waits to queue
+        # its message, not for this write
+        self.__write(message)
+        return True
+
+    def __write(self, message: list) -> None:
+        with self.__write_lock, self._metrics.time(SEND_STAGE):
+            send_buffers(self.__sock, message)
+        self._metrics.count(BYTES_SENT, sum(len(buffer) for buffer in message))
+
+    def __write_outbox(self) -> None:
+        """
+        :return: None. The writer thread: send the messages of the outbox until the client disconnects.
+        """
+        while True:
+            with self.__outbox_changed:
+                self.__outbox_changed.wait_for(lambda: self.__outbox or self.__closed)
+                if self.__closed:
+                    return
+                message = self.__outbox[0]
+            try:
+                self.__write(message)
+            except OSError as e:
+                # the thread of the client sees the connection is gone
+                with self.__outbox_changed:
+                    self.__write_error = e
+                return
+            with self.__outbox_changed:
+                self.__outbox.popleft()
+                self.__outbox_bytes -= sum(len(buffer) for buffer in message)
@@ -0,0 +1,77 @@
+"""
+Build the pre-encoded frame archives of the videos (see frame_archive.py). The server serves the frames of a
+video with an up to date archive straight from the archive, without decoding.
+
+    python server/build_archives.py [--force] [video ...]
+"""
+import argparse
+import os
+import cv2
+import numpy as np
+from ServerConfig import logger, VIDEOS_DIR_PATH, ALL_VIDEOS_DIRECTORIES, get_video_and_thumbnail_path
+import socket_functions
+from frame_archive import ARCHIVE_DATA_FILE, ARCHIVE_INDEX_FILE, ARCHIVE_MAGIC, ARCHIVE_VERSION, ARCHIVE_HEADER, \
+    OFFSETS_DTYPE, is_archive_up_to_date
+
+
+def build_archive(video_path: str, video_dir: str) -> int:
+    """
+    :param video_path: the path of the video
+    :param video_dir: the directory the archive is written to
+    :return: how many frames the archive has. Decode all the frames of the video and write them encoded the same
+    way the server encodes them.
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    data_path = os.path.join(video_dir, ARCHIVE_DATA_FILE)
+    index_path = os.path.join(video_dir, ARCHIVE_INDEX_FILE)
+    offsets = [0]
+    # write to temporary files so a running server never sees half an archive
+    with open(data_path + ".tmp", "wb") as data_file:
+        while True:
+            ret, img_frame = cap.read()
+            if not ret:
+                break
+            img_bytes = socket_functions.encode_img(img_frame)
+            data_file.write(img_bytes)
+            offsets.append(offsets[-1] + len(img_bytes))
+    cap.release()
+
+    frames_amount = len(offsets) - 1
+    header = ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, fps, frames_amount, width, height,
+                                 socket_functions.IMAGE_FORMAT.encode())
+    with open(index_path + ".tmp", "wb") as index_file:
+        index_file.write(header)
+        index_file.write(np.array(offsets, dtype=OFFSETS_DTYPE).tobytes())
+
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+    return frames_amount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="*", default=ALL_VIDEOS_DIRECTORIES, help="videos to build (default all)")
+    parser.add_argument("--force", action="store_true", help="build even if the archive is up to date")
+    args = parser.parse_args()
+
+    for video in args.videos:
+        video_path, _ = get_video_and_thumbnail_path(video)
+        video_dir = os.path.join(VIDEOS_DIR_PATH, video)
+        if not os.path.exists(video_path):
+            logger.warning(f"{video} has no video file, skipping.")
+            continue
+        if not args.force and is_archive_up_to_date(video_dir, video_path):
+            logger.info(f"The archive of {video} is up to date.")
+            continue
+
+        logger.info(f"Building the archive of {video}...")
+        frames_amount = build_archive(video_path, video_dir)
+        logger.info(f"Built the archive of {video} with {frames_amount} frames.")
+
+
+if __name__ == "__main__":
+    main()
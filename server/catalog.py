@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import cv2
+from ServerConfig import logger, VIDEOS_DIR_PATH, CATALOG_SCAN_INTERVAL
+from database import Video
+from frame_cache import FRAME_CACHE
+
+VIDEO_TYPE_FILE = "video_type.txt"
+THUMBNAIL_FILE = "img.jpg"
+
+
+class VideoEntry(NamedTuple):
+    """
+    A video of the catalog: where its files are, the metadata probed from it, and the times and the size of its
+    files when it was probed (a change of them probes the video again).
+    """
+    name: str
+    directory: str
+    path: str
+    extension: str
+    thumbnail_path: str
+    fps: float
+    frames_amount: int
+    width: int
+    height: int
+    duration: float
+    video_mtime: float
+    video_size: int
+    thumbnail_mtime: float
+    # files are added to the directory when an archive or a seek index is built
+    directory_mtime: float
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+
+class VideoCatalog:
+    """
+    All the videos, by their name, with the metadata probed once from every video. The catalog is kept in the
+    database so a restart does not probe the videos again, and a watcher thread scans the videos directory for
+    videos that were added, removed or changed, so serving a video never touches the files of the catalog.
+    The map of the videos is replaced on a change and never changed in place, so it is read without a lock.
+    """
+
+    def __init__(self, videos_dir: str = VIDEOS_DIR_PATH):
+        self._videos_dir = videos_dir
+        self._videos: Dict[str, VideoEntry] = {}
+        self._loaded = False
+        # the videos that can't be opened, by (extension, modification time, size), they are probed again only
+        # when they change
+        self._broken: Dict[str, tuple] = {}
+        # one scan at a time
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def get(self, video: str) -> Optional[VideoEntry]:
+        """
+        :param video: the video name
+        :return: the video, None if there is no such video
+        """
+        if not self._loaded:
+            self.refresh()
+        return self._videos.get(video)
+
+    def entries(self) -> List[VideoEntry]:
+        """
+        :return: all the videos, by their names
+        """
+        if not self._loaded:
+            self.refresh()
+        return [entry for _, entry in sorted(self._videos.items())]
+
+    def refresh(self) -> bool:
+        """
+        :return: bool. Did the catalog change. Scan the videos directory: probe the videos that were added or
+        changed and drop the videos that were removed, in memory and in the database.
+        """
+        with self._lock:
+            if self._loaded:
+                known = self._videos
+            else:
+                known = {row.name: self.__from_row(row) for row in Video.all()}
+            try:
+                names = [name for name in os.listdir(self._videos_dir)
+                         if os.path.isdir(os.path.join(self._videos_dir, name))]
+            except OSError as e:
+                logger.error(f"Can't scan the videos in {self._videos_dir}: {e}")
+                names = list(known) if self._loaded else []
+
+            videos = {}
+            for name in names:
+                entry = self.__scan(name, known.get(name))
+                if entry is not None:
+                    videos[name] = entry
+
+            for name, entry in videos.items():
+                if known.get(name) != entry:
+                    Video.save(**{field: value for field, value in entry._asdict().items()
+                                  if field not in ("directory", "path", "thumbnail_path")})
+            for name in known.keys() - videos.keys():
+                Video.remove(name)
+            # the cached frames of a video that was replaced or removed are not its frames anymore
+            for name, entry in self._videos.items():
+                if name not in videos or videos[name].video_mtime != entry.video_mtime or \
+                        videos[name].video_size != entry.video_size:
+                    FRAME_CACHE.discard_video(name)
+
+            changed = videos != self._videos
+            added, removed = videos.keys() - self._videos.keys(), self._videos.keys() - videos.keys()
+            if added or removed:
+                logger.info(f"Catalog of {len(videos)} videos, added {sorted(added)}, removed {sorted(removed)}.")
+            self._videos = videos
+            self._loaded = True
+            return changed
+
+    def start_watcher(self, interval: float = CATALOG_SCAN_INTERVAL) -> None:
+        """
+        :param interval: seconds between the scans
+        :return: None. Scan the videos directory from a daemon thread.
+        """
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"The scan of the catalog failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def __from_row(self, row: Video) -> VideoEntry:
+        directory = os.path.join(self._videos_dir, row.name)
+        return VideoEntry(row.name, directory, os.path.join(directory, f"video.{row.extension}"), row.extension,
+                          os.path.join(directory, THUMBNAIL_FILE), row.fps, row.frames_amount, row.width, row.height,
+                          row.duration, row.video_mtime, row.video_size, row.thumbnail_mtime, row.directory_mtime)
+
+    def __scan(self, name: str, known: Optional[VideoEntry]) -> Optional[VideoEntry]:
+        """
+        :param name: the name of a directory in the videos directory
+        :param known: the video as it was in the catalog, None if it is new
+        :return: the video, None if the directory holds no video (yet). Probed only when the video is new or
+        changed.
+        """
+        directory = os.path.join(self._videos_dir, name)
+        try:
+            with open(os.path.join(directory, VIDEO_TYPE_FILE), "r") as file:
+                extension = file.read().strip()
+            path = os.path.join(directory, f"video.{extension}")
+            video_stat = os.stat(path)
+            thumbnail_path = os.path.join(directory, THUMBNAIL_FILE)
+            thumbnail_mtime = os.path.getmtime(thumbnail_path)
+            directory_mtime = os.path.getmtime(directory)
+        except OSError:
+            # not a video, or its files are still being copied
+            return None
+
+        version = (extension, video_stat.st_mtime, video_stat.st_size)
+        if self._broken.get(name) == version:
+            return None
+        if known is not None and (known.extension, known.video_mtime, known.video_size) == version:
+            entry = known._replace(thumbnail_mtime=thumbnail_mtime, directory_mtime=directory_mtime)
+            # the same entry when nothing changed, the caches of the archives and the seek indexes keep it
+            return known if entry == known else entry
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            logger.warning(f"Can't open the video {path}, it is left out of the catalog.")
+            self._broken[name] = version
+            return None
+        self._broken.pop(name, None)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames_amount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        logger.info(f"Probed {name}: {width}x{height}, {fps:g} fps, {frames_amount} frames.")
+        return VideoEntry(name, directory, path, extension, thumbnail_path, fps, frames_amount, width, height,
+                          frames_amount / fps if fps else 0.0, video_stat.st_mtime, video_stat.st_size,
+                          thumbnail_mtime, directory_mtime)
+
+
+CATALOG = VideoCatalog()
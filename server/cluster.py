@@ -0,0 +1,79 @@
+"""
+Run a redirector and several streaming nodes as local processes, a multi-node deployment on one machine. The
+redirector listens at IP and PORT of server/.env (where the clients connect), node N listens at PORT + N and exports
+its metrics at METRICS_PORT + N. The nodes share the videos, the database and the session secret, so a session
+moves between them with its token.
+
+    python server/cluster.py [--nodes N] [--mode threaded|asyncio]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List
+from ServerConfig import logger, IP, PORT, METRICS_PORT, SERVER_MODE, THREADED_MODE, ASYNCIO_MODE
+# the nodes share the database, the session secret and the catalog: they are made here once, before the nodes start,
+# so the nodes don't race to make them and all the nodes sign the tokens with the same secret
+import session_tokens  # noqa: F401
+from catalog import CATALOG
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_cluster(nodes: int, mode: str, ip: str = IP, port: int = PORT,
+                  metrics_port: int = METRICS_PORT) -> List[subprocess.Popen]:
+    """
+    :param nodes: how many streaming nodes
+    :param mode: the mode of the nodes, threaded or asyncio
+    :param ip: the address of the redirector and the nodes
+    :param port: the port of the redirector, the nodes listen at the next ports
+    :param metrics_port: node N exports its metrics at metrics_port + N, 0 turns the exporters off
+    :return: the processes, the redirector first
+    """
+    processes = [subprocess.Popen([sys.executable, os.path.join(SERVER_DIR, "redirector.py")],
+                                  env=dict(os.environ, IP=ip, PORT=str(port)))]
+    for node in range(1, nodes + 1):
+        env = dict(os.environ, IP=ip, PORT=str(port + node), NODE_ID=f"node-{node}", REDIRECTOR_IP=ip,
+                   REDIRECTOR_PORT=str(port), METRICS_PORT=str(metrics_port + node if metrics_port else 0))
+        processes.append(subprocess.Popen([sys.executable, os.path.join(SERVER_DIR, "server.py"), "--mode", mode],
+                                          env=env))
+    return processes
+
+
+def stop_cluster(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--mode", choices=(THREADED_MODE, ASYNCIO_MODE), default=SERVER_MODE)
+    args = parser.parse_args()
+
+    # stopping the cluster stops all its processes
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    CATALOG.refresh()
+    processes = start_cluster(args.nodes, args.mode)
+    logger.info(f"Redirector at {(IP, PORT)}, {args.nodes} nodes at ports {PORT + 1}-{PORT + args.nodes}.")
+    running = set(range(1, len(processes)))
+    try:
+        # a node that exits is dropped by the redirector when its heartbeats stop, the others go on
+        while processes[0].poll() is None:
+            for node in [node for node in running if processes[node].poll() is not None]:
+                logger.warning(f"Node {node} exited with {processes[node].returncode}.")
+                running.remove(node)
+            time.sleep(1)
+        logger.error("The redirector exited, stopping the cluster.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_cluster(processes)
+
+
+if __name__ == "__main__":
+    main()
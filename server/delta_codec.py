@@ -0,0 +1,98 @@
+import math
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from ServerConfig import DELTA_TILE_SIZE, DELTA_THRESHOLD, DELTA_MAX_CHANGED
+import socket_functions
+from frame_codecs import CodecSettings, DEFAULT_SETTINGS
+
+
+class DeltaEncoder:
+    """
+    Encodes the frames of one client as the tiles that changed since the client got them. The first frame (and
+    every frame after `reset`) is sent whole, a frame where nothing changed is sent as REPEAT_FRAME.
+
+    The frames are compared to what the client has, tile by tile, and not to the previous frame, so changes that
+    are too small for a single frame still add up until the tile is sent again.
+    The changed tiles are put side by side in one mosaic image that is encoded once (the tile size is a multiple
+    of the JPEG blocks, so the tiles do not bleed into each other).
+    """
+
+    def __init__(self, tile_size: int = DELTA_TILE_SIZE, threshold: int = DELTA_THRESHOLD,
+                 max_changed: float = DELTA_MAX_CHANGED):
+        self._tile_size = tile_size
+        self._threshold = threshold
+        self._max_changed = max_changed
+        # the frame the client has, padded to whole tiles
+        self._reference: Optional[np.ndarray] = None
+
+    def reset(self) -> None:
+        """
+        :return: None. The next frame is sent whole (after a seek, or when the client has another video).
+        """
+        self._reference = None
+
+    def encode(self, img_frame: np.ndarray, quality: Optional[int] = None,
+               settings: CodecSettings = DEFAULT_SETTINGS) -> Tuple[list, int]:
+        """
+        :param img_frame: numpy array, the frame
+        :param quality: the quality, None for the quality of the settings
+        :param settings: the codec of the session and its parameters
+        :return: a tuple: (the message with the frame, the bytes of the encoded images in the message)
+        """
+        padded = self.__pad(img_frame)
+        if self._reference is None or self._reference.shape != padded.shape:
+            return self.__whole_frame(img_frame, padded, quality, settings)
+
+        tile = self._tile_size
+        rows, columns = padded.shape[0] // tile, padded.shape[1] // tile
+        # the biggest change of a pixel in every tile
+        diff = cv2.absdiff(padded, self._reference)
+        changes = diff.reshape(rows, tile, columns, tile, -1).max(axis=(1, 3, 4))
+        changed_rows, changed_columns = np.nonzero(changes > self._threshold)
+        changed = len(changed_rows)
+
+        if changed == 0:
+            return [socket_functions.REPEAT_FRAME], 0
+        if changed > rows * columns * self._max_changed:
+            return self.__whole_frame(img_frame, padded, quality, settings)
+
+        tiles = self.__tiles(padded)[changed_rows, changed_columns]
+        self.__tiles(self._reference)[changed_rows, changed_columns] = tiles
+
+        mosaic_columns = math.ceil(math.sqrt(changed))
+        mosaic_rows = math.ceil(changed / mosaic_columns)
+        mosaic = np.zeros((mosaic_rows * mosaic_columns,) + tiles.shape[1:], dtype=tiles.dtype)
+        mosaic[:changed] = tiles
+        mosaic = mosaic.reshape(mosaic_rows, mosaic_columns, tile, tile, -1).swapaxes(1, 2) \
+            .reshape(mosaic_rows * tile, mosaic_columns * tile, -1)
+
+        tiles_indexes = (changed_rows * columns + changed_columns).astype(">u2").tobytes()
+        img_bytes = socket_functions.encode_img(mosaic, quality, settings)
+        message = [socket_functions.DELTA_FRAME, tile, mosaic_columns, tiles_indexes, img_bytes]
+        return message, len(tiles_indexes) + len(img_bytes)
+
+    def __whole_frame(self, img_frame: np.ndarray, padded: np.ndarray, quality: Optional[int],
+                      settings: CodecSettings) -> Tuple[list, int]:
+        self._reference = padded.copy()
+        img_bytes = socket_functions.encode_img(img_frame, quality, settings)
+        return [socket_functions.ASK_FOR_FRAME, img_bytes], len(img_bytes)
+
+    def __pad(self, img_frame: np.ndarray) -> np.ndarray:
+        """
+        :return: the frame padded (by repeating the edges) to whole tiles
+        """
+        height, width = img_frame.shape[:2]
+        bottom = -height % self._tile_size
+        right = -width % self._tile_size
+        if not bottom and not right:
+            return img_frame
+        return cv2.copyMakeBorder(img_frame, 0, bottom, 0, right, cv2.BORDER_REPLICATE)
+
+    def __tiles(self, padded: np.ndarray) -> np.ndarray:
+        """
+        :return: a view of the padded frame as (rows, columns, tile, tile, channels)
+        """
+        tile = self._tile_size
+        rows, columns = padded.shape[0] // tile, padded.shape[1] // tile
+        return padded.reshape(rows, tile, columns, tile, -1).swapaxes(1, 2)
@@ -0,0 +1,163 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional
+import numpy as np
+from ServerConfig import logger, ENCODE_WORKERS
+import socket_functions
+from frame_codecs import CodecSettings, DEFAULT_SETTINGS
+
+# the shared memory blocks a worker keeps open, the blocks of frames of other sizes are closed
+WORKER_ATTACHED_BLOCKS = 32
+# seconds between the checks of a worker that the server is still alive
+WORKER_PARENT_CHECK_INTERVAL = 1
+
+_attached: "OrderedDict[str, SharedMemory]" = OrderedDict()
+
+
+def _watch_parent(parent_pid: int) -> None:
+    """
+    Runs in a worker process when it starts.
+    :param parent_pid: the pid of the server
+    :return: None. Exit when the server is gone (it was killed), so the shared memory of the server is freed.
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(WORKER_PARENT_CHECK_INTERVAL)
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def _encode_shared_frame(block_name: str, shape: tuple, dtype: str, quality: Optional[int],
+                         settings: CodecSettings) -> bytes:
+    """
+    Runs in a worker process.
+    :param block_name: the shared memory block that holds the frame
+    :param shape: the shape of the frame
+    :param dtype: the dtype of the frame
+    :param quality: the quality, None for the quality of the settings
+    :param settings: the codec and its parameters
+    :return: the encoded frame
+    """
+    block = _attached.get(block_name)
+    if block is None:
+        block = _attached[block_name] = SharedMemory(name=block_name)
+        if len(_attached) > WORKER_ATTACHED_BLOCKS:
+            _, closed = _attached.popitem(last=False)
+            closed.close()
+    else:
+        _attached.move_to_end(block_name)
+    img_frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return socket_functions.encode_img(img_frame, quality, settings)
+
+
+class EncodePool:
+    """
+    Encodes the frames in a pool of processes, so the encoding of all the clients is spread over the cores instead
+    of sharing the GIL of the server. The frames are handed to the workers through blocks of shared memory (only
+    the name of the block is pickled), the blocks are reused for the next frames. Only the encoded frame comes
+    back through the pipe.
+    The futures are completed out of order, the clients keep them in the order of the frames (see ClientHandler).
+    """
+
+    def __init__(self, workers: int = ENCODE_WORKERS):
+        """
+        :param workers: processes that encode the frames, 0 encodes on the thread that submits the frame
+        """
+        self._workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # the free blocks by their size
+        self._free: Dict[int, List[SharedMemory]] = {}
+        self._blocks: List[SharedMemory] = []
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def submit(self, img_frame: np.ndarray, quality: Optional[int] = None,
+               settings: CodecSettings = DEFAULT_SETTINGS) -> Future:
+        """
+        :param img_frame: numpy array, the frame to encode. It is copied, the caller may change it after.
+        :param quality: the quality, None for the quality of the settings
+        :param settings: the codec and its parameters
+        :return: a future of the encoded frame
+        """
+        if not self._workers:
+            future = Future()
+            future.set_result(socket_functions.encode_img(img_frame, quality, settings))
+            return future
+
+        size = self.__block_size(img_frame.nbytes)
+        block = self.__take_block(size)
+        np.ndarray(img_frame.shape, dtype=img_frame.dtype, buffer=block.buf)[...] = img_frame
+        try:
+            future = self.__executor().submit(_encode_shared_frame, block.name, img_frame.shape, img_frame.dtype.str,
+                                              quality, settings)
+        except Exception:
+            self.__give_back(size, block)
+            raise
+        future.add_done_callback(lambda _: self.__give_back(size, block))
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        :param wait: wait for the frames that are encoding
+        :return: None. Stop the workers and free the shared memory.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        with self._lock:
+            for block in self._blocks:
+                block.close()
+                block.unlink()
+            self._blocks = []
+            self._free = {}
+
+    def __executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # the server runs threads, a forked worker could inherit a lock that one of them holds
+                self._executor = ProcessPoolExecutor(self._workers, mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_watch_parent, initargs=(os.getpid(),))
+                logger.info(f"Encoding the frames in {self._workers} processes.")
+            return self._executor
+
+    @staticmethod
+    def __block_size(nbytes: int) -> int:
+        """
+        :param nbytes: the bytes of the frame
+        :return: the size of the block for the frame, rounded up to a power of two so the frames of close sizes
+        share the blocks
+        """
+        return 1 << max(0, nbytes - 1).bit_length()
+
+    def __take_block(self, size: int) -> SharedMemory:
+        """
+        :param size: the size of the block (see `__block_size`)
+        :return: a free block of the size
+        """
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                return free.pop()
+        block = SharedMemory(create=True, size=size)
+        with self._lock:
+            self._blocks.append(block)
+        return block
+
+    def __give_back(self, size: int, block: SharedMemory) -> None:
+        with self._lock:
+            self._free.setdefault(size, []).append(block)
+
+
+ENCODE_POOL = EncodePool()
+# the shared memory outlives the process unless it is unlinked
+atexit.register(ENCODE_POOL.shutdown, wait=False)
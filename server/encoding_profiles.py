@@ -0,0 +1,45 @@
+import math
+from typing import NamedTuple, Optional, Tuple
+
+
+class EncodingProfile(NamedTuple):
+    """
+    How the frames are encoded: the scale of the source resolution and the JPEG quality (None is the default
+    quality of the encoder).
+    """
+    name: str
+    scale: float
+    quality: Optional[int]
+
+
+SOURCE_PROFILE = EncodingProfile("source", 1.0, None)
+# the profiles the client can choose from, from the best to the smallest
+QUALITY_LADDER = (
+    SOURCE_PROFILE,
+    EncodingProfile("high", 0.75, 70),
+    EncodingProfile("medium", 0.5, 60),
+    EncodingProfile("low", 0.35, 50),
+)
+PROFILES = {profile.name: profile for profile in QUALITY_LADDER}
+# the scale of the display size is rounded up to this step, clients that show the video in close sizes share the
+# frames in the cache
+DISPLAY_SCALE_STEP = 0.05
+
+
+def output_scale(profile: EncodingProfile, resolution: Optional[Tuple[int, int]],
+                 display_size: Optional[Tuple[int, int]]) -> float:
+    """
+    :param profile: the encoding profile
+    :param resolution: (width, height) of the source video, None if unknown
+    :param display_size: (width, height) the client shows the frames in, None if the client did not tell
+    :return: the scale of the source resolution that the frames are encoded in. The scale of the profile, but the
+    frames are never bigger than the client shows them.
+    """
+    if resolution is None or display_size is None:
+        return profile.scale
+
+    width, height = resolution
+    display_width, display_height = display_size
+    display_scale = max(display_width / width, display_height / height)
+    display_scale = max(1, math.ceil(round(display_scale / DISPLAY_SCALE_STEP, 6))) * DISPLAY_SCALE_STEP
+    return round(min(profile.scale, display_scale), 2)
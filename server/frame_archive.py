@@ -0,0 +1,102 @@
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+import numpy as np
+from ServerConfig import logger
+from catalog import CATALOG, VideoEntry
+
+# An archive is made of two files in the directory of the video. The data file is the encoded frames one after
+# the other. The index file is a header and then the offsets of the frames in the data file (the frame i is
+# between offsets[i] and offsets[i + 1]).
+ARCHIVE_DATA_FILE = "frames.bin"
+ARCHIVE_INDEX_FILE = "frames.idx"
+ARCHIVE_MAGIC = b"SVFA"
+ARCHIVE_VERSION = 1
+# magic, version, fps, frames amount, width, height, encoding profile
+ARCHIVE_HEADER = struct.Struct("!4sHdIII16s")
+OFFSETS_DTYPE = np.dtype(">u8")
+
+
+class FrameArchive:
+    """
+    Pre-encoded frames of a video, served straight from a memory map of the data file without decoding.
+    """
+
+    def __init__(self, video_dir: str):
+        with open(os.path.join(video_dir, ARCHIVE_INDEX_FILE), "rb") as file:
+            index = file.read()
+
+        magic, version, fps, frames_amount, width, height, profile = ARCHIVE_HEADER.unpack_from(index)
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            raise ValueError(f"{video_dir} has an unknown archive format")
+
+        self.fps = fps
+        self.frames_amount = frames_amount
+        self.width = width
+        self.height = height
+        self.profile = profile.rstrip(b"\0").decode()
+        self._offsets = np.frombuffer(index, OFFSETS_DTYPE, count=frames_amount + 1, offset=ARCHIVE_HEADER.size)
+
+        with open(os.path.join(video_dir, ARCHIVE_DATA_FILE), "rb") as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._data)
+
+    def frame(self, index: int) -> Optional[memoryview]:
+        """
+        :param index: the index of the frame
+        :return: the encoded frame (a slice of the memory map), None if there is no such frame.
+        """
+        if not 0 <= index < self.frames_amount:
+            return None
+        return self._view[int(self._offsets[index]):int(self._offsets[index + 1])]
+
+    def __repr__(self):
+        return f"FrameArchive({self.frames_amount} frames, {self.width}x{self.height}, {self.fps} fps, {self.profile})"
+
+
+def is_archive_up_to_date(video_dir: str, video_path: str) -> bool:
+    """
+    :param video_dir: the directory of the video
+    :param video_path: the path of the video
+    :return: bool. Is there an archive that was built after the video was changed.
+    """
+    index_path = os.path.join(video_dir, ARCHIVE_INDEX_FILE)
+    data_path = os.path.join(video_dir, ARCHIVE_DATA_FILE)
+    if not os.path.exists(index_path) or not os.path.exists(data_path):
+        return False
+    return os.path.getmtime(index_path) >= os.path.getmtime(video_path)
+
+
+# the video -> (the catalog entry it was opened for, the archive)
+_archives: Dict[str, Tuple[VideoEntry, Optional[FrameArchive]]] = {}
+_archives_lock = threading.Lock()
+
+
+def open_archive(video: str) -> Optional[FrameArchive]:
+    """
+    :param video: the video name
+    :return: the archive of the video, None if there is no up to date archive. The archive is opened once and
+    shared by all the clients, it is looked for again when the catalog sees a change in the directory of the video
+    (an archive was built).
+    """
+    entry = CATALOG.get(video)
+    cached = _archives.get(video)
+    if cached is not None and cached[0] is entry:
+        return cached[1]
+    if entry is None:
+        return None
+
+    with _archives_lock:
+        cached = _archives.get(video)
+        if cached is None or cached[0] is not entry:
+            archive = None
+            if is_archive_up_to_date(entry.directory, entry.path):
+                try:
+                    archive = FrameArchive(entry.directory)
+                    logger.info(f"Serving {video} from {archive}.")
+                except (OSError, ValueError, struct.error) as e:
+                    logger.error(f"Can't open the archive of {video}: {e}")
+            cached = _archives[video] = (entry, archive)
+        return cached[1]
@@ -0,0 +1,146 @@
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional, Tuple
+from ServerConfig import FRAME_CACHE_MAX_BYTES
+
+
+def _completed(value: Optional[bytes]) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class FrameCache:
+    """
+    LRU cache of encoded frames shared by all the clients, keyed by (video, frame index, encoding profile, scale,
+    codec).
+    The size of the cache is limited by the bytes of the frames it holds.
+    A frame that is being made is registered before it is decoded, the readers that miss it meanwhile take the
+    future of that fill instead of decoding and encoding it again. Only the reader that makes the frame counts a
+    miss.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._frames = OrderedDict()
+        # the futures of the frames that are being made
+        self._fills: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_fill(self, key: Hashable, fill: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """
+        :param key: (video, frame index, encoding profile, scale, codec)
+        :param fill: function that makes the frame when it is not in the cache, returns None if there is no such
+        frame (None is not cached).
+        :return: the encoded frame
+        """
+        future, _ = self.get_or_start(key, lambda: _completed(fill()))
+        return None if future is None else future.result()
+
+    def get_or_start(self, key: Hashable, start: Callable[[], Optional[Future]]) -> Tuple[Optional[Future], bool]:
+        """
+        :param key: (video, frame index, encoding profile, scale, codec)
+        :param start: function that starts making the frame when it is neither in the cache nor being made,
+        returns the future of the encoded frame, None if there is no such frame
+        :return: a tuple: (the future of the encoded frame, did this call start making it). A frame in the cache
+        is in a completed future, a frame that another reader makes is the future of its fill (its result is None
+        if there is no such frame). The future is None when `start` found no such frame.
+        """
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return _completed(frame), False
+
+            pending = self._fills.get(key)
+            if pending is not None:
+                # another reader is making this frame right now
+                self.hits += 1
+                return pending, False
+            self.misses += 1
+            pending = self._fills[key] = Future()
+
+        try:
+            started = start()
+        except Exception as e:
+            self.__finish(key, pending, None, e)
+            raise
+        if started is None:
+            self.__finish(key, pending, None, None)
+            return None, True
+        started.add_done_callback(functools.partial(self.__filled, key, pending))
+        return pending, True
+
+    def __filled(self, key: Hashable, pending: Future, started: Future) -> None:
+        """
+        :return: None. The frame of the fill was made (or failed), complete the future of the fill.
+        """
+        error = started.exception()
+        self.__finish(key, pending, None if error is not None else started.result(), error)
+
+    def __finish(self, key: Hashable, pending: Future, frame: Optional[bytes], error: Optional[BaseException]) \
+            -> None:
+        """
+        :return: None. Cache the frame of the fill and complete its future, the next miss makes the frame again.
+        """
+        with self._lock:
+            del self._fills[key]
+            if frame is not None:
+                self.__add(key, frame)
+        if error is not None:
+            pending.set_exception(error)
+        else:
+            pending.set_result(frame)
+
+    def peek(self, key: Hashable) -> Optional[bytes]:
+        """
+        :param key: (video, frame index, encoding profile, scale, codec)
+        :return: the encoded frame, None if it is not in the cache. Counts no hit or miss and does not make the
+        frame recently used.
+        """
+        with self._lock:
+            return self._frames.get(key)
+
+    def discard_video(self, video: str) -> None:
+        """
+        :param video: the video name
+        :return: None. Drop all the frames of the video (it changed or it was removed).
+        """
+        with self._lock:
+            for key in [key for key in self._frames if key[0] == video]:
+                self._bytes -= len(self._frames.pop(key))
+
+    def __add(self, key: Hashable, frame: bytes) -> None:
+        """
+        :return: None. Add the frame and evict the least recently used frames while the cache is too big.
+        Must be called with the lock.
+        """
+        if len(frame) > self._max_bytes:
+            return
+        self._frames[key] = frame
+        self._bytes += len(frame)
+        while self._bytes > self._max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        :return: the counters of the cache
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "frames": len(self._frames), "bytes": self._bytes, "max_bytes": self._max_bytes}
+
+    def __repr__(self):
+        return f"FrameCache({self.stats()})"
+
+
+FRAME_CACHE = FrameCache(FRAME_CACHE_MAX_BYTES)
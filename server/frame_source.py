@@ -0,0 +1,160 @@
+import functools
+import time
+from concurrent.futures import Future
+from typing import Optional
+import cv2
+import numpy as np
+import socket_functions
+from catalog import CATALOG
+from encode_pool import ENCODE_POOL
+from encoding_profiles import PROFILES
+from frame_archive import open_archive
+from frame_cache import FRAME_CACHE
+from metrics import SessionMetrics, READ_STAGE, ENCODE_STAGE
+from seek_index import get_seek_index, seek
+
+
+class FrameSource:
+    """
+    Reads and prepares the frames of the videos for one reader: a client, or the producer of a watch party. The
+    frames are decoded from the archive of a video when there is one, otherwise with the capture of the source,
+    which is kept open between the frames and moves only for a seek.
+    The keys of the frames are the keys of the frame cache (video, index, profile name, scale, codec). The reads
+    and the encodes are recorded in the metrics of the reader. Used by one thread at a time.
+    """
+
+    def __init__(self, metrics: SessionMetrics):
+        self._metrics = metrics
+        self._cap = None
+        # the video of the capture and the index of the frame that the capture reads next
+        self._cap_video = None
+        self._cap_position = 0
+
+    def prepare_encoded(self, key: tuple) -> Optional[Future]:
+        """
+        :param key: the key of the frame in the frame cache
+        :return: the future of the encoded frame (its result is None if there is no such frame), None if there is no
+        such frame. A frame in the cache is not decoded, it is kept in the future in case it is evicted before it is
+        sent. A frame that another reader is making is not made again, the future of that fill is returned.
+        Otherwise the frame is decoded and scaled here, and encoded in the encode pool with the quality of the
+        profile.
+        """
+        future, _ = FRAME_CACHE.get_or_start(key, functools.partial(self.__encode, key))
+        return future
+
+    def prepare_ahead(self, key: tuple) -> Optional[Future]:
+        """
+        :param key: the key of the frame in the frame cache
+        :return: the future of the encoded frame, None if there is no such frame, like `prepare_encoded` for a
+        read-ahead. A frame that another reader is making is waited for, so the read-ahead follows that reader on
+        the frames it makes instead of passing it and making the next frames again with its own capture.
+        """
+        future, started = FRAME_CACHE.get_or_start(key, functools.partial(self.__encode, key))
+        if future is None or started or future.exception() is not None:
+            return future
+        return None if future.result() is None else future
+
+    def __encode(self, key: tuple) -> Optional[Future]:
+        """
+        :param key: the key of the frame in the frame cache
+        :return: the future of the frame encoded in the encode pool, None if there is no such frame
+        """
+        img_frame = self.prepare_decoded(key)
+        if img_frame is None:
+            return None
+        submitted = time.perf_counter()
+        future = ENCODE_POOL.submit(img_frame, PROFILES[key[2]].quality, key[4])
+        future.add_done_callback(lambda _: self._metrics.observe(ENCODE_STAGE, time.perf_counter() - submitted))
+        return future
+
+    def prepare_decoded(self, key: tuple) -> Optional[np.ndarray]:
+        """
+        :param key: the key of the frame in the frame cache
+        :return: the decoded frame in the scale, None if there is no such frame
+        """
+        video, index, _, scale, _ = key
+        img_frame = self.read_frame(video, index)
+        return None if img_frame is None else self.__scale_frame(img_frame, scale)
+
+    def read_frame(self, video: str, index: int) -> Optional[np.ndarray]:
+        """
+        :param video: the video name
+        :param index: the index of the frame
+        :return: the decoded frame at the source resolution, None if there is no such frame. Decoded from the
+        archive of the video when there is one, otherwise with the capture.
+        """
+        with self._metrics.time(READ_STAGE):
+            archive = open_archive(video)
+            if archive is not None:
+                img_bytes = archive.frame(index)
+                return None if img_bytes is None else socket_functions.decode_img(img_bytes)
+
+            if not self.__open_capture(video):
+                return None
+            if self._cap_position != index:
+                # a seek, or the frames in between were served from the cache
+                seek(self._cap, self._cap_position, index, get_seek_index(video))
+                self._cap_position = index
+
+            ret, img_frame = self._cap.read()
+            if not ret:
+                return None
+
+            self._cap_position += 1
+            return img_frame
+
+    def detach_capture(self) -> Optional[tuple]:
+        """
+        :return: a tuple: (the video, the capture, the index it reads next) to keep the capture for a resume of the
+        session, None if there is no capture. The source opens a new capture when it needs one.
+        """
+        if self._cap is None:
+            return None
+        detached = self._cap_video, self._cap, self._cap_position
+        self._cap = None
+        return detached
+
+    def attach_capture(self, video: str, cap: cv2.VideoCapture, position: int) -> None:
+        """
+        :return: None. Continue with a capture that was detached from another source, the previous one is released.
+        """
+        self.release()
+        self._cap_video, self._cap, self._cap_position = video, cap, position
+
+    def release(self) -> None:
+        """
+        :return: None. Release the capture.
+        """
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def __open_capture(self, video: str) -> bool:
+        """
+        :param video: the video name
+        :return: bool. Make sure the capture reads the video, False if there is no such video (it was removed from
+        the catalog).
+        """
+        if self._cap is not None and self._cap_video == video and self._cap.isOpened():
+            return True
+
+        entry = CATALOG.get(video)
+        if entry is None:
+            return False
+        self._cap = cv2.VideoCapture(entry.path)
+        self._cap_video = video
+        self._cap_position = 0
+        return True
+
+    @staticmethod
+    def __scale_frame(img_frame: np.ndarray, scale: float) -> np.ndarray:
+        """
+        :param img_frame: numpy array, the frame at the source resolution
+        :param scale: the scale of the source resolution
+        :return: the frame in the scale
+        """
+        if scale == 1:
+            return img_frame
+        height, width = img_frame.shape[:2]
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(img_frame, size, interpolation=cv2.INTER_AREA)
@@ -0,0 +1,246 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Set
+from ServerConfig import logger, METRICS_IP, METRICS_PORT
+
+# the stages of serving a frame that are timed: decoding it from the capture (or the archive), encoding it (from
+# handing it to the encode pool until it was encoded), packing the message and writing it to the socket. The frame
+# stage is what serving a frame costs the thread of the client, from taking the frame until it was sent: the read
+# and the encode of a stream are done ahead in the read-ahead thread (see read_ahead.py)
+READ_STAGE = "read"
+ENCODE_STAGE = "encode"
+SERIALISE_STAGE = "serialise"
+SEND_STAGE = "send"
+FRAME_STAGE = "frame"
+STAGES = (READ_STAGE, ENCODE_STAGE, SERIALISE_STAGE, SEND_STAGE, FRAME_STAGE)
+BYTES_SENT = "bytes_sent"
+FRAMES_SERVED = "frames_served"
+SEEKS = "seeks"
+COUNTERS = (BYTES_SENT, FRAMES_SERVED, SEEKS)
+# the upper bounds (seconds) of the buckets of the histograms, the last bucket has no bound
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+PROMETHEUS_PREFIX = "streaming"
+
+
+class Histogram:
+    """
+    Counts the durations of a stage in fixed buckets, so an observation is a bisect and two additions.
+    """
+    __slots__ = ("counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def add(self, other: "Histogram") -> None:
+        """
+        :param other: another histogram
+        :return: None. Add the observations of the other histogram to this one.
+        """
+        for bucket, amount in enumerate(other.counts):
+            self.counts[bucket] += amount
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: between 0 and 1
+        :return: the upper bound (seconds) of the bucket of the quantile, the largest bound when it is above all
+        the bounds
+        """
+        rank = q * self.count
+        seen = 0
+        for bucket, amount in enumerate(self.counts):
+            seen += amount
+            if amount and seen >= rank:
+                return BUCKETS[min(bucket, len(BUCKETS) - 1)]
+        return 0.0
+
+    def summary(self) -> dict:
+        count = self.count
+        return {
+            "count": count,
+            "total_ms": round(self.sum * 1000, 3),
+            "mean_ms": round(self.sum * 1000 / count, 3) if count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+        }
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class SessionMetrics:
+    """
+    The counters and the histograms of the stages of one client. A stage is recorded by one thread at a time (the
+    thread that serves the client or the thread that writes its messages, its read-ahead thread for the read stage of
+    a stream, the encode pool for the encode stage, or the producer of the watch party the client hosts while it does
+    not stream by itself), so recording takes no lock. The totals of the server read them from other threads, at
+    worst they miss the observation that is being added.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+    def time(self, stage: str) -> _Timer:
+        """
+        :param stage: one of STAGES
+        :return: a context manager that adds the time spent inside it to the stage
+        """
+        return _Timer(self.stages[stage])
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.stages[stage].observe(seconds)
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        self.counters[counter] += amount
+
+    def add(self, other: "SessionMetrics") -> None:
+        """
+        :param other: the metrics of another session
+        :return: None. Add the metrics of the other session to these.
+        """
+        for stage, histogram in other.stages.items():
+            self.stages[stage].add(histogram)
+        for counter, amount in other.counters.items():
+            self.counters[counter] += amount
+
+    def summary(self) -> dict:
+        """
+        :return: the counters, and the count, the time and the percentiles (the bounds of the buckets) of every
+        stage
+        """
+        return {"counters": dict(self.counters),
+                "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()}}
+
+
+class ServerMetrics:
+    """
+    The metrics of all the sessions. The sessions record into their own metrics, the totals are summed only when
+    they are asked for. The metrics of a closed session are kept in the totals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Set[SessionMetrics] = set()
+        self._closed = SessionMetrics()
+
+    def open_session(self) -> SessionMetrics:
+        """
+        :return: the metrics of a new session, close them with `close_session` when the client disconnects
+        """
+        session = SessionMetrics()
+        with self._lock:
+            self._sessions.add(session)
+        return session
+
+    def close_session(self, session: SessionMetrics) -> None:
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+                self._closed.add(session)
+
+    @property
+    def active_sessions(self) -> int:
+        return len(self._sessions)
+
+    def totals(self) -> SessionMetrics:
+        """
+        :return: the metrics of all the sessions, open and closed, added up
+        """
+        totals = SessionMetrics()
+        with self._lock:
+            totals.add(self._closed)
+            for session in self._sessions:
+                totals.add(session)
+        return totals
+
+    def summary(self) -> dict:
+        summary = self.totals().summary()
+        summary["active_sessions"] = self.active_sessions
+        return summary
+
+    def prometheus(self) -> str:
+        """
+        :return: the totals in the text format of Prometheus
+        """
+        totals = self.totals()
+        name = f"{PROMETHEUS_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each stage of serving a frame.",
+                 f"# TYPE {name} histogram"]
+        for stage, histogram in totals.stages.items():
+            cumulative = 0
+            for bound, amount in zip(BUCKETS + (float("inf"),), histogram.counts):
+                cumulative += amount
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+        for counter, amount in totals.counters.items():
+            name = f"{PROMETHEUS_PREFIX}_{counter}_total"
+            lines += [f"# TYPE {name} counter", f"{name} {amount}"]
+        name = f"{PROMETHEUS_PREFIX}_active_sessions"
+        lines += [f"# TYPE {name} gauge", f"{name} {self.active_sessions}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = ServerMetrics()
+
+
+class _ExporterHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics exporter: {format % args}")
+
+
+def start_exporter(ip: str = METRICS_IP, port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    :param ip: the address the exporter listens on, the local host by default
+    :param port: the port of the exporter, 0 does not start it
+    :return: the HTTP server that serves `/metrics` from a daemon thread, None if it did not start
+    """
+    if not port:
+        return None
+    try:
+        exporter = ThreadingHTTPServer((ip, port), _ExporterHandler)
+    except OSError as error:
+        logger.warning(f"The metrics exporter can't listen at {(ip, port)}: {error}")
+        return None
+    exporter.daemon_threads = True
+    threading.Thread(target=exporter.serve_forever, name="metrics-exporter", daemon=True).start()
+    logger.info(f"Metrics at http://{ip}:{port}/metrics")
+    return exporter
@@ -0,0 +1,112 @@
+import threading
+from collections import deque
+from typing import Callable, Optional
+from ServerConfig import logger
+
+
+class ReadAhead:
+    """
+    Prepares the next frames of a stream in a thread of the session, into a bounded queue, so serving a frame is
+    taking it from the queue. The keys of the frames are tuples of (video, frame index, ...), the frame after a key
+    is the key with the next index.
+    The thread waits while the queue is full (the client does not take frames, it paused). Taking a frame that is
+    not the next one (a seek, or a change of the profile, the size or the codec) flushes the queue and restarts the
+    thread at that frame.
+    """
+
+    def __init__(self, prepare: Callable[[tuple], Optional[object]], depth: int, name: str):
+        """
+        :param prepare: makes the item of a frame from its key, runs in the thread. Returns None when there is no
+        such frame (the end of the video), the thread stops there.
+        :param depth: how many frames are prepared ahead
+        :param name: the name of the thread
+        """
+        self._prepare = prepare
+        self._depth = depth
+        self._name = name
+        self._changed = threading.Condition()
+        # (key, item, error) of the prepared frames, in order
+        self._items = deque()
+        # the key the thread prepares next, None when it has nothing to prepare
+        self._next_key: Optional[tuple] = None
+        # changes on every restart, a frame that was being prepared before it is thrown away
+        self._generation = 0
+        self._thread = None
+        self._closed = False
+
+    def take(self, key: tuple) -> Optional[object]:
+        """
+        :param key: the key of the frame
+        :return: the item of the frame, None if there is no such frame. Waits while the frame is prepared.
+        """
+        with self._changed:
+            if self._items:
+                is_coming = self._items[0][0] == key
+            else:
+                is_coming = self._next_key == key
+            if not is_coming:
+                self.__restart(key)
+            self._changed.wait_for(lambda: self._items)
+            _, item, error = self._items.popleft()
+            self._changed.notify_all()
+        if error is not None:
+            raise error
+        return item
+
+    def flush(self) -> None:
+        """
+        :return: None. Throw away the prepared frames and stop preparing until the next `take`.
+        """
+        with self._changed:
+            self._items.clear()
+            self._next_key = None
+            self._generation += 1
+
+    def close(self) -> None:
+        """
+        :return: None. Stop the thread, after the frame it prepares now.
+        """
+        with self._changed:
+            self._closed = True
+            self._items.clear()
+            self._changed.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __restart(self, key: tuple) -> None:
+        """
+        :return: None. Flush the queue and prepare the frames from the key. Must be called with the lock.
+        """
+        self._items.clear()
+        self._next_key = key
+        self._generation += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.__run, name=self._name, daemon=True)
+            self._thread.start()
+        self._changed.notify_all()
+
+    def __run(self) -> None:
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._closed or
+                                       (self._next_key is not None and len(self._items) < self._depth))
+                if self._closed:
+                    return
+                key, generation = self._next_key, self._generation
+
+            item, error = None, None
+            try:
+                item = self._prepare(key)
+            except Exception as e:
+                logger.error(f"{self._name} failed to prepare {key}: {e}")
+                error = e
+
+            with self._changed:
+                if generation != self._generation:
+                    continue
+                self._items.append((key, item, error))
+                if item is None or error is not None:
+                    self._next_key = None
+                else:
+                    self._next_key = (key[0], key[1] + 1) + key[2:]
+                self._changed.notify_all()
@@ -0,0 +1,312 @@
+import bisect
+import functools
+import hashlib
+import math
+import pickle
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import socket_functions
+from socket_functions import read_data_from_socket, send_data_through_socket, MessageTooLargeError
+from ServerConfig import IP, PORT, MAX_LISTENERS, SERVER_TIMEOUT, logger, REDIRECTOR_IP, REDIRECTOR_PORT, NODE_ID, \
+    HEARTBEAT_INTERVAL, NODE_TIMEOUT, RING_POINTS, LOAD_FACTOR, MAX_MESSAGE_SIZE
+from session_tokens import sign_heartbeat, verify_heartbeat
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+# what reading a message that is not a valid message of the wire protocol raises
+_BAD_MESSAGE_ERRORS = (MessageTooLargeError, pickle.UnpicklingError, EOFError, ValueError, KeyError, IndexError,
+                       struct.error)
+
+
+def _is_heartbeat(data: list) -> bool:
+    """
+    :param data: a NODE_HEARTBEAT message
+    :return: bool. The message has the fields of a heartbeat: [NODE_HEARTBEAT, node id, [ip, port], sessions,
+    the time it was sent, signature].
+    """
+    if len(data) != 6:
+        return False
+    _, node_id, address, sessions, sent_at, signature = data
+    return (isinstance(node_id, str) and isinstance(address, (list, tuple)) and len(address) == 2
+            and isinstance(address[0], str) and _is_int(address[1]) and 0 < address[1] < 65536
+            and _is_int(sessions) and sessions >= 0
+            and isinstance(sent_at, (int, float)) and not isinstance(sent_at, bool) and math.isfinite(sent_at)
+            and isinstance(signature, str))
+
+
+class HashRing:
+    """
+    Consistent hashing of the videos on the nodes. Every node has `points` points on the ring and a video belongs
+    to the first node after the hash of its name, so a node that joins or leaves moves only the videos of its
+    points and the other nodes keep their videos (and their hot caches).
+    """
+
+    def __init__(self, points: int = RING_POINTS):
+        self._points = points
+        # the hashes of the points in order, and the node of every point
+        self._hashes: List[int] = []
+        self._nodes: List[str] = []
+
+    def add(self, node: str) -> None:
+        for point in range(self._points):
+            point_hash = _ring_hash(f"{node}#{point}")
+            index = bisect.bisect(self._hashes, point_hash)
+            self._hashes.insert(index, point_hash)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        kept = [(point_hash, owner) for point_hash, owner in zip(self._hashes, self._nodes) if owner != node]
+        self._hashes = [point_hash for point_hash, _ in kept]
+        self._nodes = [owner for _, owner in kept]
+
+    def nodes_for(self, key: str) -> Iterator[str]:
+        """
+        :param key: the video name
+        :return: the nodes in the order of the ring from the hash of the key, every node once. The first is the
+        owner of the key.
+        """
+        start = bisect.bisect(self._hashes, _ring_hash(key))
+        seen = set()
+        for offset in range(len(self._nodes)):
+            node = self._nodes[(start + offset) % len(self._nodes)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+
+
+class Node(NamedTuple):
+    """
+    A streaming node as its last heartbeat told: where the clients connect to it and how many sessions it serves.
+    """
+    node_id: str
+    address: Tuple[str, int]
+    sessions: int
+    heartbeat_at: float
+
+
+class NodeRegistry:
+    """
+    The live nodes and the ring of their videos. A node joins with its first heartbeat and is dropped when it missed
+    `timeout` seconds of heartbeats.
+    The load of a node is the sessions of its last heartbeat and the clients that were sent to it since, so a burst
+    of clients between two heartbeats is not sent to the same node.
+    """
+
+    def __init__(self, timeout: float = NODE_TIMEOUT, load_factor: float = LOAD_FACTOR):
+        self._timeout = timeout
+        # a factor below 1 would leave no node with room for the next client
+        self._load_factor = max(1.0, load_factor)
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, Node] = {}
+        self._sent: Dict[str, int] = {}
+        self._ring = HashRing()
+
+    def heartbeat(self, node_id: str, address: tuple, sessions: int) -> None:
+        """
+        :param node_id: the node
+        :param address: (ip, port) the clients connect to
+        :param sessions: how many clients the node serves now
+        :return: None. Add the node, or refresh its load.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.__drop_silent(now)
+            if node_id not in self._nodes:
+                self._ring.add(node_id)
+                logger.info(f"Node {node_id} at {tuple(address)} joined, {len(self._nodes) + 1} nodes.")
+            self._nodes[node_id] = Node(node_id, (address[0], address[1]), sessions, now)
+            self._sent[node_id] = 0
+
+    def locate(self, video: Optional[str]) -> Optional[Tuple[str, int]]:
+        """
+        :param video: the video, None for a client that did not choose a video yet
+        :return: the address of the node for the client, None if there is no node. The owner of the video on the
+        ring, unless its load is above `load_factor` times the average load, then the next node on the ring that is
+        not (consistent hashing with bounded loads). A client without a video goes to the least loaded node.
+        """
+        with self._lock:
+            self.__drop_silent(time.monotonic())
+            if not self._nodes:
+                return None
+            loads = {node_id: node.sessions + self._sent[node_id] for node_id, node in self._nodes.items()}
+            if video is None:
+                chosen = min(loads, key=loads.get)
+            else:
+                # the average load is below the capacity, so some node is always below it
+                capacity = math.ceil(self._load_factor * (sum(loads.values()) + 1) / len(loads))
+                chosen = next(node_id for node_id in self._ring.nodes_for(video) if loads[node_id] < capacity)
+            self._sent[chosen] += 1
+            return self._nodes[chosen].address
+
+    def nodes(self) -> List[Node]:
+        with self._lock:
+            self.__drop_silent(time.monotonic())
+            return sorted(self._nodes.values())
+
+    def __drop_silent(self, now: float) -> None:
+        """
+        :return: None. Drop the nodes that missed their heartbeats. Must be called with the lock.
+        """
+        for node in [node for node in self._nodes.values() if now - node.heartbeat_at > self._timeout]:
+            del self._nodes[node.node_id]
+            del self._sent[node.node_id]
+            self._ring.remove(node.node_id)
+            logger.warning(f"Node {node.node_id} missed its heartbeats and was dropped, {len(self._nodes)} nodes.")
+
+
+class RedirectorConnection(threading.Thread):
+    """
+    A connection to the redirector: a client that asks which node serves a video, or a node that sends its
+    heartbeats.
+    Anyone can connect, so a message is checked before it is handled. A message that can't be read closes the
+    connection, a message of the wrong shape is ignored.
+    """
+    # the length of the messages the redirector takes, with the opcode
+    MESSAGE_LENGTHS = {socket_functions.HELLO: 2, socket_functions.LOCATE_NODE: 2, socket_functions.NODE_HEARTBEAT: 6}
+
+    def __init__(self, registry: NodeRegistry, sock: socket.socket, addr: tuple):
+        super().__init__(daemon=True)
+        self._registry = registry
+        self._sock = sock
+        self._addr = addr
+        self._protocol = socket_functions.LEGACY_PROTOCOL
+
+    def run(self) -> None:
+        try:
+            while True:
+                got_data, data = read_data_from_socket(self._sock, max_size=MAX_MESSAGE_SIZE)
+                if not got_data:
+                    break
+                self.handle_data(data)
+        except _BAD_MESSAGE_ERRORS as e:
+            logger.warning(f"{self._addr} sent a message the redirector can't read, closing the connection: {e!r}")
+        except OSError as e:
+            logger.debug(f"Connection {self._addr} to the redirector failed: {e}")
+        finally:
+            self._sock.close()
+
+    def handle_data(self, data: list) -> None:
+        switch = {
+            socket_functions.HELLO: functools.partial(self.__hello, data),
+            socket_functions.LOCATE_NODE: functools.partial(self.__locate_node, data),
+            socket_functions.NODE_HEARTBEAT: functools.partial(self.__heartbeat, data),
+        }
+        if not isinstance(data, list) or not data or not isinstance(data[0], str) or data[0] not in switch:
+            logger.warning(f"{self._addr} sent {str(data)[:100]} to the redirector.")
+            return
+        if len(data) != self.MESSAGE_LENGTHS[data[0]]:
+            logger.warning(f"{self._addr} sent {data[0]} with {len(data) - 1} values to the redirector.")
+            return
+        switch[data[0]]()
+
+    def __hello(self, data: list) -> None:
+        """
+        :param data: Contains the wire protocols the client can use.
+        :return: None. The redirector has one feature, it tells the client to ask it for a node.
+        """
+        if not isinstance(data[1], list) or not all(_is_int(protocol) for protocol in data[1]):
+            logger.warning(f"{self._addr} offered the protocols {str(data[1])[:100]} to the redirector.")
+            return
+        protocol = socket_functions.choose_protocol(data[1])
+        send_data_through_socket(self._sock, [socket_functions.HELLO, protocol,
+                                              [socket_functions.REDIRECT_CAPABILITY]], self._protocol)
+        self._protocol = protocol
+
+    def __locate_node(self, data: list) -> None:
+        """
+        :param data: Contains the video, None when the client did not choose a video yet.
+        :return: None. Send the ip and the port of the node for the video (None and None when there is no node).
+        """
+        video = data[1]
+        if video is not None and not isinstance(video, str):
+            logger.warning(f"{self._addr} asked the redirector for a node of {video!r}.")
+            return
+        address = self._registry.locate(video)
+        ip, port = address if address is not None else (None, None)
+        logger.debug(f"Sent {self._addr} to {address} for {video}.")
+        send_data_through_socket(self._sock, [socket_functions.LOCATE_NODE, video, ip, port], self._protocol)
+
+    def __heartbeat(self, data: list) -> None:
+        """
+        :param data: Contains the id of the node, its address, its sessions, the time it was sent and its signature.
+        :return: None. Anyone can connect to the redirector, so only a heartbeat that is signed with the session
+        secret of the nodes is taken.
+        """
+        if not _is_heartbeat(data) or not verify_heartbeat(*data[1:]):
+            logger.warning(f"{self._addr} sent a heartbeat that is malformed, stale or not signed by a node.")
+            return
+        self._registry.heartbeat(data[1], data[2], data[3])
+
+
+class Redirector:
+    """
+    The front of several streaming nodes: the clients connect to it first and it tells them which node to connect
+    to. The frames never pass through the redirector.
+    """
+
+    def __init__(self, ip: str, port: int, max_listeners: int, registry: NodeRegistry = None):
+        self._addr = (ip, port)
+        self._max_listeners = max_listeners
+        self._registry = registry or NodeRegistry()
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        socket.setdefaulttimeout(SERVER_TIMEOUT)
+
+    def run(self) -> None:
+        self._socket.bind(self._addr)
+        self._socket.listen(self._max_listeners)
+        logger.info(f"REDIRECTOR LISTENING AT {self._addr}")
+        while True:
+            conn, addr = self._socket.accept()
+            RedirectorConnection(self._registry, conn, addr).start()
+
+
+def start_heartbeat(sessions: Callable[[], int], node_id: str = NODE_ID, address: tuple = (IP, PORT),
+                    redirector: tuple = (REDIRECTOR_IP, REDIRECTOR_PORT)) -> Optional[threading.Thread]:
+    """
+    :param sessions: returns how many clients the node serves now
+    :param node_id: the id of the node
+    :param address: the address the clients connect to
+    :param redirector: the address of the redirector, port 0 does not start the heartbeats
+    :return: the daemon thread that sends a heartbeat every HEARTBEAT_INTERVAL seconds, None if it did not start.
+    The first heartbeat registers the node. The thread connects again when the redirector restarts.
+    """
+    if not redirector[1]:
+        return None
+
+    def beat():
+        sock = None
+        while True:
+            # the first heartbeat waits for the server to listen
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                if sock is None:
+                    sock = socket.create_connection(redirector, timeout=SERVER_TIMEOUT)
+                    logger.info(f"Node {node_id} sends its heartbeats to the redirector at {redirector}.")
+                load, sent_at = sessions(), time.time()
+                signature = sign_heartbeat(node_id, list(address), load, sent_at)
+                send_data_through_socket(sock, [socket_functions.NODE_HEARTBEAT, node_id, list(address), load, sent_at,
+                                                signature], socket_functions.BINARY_PROTOCOL)
+            except OSError as e:
+                if sock is not None:
+                    logger.warning(f"Lost the redirector at {redirector}: {e}")
+                    sock.close()
+                    sock = None
+
+    thread = threading.Thread(target=beat, name="heartbeat", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    Redirector(IP, PORT, MAX_LISTENERS).run()
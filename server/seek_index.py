@@ -0,0 +1,145 @@
+import bisect
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import cv2
+from ServerConfig import logger
+from catalog import CATALOG
+
+SEEK_INDEX_FILE = "seek_index.json"
+# without an index we don't know where the keyframes are, so we grab forward only for short jumps
+MAX_BLIND_GRAB_FRAMES = 30
+# how many frames before the target the FFmpeg backend of OpenCV starts the decoding of a seek
+OPENCV_SEEK_BACKTRACK = 16
+
+
+class SeekIndex:
+    """
+    The keyframes of a video. Seeking to any frame means decoding from the keyframe before it.
+    """
+
+    def __init__(self, keyframes: List[int]):
+        self.keyframes = keyframes
+
+    def keyframe_before(self, index: int) -> int:
+        """
+        :param index: the index of a frame
+        :return: the index of the last keyframe at or before the frame
+        """
+        position = bisect.bisect_right(self.keyframes, index)
+        return self.keyframes[position - 1] if position else 0
+
+    def __len__(self):
+        return len(self.keyframes)
+
+    @classmethod
+    def build(cls, video_path: str) -> Optional["SeekIndex"]:
+        """
+        :param video_path: the path of the video
+        :return: the index of the video, None if the backend can't tell the keyframes. The packets are read
+        without decoding them.
+        """
+        if not hasattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME"):
+            return None
+
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+        if not cap.isOpened() or cap.get(cv2.CAP_PROP_FORMAT) != -1:
+            return None
+
+        keyframes = []
+        index = 0
+        while cap.grab():
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(index)
+            index += 1
+        cap.release()
+        return cls(keyframes) if keyframes else None
+
+
+def seek(cap: cv2.VideoCapture, position: int, index: int, seek_index: Optional[SeekIndex]) -> None:
+    """
+    :param cap: the capture, the next frame it reads is `position`
+    :param position: the current position of the capture
+    :param index: the frame that the capture should read next
+    :param seek_index: the seek index of the video, None if there is no index
+    :return: None. Move the capture with as little decoding as possible. The capture seeks by itself to the
+    keyframe before (index - OPENCV_SEEK_BACKTRACK) and decodes from there, so when the capture is already at or
+    after that keyframe we grab (decode without retrieving) forward from the current position instead.
+    """
+    if position == index:
+        return
+
+    if index < position:
+        can_grab = False
+    elif seek_index is None:
+        can_grab = index - position <= MAX_BLIND_GRAB_FRAMES
+    else:
+        can_grab = position >= seek_index.keyframe_before(max(index - OPENCV_SEEK_BACKTRACK, 0))
+
+    if not can_grab:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        return
+
+    for _ in range(index - position):
+        cap.grab()
+
+
+def _load(video_dir: str, video_path: str) -> Optional[SeekIndex]:
+    """
+    :return: the persisted seek index of the video, None if there is none or the video changed since.
+    """
+    try:
+        with open(os.path.join(video_dir, SEEK_INDEX_FILE), "r") as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if saved.get("video_mtime") != os.path.getmtime(video_path):
+        return None
+    return SeekIndex(saved["keyframes"])
+
+
+def _save(video: str, video_dir: str, video_path: str, seek_index: SeekIndex) -> None:
+    try:
+        with open(os.path.join(video_dir, SEEK_INDEX_FILE), "w") as file:
+            json.dump({"video_mtime": os.path.getmtime(video_path), "keyframes": seek_index.keyframes}, file)
+    except OSError as e:
+        logger.warning(f"Can't save the seek index of {video}: {e}")
+
+
+# the video -> (the path and the modification time of the video the index was built for, the index)
+_indexes: Dict[str, Tuple[tuple, Optional[SeekIndex]]] = {}
+# a lock for every video, building the index of a video reads all of it and must not hold back the seeks in the
+# other videos. The global lock only guards the dict of the locks
+_video_locks: Dict[str, threading.Lock] = {}
+_video_locks_lock = threading.Lock()
+
+
+def get_seek_index(video: str) -> Optional[SeekIndex]:
+    """
+    :param video: the video name
+    :return: the seek index of the video, None if it can't be built. The index is built once, persisted beside
+    the video and shared by all the clients. It is built again when the catalog sees the video changed.
+    """
+    entry = CATALOG.get(video)
+    if entry is None:
+        return None
+    version = (entry.path, entry.video_mtime)
+    cached = _indexes.get(video)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _video_locks_lock:
+        video_lock = _video_locks.setdefault(video, threading.Lock())
+    with video_lock:
+        cached = _indexes.get(video)
+        if cached is None or cached[0] != version:
+            seek_index = _load(entry.directory, entry.path)
+            if seek_index is None:
+                seek_index = SeekIndex.build(entry.path)
+                if seek_index is not None:
+                    _save(video, entry.directory, entry.path, seek_index)
+                    logger.info(f"Built the seek index of {video} with {len(seek_index)} keyframes.")
+            cached = _indexes[video] = (version, seek_index)
+        return cached[1]
@@ -1,29 +1,86 @@
-import socket
-from ThreadedClient import ClientThread
-from ServerConfig import IP, PORT, MAX_LISTENERS, logger, SERVER_TIMEOUT
-
-
-class Server:
-
-    def __init__(self, ip: str, port: int, max_listeners: int):
-        self._max_listeners = max_listeners
-        self._addr = (ip, port)
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        socket.setdefaulttimeout(SERVER_TIMEOUT)
-
-    def run(self):
-        # start listening
-        self._socket.bind(self._addr)
-        self._socket.listen(self._max_listeners)
-        logger.info(f"LISTENING AT {self._addr}")
-        # getting the clients
-        while True:
-            conn, addr = self._socket.accept()
-            logger.info(f"Got new client {addr}.")
-            ClientThread(conn, addr).start()
-
-
-if __name__ == "__main__":
-    my_server = Server(IP, PORT, MAX_LISTENERS)
-    my_server.run()
+import argparse
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from ThreadedClient import ClientThread
+from AsyncClient import AsyncClient
+from catalog import CATALOG
+from thumbnails import get_thumbnail_bundle
+from metrics import METRICS, start_exporter
+from redirector import start_heartbeat
+from socket_functions import set_no_delay
+from ServerConfig import IP, PORT, MAX_LISTENERS, logger, SERVER_TIMEOUT, SERVER_MODE, THREADED_MODE, \
+    ASYNCIO_MODE, EXECUTOR_WORKERS
+
+
+class Server:
+
+    def __init__(self, ip: str, port: int, max_listeners: int):
+        self._max_listeners = max_listeners
+        self._addr = (ip, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # a restarted server listens again at once, even while the connections of the previous one are closing
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        socket.setdefaulttimeout(SERVER_TIMEOUT)
+
+    def run(self):
+        # start listening
+        self._socket.bind(self._addr)
+        self._socket.listen(self._max_listeners)
+        logger.info(f"LISTENING AT {self._addr}")
+        # getting the clients
+        while True:
+            conn, addr = self._socket.accept()
+            logger.info(f"Got new client {addr}.")
+            set_no_delay(conn)
+            ClientThread(conn, addr).start()
+
+
+class AsyncServer(Server):
+    """
+    Serve all the clients from one event loop instead of a thread per client.
+    """
+
+    def __init__(self, ip: str, port: int, max_listeners: int, executor_workers: int):
+        super().__init__(ip, port, max_listeners)
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="handler")
+
+    def run(self):
+        asyncio.run(self.__serve())
+
+    async def __serve(self):
+        # start listening
+        self._socket.bind(self._addr)
+        self._socket.listen(self._max_listeners)
+        logger.info(f"LISTENING AT {self._addr} (asyncio)")
+        server = await asyncio.start_server(self.__on_client, sock=self._socket)
+        async with server:
+            await server.serve_forever()
+
+    async def __on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        logger.info(f"Got new client {writer.get_extra_info('peername')}.")
+        await AsyncClient(reader, writer, self._executor).run()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Streaming server")
+    parser.add_argument("--mode", choices=(THREADED_MODE, ASYNCIO_MODE), default=SERVER_MODE,
+                        help="thread per client or one event loop for all the clients")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # probe the new videos and encode the thumbnails before the first client asks for them
+    CATALOG.refresh()
+    CATALOG.start_watcher()
+    get_thumbnail_bundle()
+    start_exporter()
+    # a node of a redirector tells it about its load, see redirector.py
+    start_heartbeat(lambda: METRICS.active_sessions)
+    if args.mode == ASYNCIO_MODE:
+        my_server = AsyncServer(IP, PORT, MAX_LISTENERS, EXECUTOR_WORKERS)
+    else:
+        my_server = Server(IP, PORT, MAX_LISTENERS)
+    my_server.run()
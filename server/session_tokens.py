@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from ServerConfig import logger, SESSION_SECRET, SESSION_SECRET_PATH, SESSION_TOKEN_TTL, RESUME_GRACE, \
+    HEARTBEAT_MAX_AGE
+
+# the most captures that are kept for clients that may resume
+MAX_PARKED_CAPTURES = 64
+
+
+def _load_secret() -> bytes:
+    """
+    :return: the secret that signs the tokens. SESSION_SECRET when it is set, otherwise a random secret that is
+    made once and kept in SESSION_SECRET_PATH, so the tokens stay valid when the server restarts.
+    """
+    if SESSION_SECRET:
+        return SESSION_SECRET.encode()
+    try:
+        with open(SESSION_SECRET_PATH, "rb") as file:
+            secret = file.read()
+        if secret:
+            return secret
+    except FileNotFoundError:
+        pass
+    secret = secrets.token_hex(32).encode()
+    try:
+        # readable only by the user of the server
+        with open(os.open(SESSION_SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as file:
+            file.write(secret)
+    except OSError as error:
+        logger.warning(f"Can't keep the session secret in {SESSION_SECRET_PATH} ({error}), the session tokens "
+                       f"will not survive a restart.")
+    return secret
+
+
+_SECRET = _load_secret()
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _encode(hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(username: str) -> str:
+    """
+    :param username: the user that logged in
+    :return: a token that lets the user resume the session without logging in, for SESSION_TOKEN_TTL seconds.
+    The token is signed and holds all it needs, so checking it does not touch the database.
+    """
+    payload = _encode(f"{username}\n{int(time.time()) + SESSION_TOKEN_TTL}".encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> Optional[str]:
+    """
+    :param token: a token from `issue_token`
+    :return: the user of the token, None if the token is forged or expired
+    """
+    payload, _, signature = str(token).partition(".")
+    if not hmac.compare_digest(_sign(payload).encode(), signature.encode()):
+        return None
+    try:
+        username, expires = _decode(payload).decode().rsplit("\n", 1)
+        if int(expires) < time.time():
+            return None
+    except ValueError:
+        return None
+    return username
+
+
+def _heartbeat_payload(node_id: str, address: list, sessions: int, sent_at: float) -> str:
+    # not a payload of a token, so a signature of a token is never the signature of a heartbeat
+    return f"heartbeat\n{node_id}\n{address[0]}\n{address[1]}\n{sessions}\n{sent_at!r}"
+
+
+def sign_heartbeat(node_id: str, address: list, sessions: int, sent_at: float) -> str:
+    """
+    :param node_id: the id of the node
+    :param address: [ip, port] the clients connect to
+    :param sessions: how many clients the node serves
+    :param sent_at: the time the heartbeat is sent (time.time())
+    :return: the signature of the heartbeat, the redirector takes only heartbeats of nodes that share its secret
+    """
+    return _sign(_heartbeat_payload(node_id, address, sessions, sent_at))
+
+
+def verify_heartbeat(node_id: str, address: list, sessions: int, sent_at: float, signature: str) -> bool:
+    """
+    :param signature: the signature from `sign_heartbeat`, the other parameters are those of `sign_heartbeat`
+    :return: bool. False if the heartbeat is forged, or was not sent within HEARTBEAT_MAX_AGE seconds.
+    """
+    if abs(time.time() - sent_at) > HEARTBEAT_MAX_AGE:
+        return False
+    expected = sign_heartbeat(node_id, address, sessions, sent_at)
+    return hmac.compare_digest(expected.encode(), str(signature).encode())
+
+
+class ParkedCaptures:
+    """
+    The captures of clients that disconnected, by their session token. A client that resumes within RESUME_GRACE
+    seconds continues with its capture, already open at the position it reached, instead of opening the video
+    again.
+    """
+
+    def __init__(self, grace: float = RESUME_GRACE, max_captures: int = MAX_PARKED_CAPTURES):
+        self._grace = grace
+        self._max_captures = max_captures
+        self._lock = threading.Lock()
+        # token -> (time parked, video, capture, position of the capture)
+        self._captures = OrderedDict()
+
+    def park(self, token: str, video: str, cap, position: int) -> None:
+        """
+        :param token: the session token of the client
+        :param video: the video of the capture
+        :param cap: the capture
+        :param position: the index of the frame the capture reads next
+        :return: None. Keep the capture for the resume of the client.
+        """
+        with self._lock:
+            self.__release_old(time.monotonic())
+            self._captures[token] = (time.monotonic(), video, cap, position)
+            while len(self._captures) > self._max_captures:
+                self._captures.popitem(last=False)[1][2].release()
+
+    def adopt(self, token: str) -> Optional[Tuple[str, object, int]]:
+        """
+        :param token: the session token the client resumed with
+        :return: a tuple: (video, capture, position of the capture) that was parked with the token, None if there
+        is none
+        """
+        with self._lock:
+            self.__release_old(time.monotonic())
+            parked = self._captures.pop(token, None)
+        return None if parked is None else parked[1:]
+
+    def __release_old(self, now: float) -> None:
+        while self._captures:
+            parked_at, _, cap, _ = next(iter(self._captures.values()))
+            if now - parked_at < self._grace:
+                return
+            self._captures.popitem(last=False)
+            cap.release()
+
+
+PARKED_CAPTURES = ParkedCaptures()
@@ -1,88 +1,520 @@
-import socket
-import pickle
-import time
-import io
-import numpy as np
-from PIL import Image
-
-
-HEADER_LENGTH = 10
-CREATE_USER = "CREATE_USER"
-LOGIN_USER = "LOGIN_USER"
-ASK_FOR_VIDEOS_AVAILABLE = "ASK_FOR_VIDEOS_AVAILABLE"
-ADK_FOR_VIDEO_DETAILS = "ADK_FOR_VIDEO_DETAILS"
-ASK_FOR_FRAME = "ASK_FOR_FRAME"
-CHANGE_VIDEO_LOCATION = "CHANGE_VIDEO_LOCATION"
-VIDEO_THUMBNAIL = "VIDEO_THUMBNAIL"
-IMAGE_FORMAT = "jpeg"
-
-
-def make_header(data: bytes):
-    """
-    :param data: bytes of the data
-    :return: the header of the bytes, the length of the data, for 2
-    """
-    return str(len(data)).zfill(HEADER_LENGTH).encode()
-
-
-def send_data_through_socket(sock: socket.socket, data):
-    """
-    :param sock: the socket which will send the data
-    :param data: the data, can be int, string, list, etc.
-    :return: None, just send the data
-    """
-    try:
-        final_data = pickle.dumps(data)
-        final_data = make_header(final_data) + final_data
-        sock.sendall(final_data)
-    except MemoryError:
-        time.sleep(0.001)
-        send_data_through_socket(sock, data)
-
-
-def read_data_from_socket(sock: socket.socket, logger=None) -> tuple:
-    """
-    :param logger:
-    :param sock: the socket which we read from
-    :return: a tuple: (True/False, data), the first element is if we got data from the socket, the second
-    is the data.
-    """
-    header = sock.recv(HEADER_LENGTH)
-    if not header:
-        return False, None
-    size = int(header.decode())
-
-    data = bytearray()
-    while len(data) < size:
-        packet = sock.recv(size - len(data))
-        data.extend(packet)
-
-        if logger is not None:
-            logger.debug(f"data length is {len(data)}")
-
-    data = pickle.loads(data)
-    return True, data
-
-
-def decode_img(img_bytes: bytes) -> np.ndarray:
-    """
-    :param img_bytes: bytes of a jpeg image (It supposed to work for all kinds of pictures but it should get
-    only jpeg according to the protocol).
-    :return: Convert the bytes to a np.array of the image
-    """
-    img_bytes = io.BytesIO(img_bytes)
-    with Image.open(img_bytes) as img:
-        img_arr = np.asarray(img)
-    return img_arr
-
-
-def encode_img(img_array: np.ndarray) -> bytes:
-    """
-    :param img_array: array of the image.
-    :return: Encode the array into bytes with jpeg.
-    """
-    img_bytes = io.BytesIO()
-    img_pil = Image.fromarray(img_array)
-    img_pil.save(img_bytes, format=IMAGE_FORMAT)
-    bytes_to_send = img_bytes.getvalue()
-    return bytes_to_send
+import asyncio
+import socket
+import pickle
+import struct
+import io
+import numpy as np
+from frame_codecs import DEFAULT_CODEC, DEFAULT_SETTINGS, CodecSettings, encode_frame, decode_frame
+
+
+HEADER_LENGTH = 10
+CREATE_USER = "CREATE_USER"
+LOGIN_USER = "LOGIN_USER"
+ASK_FOR_VIDEOS_AVAILABLE = "ASK_FOR_VIDEOS_AVAILABLE"
+ADK_FOR_VIDEO_DETAILS = "ADK_FOR_VIDEO_DETAILS"
+ASK_FOR_FRAME = "ASK_FOR_FRAME"
+CHANGE_VIDEO_LOCATION = "CHANGE_VIDEO_LOCATION"
+VIDEO_THUMBNAIL = "VIDEO_THUMBNAIL"
+HELLO = "HELLO"
+START_STREAM = "START_STREAM"
+GRANT_CREDIT = "GRANT_CREDIT"
+STOP_STREAM = "STOP_STREAM"
+ASK_FOR_CATALOG = "ASK_FOR_CATALOG"
+CATALOG_NOT_MODIFIED = "CATALOG_NOT_MODIFIED"
+SET_PROFILE = "SET_PROFILE"
+SET_DISPLAY_SIZE = "SET_DISPLAY_SIZE"
+SET_DELTA_FRAMES = "SET_DELTA_FRAMES"
+DELTA_FRAME = "DELTA_FRAME"
+REPEAT_FRAME = "REPEAT_FRAME"
+SET_CODEC = "SET_CODEC"
+ASK_FOR_STATS = "ASK_FOR_STATS"
+RESUME_SESSION = "RESUME_SESSION"
+LOCATE_NODE = "LOCATE_NODE"
+NODE_HEARTBEAT = "NODE_HEARTBEAT"
+CREATE_PARTY = "CREATE_PARTY"
+JOIN_PARTY = "JOIN_PARTY"
+LEAVE_PARTY = "LEAVE_PARTY"
+PARTY_CONTROL = "PARTY_CONTROL"
+PARTY_FRAME = "PARTY_FRAME"
+IMAGE_FORMAT = DEFAULT_CODEC
+
+# Wire protocols. The legacy protocol is a pickled list after a zero padded decimal header. The binary protocol
+# is a fixed struct header (with the same length as the legacy header) followed by the arguments of the
+# message, the opcode is an integer and bytes are sent as they are. The first byte of the binary header is never
+# an ascii digit so every message tells which protocol it uses.
+LEGACY_PROTOCOL = 0
+BINARY_PROTOCOL = 1
+SUPPORTED_PROTOCOLS = (BINARY_PROTOCOL,)
+# features of the server that the client may use, the server tells about them in the answer to HELLO
+STREAM_CAPABILITY = "STREAM"
+CATALOG_CAPABILITY = "CATALOG"
+ABR_CAPABILITY = "ABR"
+DISPLAY_SIZE_CAPABILITY = "DISPLAY_SIZE"
+DELTA_CAPABILITY = "DELTA"
+CODECS_CAPABILITY = "CODECS"
+STATS_CAPABILITY = "STATS"
+RESUME_CAPABILITY = "RESUME"
+# told by the redirector instead of the features of a server, the client asks it which node serves a video
+REDIRECT_CAPABILITY = "REDIRECT"
+PARTY_CAPABILITY = "PARTY"
+# what the host of a watch party does, the server tells it to all the members (PARTY_CONTROL)
+PARTY_PLAY = "play"
+PARTY_PAUSE = "pause"
+PARTY_SEEK = "seek"
+# the host left, the members watch alone again
+PARTY_END = "end"
+BINARY_MAGIC = 0xB5
+# magic, protocol version, opcode, flags (reserved), payload length
+BINARY_HEADER = struct.Struct("!BBHHI")
+# never change the number of an opcode, only add new ones
+OPCODES = {
+    CREATE_USER: 1,
+    LOGIN_USER: 2,
+    ASK_FOR_VIDEOS_AVAILABLE: 3,
+    ADK_FOR_VIDEO_DETAILS: 4,
+    ASK_FOR_FRAME: 5,
+    CHANGE_VIDEO_LOCATION: 6,
+    VIDEO_THUMBNAIL: 7,
+    HELLO: 8,
+    START_STREAM: 9,
+    GRANT_CREDIT: 10,
+    STOP_STREAM: 11,
+    ASK_FOR_CATALOG: 12,
+    CATALOG_NOT_MODIFIED: 13,
+    SET_PROFILE: 14,
+    SET_DISPLAY_SIZE: 15,
+    SET_DELTA_FRAMES: 16,
+    DELTA_FRAME: 17,
+    REPEAT_FRAME: 18,
+    SET_CODEC: 19,
+    ASK_FOR_STATS: 20,
+    RESUME_SESSION: 21,
+    LOCATE_NODE: 22,
+    NODE_HEARTBEAT: 23,
+    CREATE_PARTY: 24,
+    JOIN_PARTY: 25,
+    LEAVE_PARTY: 26,
+    PARTY_CONTROL: 27,
+    PARTY_FRAME: 28,
+}
+OPCODES_NAMES = {number: name for name, number in OPCODES.items()}
+
+# the types of the values inside a binary message
+_NONE = b"N"
+_TRUE = b"T"
+_FALSE = b"F"
+_INT = b"i"
+_FLOAT = b"f"
+_STR = b"s"
+_BYTES = b"b"
+_LIST = b"l"
+_DICT = b"d"
+_INT_STRUCT = struct.Struct("!q")
+_FLOAT_STRUCT = struct.Struct("!d")
+_LENGTH_STRUCT = struct.Struct("!I")
+# the values of a binary message shorter than this are copied together into one buffer, the longer ones (the
+# frames) are handed to the socket as they are, next to the header (scatter-gather)
+_MIN_SEPARATE_BUFFER = 16 * 1024
+# the most buffers handed to one sendmsg, the system takes at most IOV_MAX (1024 on Linux)
+_MAX_SEND_BUFFERS = 512
+# the first size of the buffer of a SocketReader, it grows to the longest message it reads
+READ_BUFFER_SIZE = 256 * 1024
+# the longest message a reader takes unless it is told otherwise (see MAX_MESSAGE_SIZE in the config), the size in
+# the header is not trusted before the message is allocated
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+
+class MessageTooLargeError(ConnectionResetError):
+    """
+    The header of a message tells a size above the most the reader takes. The rest of the stream can't be read,
+    so the connection is dropped.
+    """
+
+
+class _SafeUnpickler(pickle.Unpickler):
+    """
+    Unpickler for the legacy protocol. The messages are made only from builtin values (lists, strings, bytes,
+    numbers) which do not need any class, so refusing to load classes stops the peer from running code.
+    """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from the socket")
+
+
+def make_header(data: bytes):
+    """
+    :param data: bytes of the data
+    :return: the header of the bytes, the length of the data, for 2
+    """
+    return str(len(data)).zfill(HEADER_LENGTH).encode()
+
+
+def _pack_value(value, chunks: list) -> None:
+    """
+    :param value: a value inside a message
+    :param chunks: the bytes of the message, the value is appended to it.
+    """
+    if value is None:
+        chunks.append(_NONE)
+    elif value is True:
+        chunks.append(_TRUE)
+    elif value is False:
+        chunks.append(_FALSE)
+    elif isinstance(value, int):
+        chunks.append(_INT + _INT_STRUCT.pack(value))
+    elif isinstance(value, float):
+        chunks.append(_FLOAT + _FLOAT_STRUCT.pack(value))
+    elif isinstance(value, str):
+        encoded = value.encode()
+        chunks.append(_STR + _LENGTH_STRUCT.pack(len(encoded)))
+        chunks.append(encoded)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        chunks.append(_BYTES + _LENGTH_STRUCT.pack(len(value)))
+        chunks.append(value)
+    elif isinstance(value, (list, tuple)):
+        chunks.append(_LIST + _LENGTH_STRUCT.pack(len(value)))
+        for item in value:
+            _pack_value(item, chunks)
+    elif isinstance(value, dict):
+        chunks.append(_DICT + _LENGTH_STRUCT.pack(len(value)))
+        for key, item in value.items():
+            _pack_value(key, chunks)
+            _pack_value(item, chunks)
+    else:
+        raise TypeError(f"Can't send {type(value)} with the binary protocol")
+
+
+def _unpack_value(data: memoryview, offset: int) -> tuple:
+    """
+    :param data: the payload of a binary message
+    :param offset: where the value starts
+    :return: a tuple: (value, the offset after the value)
+    """
+    value_type = data[offset:offset + 1]
+    offset += 1
+    if value_type == _NONE:
+        return None, offset
+    if value_type == _TRUE:
+        return True, offset
+    if value_type == _FALSE:
+        return False, offset
+    if value_type == _INT:
+        return _INT_STRUCT.unpack_from(data, offset)[0], offset + _INT_STRUCT.size
+    if value_type == _FLOAT:
+        return _FLOAT_STRUCT.unpack_from(data, offset)[0], offset + _FLOAT_STRUCT.size
+
+    length = _LENGTH_STRUCT.unpack_from(data, offset)[0]
+    offset += _LENGTH_STRUCT.size
+    if value_type == _STR:
+        return str(data[offset:offset + length], "utf-8"), offset + length
+    if value_type == _BYTES:
+        return bytes(data[offset:offset + length]), offset + length
+    if value_type == _LIST:
+        items = []
+        for _ in range(length):
+            item, offset = _unpack_value(data, offset)
+            items.append(item)
+        return items, offset
+    if value_type == _DICT:
+        items = {}
+        for _ in range(length):
+            key, offset = _unpack_value(data, offset)
+            items[key], offset = _unpack_value(data, offset)
+        return items, offset
+
+    raise ValueError(f"Unknown value type {value_type} in binary message")
+
+
+def pack_buffers(data, protocol: int = LEGACY_PROTOCOL) -> list:
+    """
+    :param data: the data, can be int, string, list, etc. With the binary protocol it must be a list which starts
+    with the opcode.
+    :param protocol: the protocol of the connection
+    :return: the buffers that represent the data on the socket one after the other, the header first. The bytes of
+    a frame are one of the buffers as they are, they are not copied behind the header.
+    """
+    if protocol == LEGACY_PROTOCOL:
+        final_data = pickle.dumps(data)
+        return [make_header(final_data), final_data]
+
+    chunks = []
+    for arg in data[1:]:
+        _pack_value(arg, chunks)
+    buffers = []
+    small = []
+    length = 0
+    for chunk in chunks:
+        length += len(chunk)
+        if len(chunk) < _MIN_SEPARATE_BUFFER:
+            small.append(chunk)
+            continue
+        if small:
+            buffers.append(b"".join(small))
+            small = []
+        buffers.append(chunk)
+    if small:
+        buffers.append(b"".join(small))
+    header = BINARY_HEADER.pack(BINARY_MAGIC, protocol, OPCODES[data[0]], 0, length)
+    return [header] + buffers
+
+
+def pack_data(data, protocol: int = LEGACY_PROTOCOL) -> bytes:
+    """
+    :param data: the data, can be int, string, list, etc. With the binary protocol it must be a list which starts
+    with the opcode.
+    :param protocol: the protocol of the connection
+    :return: the bytes that represent the data on the socket, the header and then the data.
+    """
+    return b"".join(pack_buffers(data, protocol))
+
+
+def parse_header(header: bytes, max_size: int = MAX_MESSAGE_SIZE) -> tuple:
+    """
+    :param header: the first HEADER_LENGTH bytes of a message
+    :param max_size: the longest message that is taken
+    :return: a tuple: (protocol, opcode, size), the opcode is None in the legacy protocol. Raises
+    MessageTooLargeError when the size is above max_size.
+    """
+    if header[0] == BINARY_MAGIC:
+        _, protocol, opcode, _, size = BINARY_HEADER.unpack(header)
+    else:
+        protocol, opcode, size = LEGACY_PROTOCOL, None, int(bytes(header))
+    if size > max_size:
+        raise MessageTooLargeError(f"A message of {size} bytes, the most is {max_size}")
+    return protocol, opcode, size
+
+
+def unpack_data(data: bytes, protocol: int = LEGACY_PROTOCOL, opcode: int = None):
+    """
+    :param data: the bytes that came after the header
+    :param protocol: the protocol of the message (from the header)
+    :param opcode: the opcode of the message (from the header), used only by the binary protocol
+    :return: the data that was sent
+    """
+    if protocol == LEGACY_PROTOCOL:
+        return _SafeUnpickler(io.BytesIO(data)).load()
+
+    message = [OPCODES_NAMES[opcode]]
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        arg, offset = _unpack_value(view, offset)
+        message.append(arg)
+    return message
+
+
+def choose_protocol(offered_protocols: list) -> int:
+    """
+    :param offered_protocols: the protocols the other side can use
+    :return: the best protocol both sides support, LEGACY_PROTOCOL if there is none.
+    """
+    common = set(offered_protocols) & set(SUPPORTED_PROTOCOLS)
+    return max(common, default=LEGACY_PROTOCOL)
+
+
+def set_no_delay(sock: socket.socket) -> None:
+    """
+    :param sock: a connected socket
+    :return: None. Send the small messages (credit, controls) at once instead of holding them until a segment
+    fills up (Nagle). A message is always handed to the socket in one call, so it never goes out in pieces.
+    """
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        # not a TCP socket
+        pass
+
+
+def send_buffers(sock: socket.socket, buffers: list) -> None:
+    """
+    :param sock: the socket which will send the buffers
+    :param buffers: the buffers of a message (see pack_buffers)
+    :return: None. Send the buffers one after the other with scatter-gather (sendmsg), without joining them.
+    """
+    if not hasattr(sock, "sendmsg"):
+        # Windows has no sendmsg
+        sock.sendall(b"".join(buffers))
+        return
+
+    views = [memoryview(buffer).cast("B") for buffer in buffers]
+    first = 0
+    while first < len(views):
+        sent = sock.sendmsg(views[first:first + _MAX_SEND_BUFFERS])
+        # skip what was sent, the system may take only a part of the buffers
+        while first < len(views) and sent >= len(views[first]):
+            sent -= len(views[first])
+            first += 1
+        if sent:
+            views[first] = views[first][sent:]
+
+
+def send_data_through_socket(sock: socket.socket, data, protocol: int = LEGACY_PROTOCOL):
+    """
+    :param sock: the socket which will send the data
+    :param data: the data, can be int, string, list, etc.
+    :param protocol: the protocol of the connection
+    :return: None, just send the data
+    """
+    send_buffers(sock, pack_buffers(data, protocol))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    """
+    :param sock: the socket which we read from
+    :param size: how many bytes to read
+    :return: the bytes, less than size only if the socket was closed.
+    """
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        got = sock.recv_into(view[received:])
+        if not got:
+            view.release()
+            del data[received:]
+            break
+        received += got
+    return data
+
+
+def read_data_from_socket(sock: socket.socket, logger=None, max_size: int = MAX_MESSAGE_SIZE) -> tuple:
+    """
+    :param logger:
+    :param sock: the socket which we read from
+    :param max_size: the longest message that is taken, a longer one raises MessageTooLargeError
+    :return: a tuple: (True/False, data), the first element is if we got data from the socket, the second
+    is the data. Reads exactly one message, a socket that is read all the time should use a SocketReader.
+    """
+    header = _recv_exactly(sock, HEADER_LENGTH)
+    if len(header) < HEADER_LENGTH:
+        return False, None
+    protocol, opcode, size = parse_header(header, max_size)
+
+    data = _recv_exactly(sock, size)
+    if len(data) < size:
+        raise ConnectionResetError("The socket was closed in the middle of a message")
+    if logger is not None:
+        logger.debug(f"data length is {len(data)}")
+
+    data = unpack_data(data, protocol, opcode)
+    return True, data
+
+
+class SocketReader:
+    """
+    Reads the messages of a socket into one buffer that is reused for all of them (recv_into), instead of new
+    bytes for every packet. A receive takes as much as the socket has, so several small messages come with one
+    call. The buffer grows to the longest message and stays that size, a message above `max_message_size` raises
+    MessageTooLargeError before the buffer grows.
+    The reader may hold bytes of the next messages, so once it is used the socket must be read only through it.
+    """
+
+    def __init__(self, sock: socket.socket, size: int = READ_BUFFER_SIZE, max_message_size: int = MAX_MESSAGE_SIZE):
+        self.sock = sock
+        self._max_message_size = max_message_size
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        # the received bytes that were not read yet are between the start and the end
+        self._start = 0
+        self._end = 0
+
+    @property
+    def buffered(self) -> bool:
+        """
+        :return: bool. Are there received bytes that were not read yet.
+        """
+        return self._end > self._start
+
+    def read(self, logger=None) -> tuple:
+        """
+        :param logger:
+        :return: a tuple: (True/False, data), like read_data_from_socket.
+        """
+        if not self.__fill(HEADER_LENGTH):
+            return False, None
+        protocol, opcode, size = parse_header(self._view[self._start:self._start + HEADER_LENGTH],
+                                              self._max_message_size)
+        self._start += HEADER_LENGTH
+
+        if not self.__fill(size):
+            raise ConnectionResetError("The socket was closed in the middle of a message")
+        if logger is not None:
+            logger.debug(f"data length is {size}")
+        payload = self._view[self._start:self._start + size]
+        self._start += size
+        try:
+            return True, unpack_data(payload, protocol, opcode)
+        finally:
+            payload.release()
+
+    def __fill(self, size: int) -> bool:
+        """
+        :param size: how many bytes must be there to read
+        :return: bool. Receive until the buffer has the bytes, False if the socket was closed before.
+        """
+        if self._end - self._start >= size:
+            return True
+        if self._start + size > len(self._buffer):
+            self.__make_room(size)
+
+        while self._end - self._start < size:
+            got = self.sock.recv_into(self._view[self._end:])
+            if not got:
+                return False
+            self._end += got
+        return True
+
+    def __make_room(self, size: int) -> None:
+        """
+        :param size: how many bytes must fit after the start
+        :return: None. Move the bytes that were not read to the start of the buffer, in a larger buffer if they
+        don't fit.
+        """
+        pending = self._end - self._start
+        if size > len(self._buffer):
+            buffer = bytearray(max(size, len(self._buffer) * 2))
+            buffer[:pending] = self._view[self._start:self._end]
+            self._view.release()
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        else:
+            # a memoryview copies overlapping bytes correctly
+            self._view[:pending] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+
+async def read_data_from_stream(reader: asyncio.StreamReader, max_size: int = MAX_MESSAGE_SIZE) -> tuple:
+    """
+    :param reader: the stream which we read from
+    :param max_size: the longest message that is taken, a longer one raises MessageTooLargeError
+    :return: a tuple: (True/False, data), the first element is if we got data from the stream, the second
+    is the data.
+    """
+    try:
+        header = await reader.readexactly(HEADER_LENGTH)
+    except asyncio.IncompleteReadError:
+        return False, None
+    protocol, opcode, size = parse_header(header, max_size)
+
+    data = await reader.readexactly(size)
+    return True, unpack_data(data, protocol, opcode)
+
+
+def decode_img(img_bytes: bytes, codec: str = IMAGE_FORMAT) -> np.ndarray:
+    """
+    :param img_bytes: bytes of an image encoded with the codec (jpeg unless the session chose another codec,
+    see frame_codecs.py).
+    :return: Convert the bytes to a np.array of the image
+    """
+    return decode_frame(img_bytes, codec)
+
+
+def encode_img(img_array: np.ndarray, quality: int = None, settings: CodecSettings = DEFAULT_SETTINGS) -> bytes:
+    """
+    :param img_array: array of the image.
+    :param quality: the quality, None for the quality of the settings.
+    :param settings: the codec of the session and its parameters, jpeg by default.
+    :return: Encode the array into bytes with the codec.
+    """
+    return encode_frame(img_array, settings, quality)
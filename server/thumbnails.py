@@ -0,0 +1,65 @@
+import hashlib
+import threading
+from typing import List, Optional
+from PIL import Image
+import numpy as np
+from ServerConfig import logger, THUMBNAIL_HEIGHT
+import socket_functions
+from catalog import CATALOG, VideoEntry
+
+
+class ThumbnailBundle:
+    """
+    The catalog of videos with their thumbnails, encoded once at the size the client shows them.
+    The etag changes whenever the catalog or a thumbnail changes.
+    """
+
+    def __init__(self, entries: List[VideoEntry]):
+        self.videos = [entry.name for entry in entries]
+        self.thumbnails = [self.__encode_thumbnail(entry.thumbnail_path) for entry in entries]
+        # the bundle is built again when the videos or their thumbnails change
+        self.key = self.key_of(entries)
+
+        digest = hashlib.sha1()
+        for video, thumbnail in zip(self.videos, self.thumbnails):
+            digest.update(video.encode())
+            digest.update(hashlib.sha1(thumbnail).digest())
+        self.etag = digest.hexdigest()
+
+    @staticmethod
+    def key_of(entries: List[VideoEntry]) -> tuple:
+        return tuple((entry.name, entry.thumbnail_mtime) for entry in entries)
+
+    @staticmethod
+    def __encode_thumbnail(thumbnail_path: str) -> bytes:
+        """
+        :param thumbnail_path: the path of the thumbnail of a video
+        :return: the thumbnail, resized to THUMBNAIL_HEIGHT and encoded.
+        """
+        with Image.open(thumbnail_path) as img:
+            img = img.convert("RGB")
+            width = round(img.width * THUMBNAIL_HEIGHT / img.height)
+            img = img.resize((width, THUMBNAIL_HEIGHT), Image.BOX)
+            return socket_functions.encode_img(np.array(img))
+
+    def __repr__(self):
+        size = sum(map(len, self.thumbnails))
+        return f"ThumbnailBundle({len(self.videos)} videos, {size} bytes, etag {self.etag})"
+
+
+_bundle: Optional[ThumbnailBundle] = None
+_bundle_lock = threading.Lock()
+
+
+def get_thumbnail_bundle() -> ThumbnailBundle:
+    """
+    :return: the thumbnail bundle, shared by all the clients. Built on the first call and again after the catalog
+    changed.
+    """
+    global _bundle
+    entries = CATALOG.entries()
+    with _bundle_lock:
+        if _bundle is None or _bundle.key != ThumbnailBundle.key_of(entries):
+            _bundle = ThumbnailBundle(entries)
+            logger.info(f"Built {_bundle}.")
+        return _bundle
@@ -0,0 +1,275 @@
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+import socket_functions
+from ServerConfig import logger, ENCODE_AHEAD, PARTY_LEAD
+from encoding_profiles import SOURCE_PROFILE
+from frame_archive import open_archive
+from frame_codecs import DEFAULT_SETTINGS
+from frame_source import FrameSource
+from metrics import SessionMetrics, SERIALISE_STAGE, FRAMES_SERVED
+from read_ahead import ReadAhead
+
+
+class WatchParty:
+    """
+    A video watched by several clients in lock-step. One producer thread reads and encodes every frame once, packs
+    its message once (for every wire protocol of the members) and writes the same bytes to the socket of every
+    member, so a member costs the server only the write of the frames.
+    The frames are sent at the pace of the video, PARTY_LEAD seconds before they are due, all the members get a
+    frame at the same time and play it when it is due. A member whose socket can't take a frame misses it (see
+    `ClientHandler.send_packed`), the others are not held back.
+    The host plays, pauses and seeks for all the members (PARTY_CONTROL). Every control tells the frame the party
+    continues at, the members throw away what they have and wait for the frames from there.
+    The frames are whole frames of the source profile in the default codec, every client decodes them. The members
+    are ClientHandler objects.
+    """
+
+    def __init__(self, party_id: str, video: str, fps: float, host, metrics: SessionMetrics):
+        """
+        :param party_id: the id the members join with
+        :param video: the video name
+        :param fps: the frames per second of the video
+        :param host: the client that controls the party, the first member
+        :param metrics: the metrics of the host, the reads and the encodes of the party are recorded in them
+        """
+        self.party_id = party_id
+        self.video = video
+        self.host = host
+        self._fps = fps
+        self._metrics = metrics
+        self._members = [host]
+        # the state of the playback, changed by the host. The frame `_started_frame` is due at `_started_at`
+        self._changed = threading.Condition()
+        self._paused = True
+        self._closed = False
+        # the index of the next frame the producer sends
+        self._position = 0
+        self._started_frame = 0
+        self._started_at = time.monotonic()
+        # changes on every control, a frame that was prepared before it is not sent
+        self._generation = 0
+        # held while the messages are written to the members, so all the members get the frames and the controls in
+        # the same order
+        self._sending = threading.Lock()
+        # (index, due time, encoded frame, {protocol: message}) of the frames that were sent and are not due yet, a
+        # member that joins gets them to play in step with the others. Used with the sending lock
+        self._recent = deque()
+        # reads the frames of the party with its own capture, only the producer uses it
+        self._frames = FrameSource(metrics)
+        self._read_ahead = ReadAhead(self._frames.prepare_ahead, ENCODE_AHEAD, f"party-read-ahead-{party_id}") \
+            if ENCODE_AHEAD > 0 else None
+        self._thread = threading.Thread(target=self.__run, name=f"party-{party_id}", daemon=True)
+        self._thread.start()
+
+    def join(self, member) -> bool:
+        """
+        :param member: the client that joins
+        :return: bool. Add the member and send it the video, the frame the party continues at for it and whether
+        the party is paused (JOIN_PARTY), and then the frames the others got that are not due yet. False if the
+        party already ended.
+        """
+        with self._sending:
+            with self._changed:
+                if self._closed:
+                    return False
+                self._members.append(member)
+                paused, position = self._paused, self._position
+            recent = self.__drop_due()
+            if recent:
+                position = recent[0][0]
+            member.send_packed(socket_functions.pack_buffers(
+                [socket_functions.JOIN_PARTY, self.party_id, self.video, position, paused, member is self.host],
+                member.protocol))
+            for index, _, img_bytes, messages in recent:
+                member.send_packed(self.__packed(messages, member.protocol, [socket_functions.PARTY_FRAME, index,
+                                                                             img_bytes]), may_drop=True)
+        logger.info(f"The party {self.party_id} of {self.video} has {len(self._members)} members.")
+        return True
+
+    def leave(self, member) -> bool:
+        """
+        :param member: the client that leaves
+        :return: bool. Did the party end: the host left (the members are told with PARTY_END) or no member is left.
+        """
+        with self._sending:
+            with self._changed:
+                if member not in self._members:
+                    return False
+                self._members.remove(member)
+                if member is not self.host and self._members:
+                    return False
+                self._closed = True
+                self._changed.notify_all()
+                members, position = list(self._members), self._position
+            self.__broadcast([socket_functions.PARTY_CONTROL, socket_functions.PARTY_END, position], members)
+
+        self._thread.join()
+        if self._read_ahead is not None:
+            self._read_ahead.close()
+        self._frames.release()
+        logger.info(f"The party {self.party_id} of {self.video} ended.")
+        return True
+
+    def control(self, action: str, frame_index: int) -> bool:
+        """
+        :param action: PARTY_PLAY, PARTY_PAUSE or PARTY_SEEK
+        :param frame_index: the frame the party continues at, the frame the host shows next for a pause
+        :return: bool. Change the playback and tell all the members, False for an unknown action.
+        """
+        with self._sending:
+            with self._changed:
+                if action == socket_functions.PARTY_PLAY:
+                    self._paused = False
+                elif action == socket_functions.PARTY_PAUSE:
+                    self._paused = True
+                elif action != socket_functions.PARTY_SEEK:
+                    return False
+                self._position = self._started_frame = frame_index
+                self._started_at = time.monotonic()
+                self._generation += 1
+                self._changed.notify_all()
+                members = list(self._members)
+            self._recent.clear()
+            self.__broadcast([socket_functions.PARTY_CONTROL, action, frame_index], members)
+        logger.info(f"The party {self.party_id}: {action} at frame {frame_index}.")
+        return True
+
+    def __broadcast(self, data: list, members: list) -> None:
+        """
+        :return: None. Send the message to the members, packed once for every protocol. Called with the sending lock.
+        """
+        messages = {}
+        for member in members:
+            try:
+                member.send_packed(self.__packed(messages, member.protocol, data))
+            except OSError as e:
+                logger.debug(f"The party {self.party_id} lost a member: {e}")
+
+    def __packed(self, messages: Dict[int, list], protocol: int, data: list) -> list:
+        """
+        :param messages: the message packed for the protocols so far, by protocol
+        :param protocol: the protocol of a member
+        :param data: the message
+        :return: the message packed with the protocol, packed now only for the first member with the protocol
+        """
+        if protocol not in messages:
+            if protocol == socket_functions.LEGACY_PROTOCOL and isinstance(data[-1], memoryview):
+                # pickle can't take a slice of the memory map of an archive
+                data = data[:-1] + [bytes(data[-1])]
+            with self._metrics.time(SERIALISE_STAGE):
+                messages[protocol] = socket_functions.pack_buffers(data, protocol)
+        return messages[protocol]
+
+    def __drop_due(self) -> List[tuple]:
+        """
+        :return: the recent frames that are not due yet. Called with the sending lock.
+        """
+        now = time.monotonic()
+        while self._recent and self._recent[0][1] <= now:
+            self._recent.popleft()
+        return list(self._recent)
+
+    def __run(self) -> None:
+        """
+        :return: None. The producer: prepare the next frame, wait until it is time to send it and send it to all the
+        members. Waits while the party is paused, a control of the host wakes it up.
+        """
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._closed or not self._paused)
+                if self._closed:
+                    return
+                index, generation = self._position, self._generation
+
+            try:
+                img_bytes = self.__encoded_frame(index)
+            except Exception as e:
+                logger.error(f"The party {self.party_id} failed to prepare frame {index}: {e}")
+                img_bytes = None
+
+            with self._changed:
+                due = self._started_at + (index - self._started_frame) / self._fps
+                if self._changed.wait_for(lambda: self._closed or self._generation != generation,
+                                          due - PARTY_LEAD - time.monotonic()):
+                    continue
+                if img_bytes is None:
+                    # the end of the video, the members play the frames they have
+                    self._paused = True
+                    continue
+
+            with self._sending:
+                with self._changed:
+                    if self._generation != generation:
+                        continue
+                    self._position = index + 1
+                    members = list(self._members)
+                self.__drop_due()
+                messages = {}
+                delivered = 0
+                for member in members:
+                    try:
+                        message = self.__packed(messages, member.protocol,
+                                                [socket_functions.PARTY_FRAME, index, img_bytes])
+                        delivered += member.send_packed(message, may_drop=True)
+                    except OSError as e:
+                        logger.debug(f"The party {self.party_id} lost a member: {e}")
+                self._recent.append((index, due, img_bytes, messages))
+                self._metrics.count(FRAMES_SERVED, delivered)
+
+    def __encoded_frame(self, index: int) -> Optional[bytes]:
+        """
+        :param index: the index of the frame
+        :return: the encoded frame, None if there is no such frame. From the archive of the video when there is one,
+        otherwise from the frame cache or the encode pool. The fill of the frame is shared with the clients that
+        stream the video by themselves, so the frame is made once for all of them (see FrameCache).
+        """
+        archive = open_archive(self.video)
+        if archive is not None and archive.profile == socket_functions.IMAGE_FORMAT:
+            return archive.frame(index)
+
+        key = (self.video, index, SOURCE_PROFILE.name, 1, DEFAULT_SETTINGS)
+        future = self._frames.prepare_encoded(key) if self._read_ahead is None else self._read_ahead.take(key)
+        return None if future is None else future.result()
+
+
+class PartyRegistry:
+    """
+    The watch parties of the server by their ids.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parties: Dict[str, WatchParty] = {}
+
+    def create(self, video: str, fps: float, host, metrics: SessionMetrics) -> WatchParty:
+        """
+        :param video: the video name
+        :param fps: the frames per second of the video
+        :param host: the client that controls the party
+        :param metrics: the metrics of the host
+        :return: a new party with a short id that is easy to pass on, paused at the first frame
+        """
+        with self._lock:
+            party_id = secrets.token_hex(3)
+            while party_id in self._parties:
+                party_id = secrets.token_hex(3)
+            party = self._parties[party_id] = WatchParty(party_id, video, fps, host, metrics)
+        return party
+
+    def get(self, party_id: str) -> Optional[WatchParty]:
+        with self._lock:
+            return self._parties.get(party_id)
+
+    def leave(self, party: WatchParty, member) -> None:
+        """
+        :return: None. Remove the member from the party, and the party when it ended.
+        """
+        if party.leave(member):
+            with self._lock:
+                self._parties.pop(party.party_id, None)
+
+
+PARTIES = PartyRegistry()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the server modules import each other by name from the server directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+# a fixed secret, so importing session_tokens does not make the secret file of the server
+os.environ.setdefault("SESSION_SECRET", "tests")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from frame_cache import FrameCache
+
+
+def test_concurrent_misses_fill_once():
+    cache = FrameCache(1024 * 1024)
+    calls = []
+    readers = 8
+    barrier = threading.Barrier(readers)
+    results = []
+
+    def fill():
+        calls.append(1)
+        time.sleep(0.05)
+        return b"frame"
+
+    def read():
+        barrier.wait()
+        results.append(cache.get_or_fill(("video", 0), fill))
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [b"frame"] * readers
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == readers - 1
+
+
+def test_readers_join_a_fill_that_is_in_flight():
+    cache = FrameCache(1024 * 1024)
+    encoded = Future()
+    starts = []
+
+    def start():
+        starts.append(1)
+        return encoded
+
+    first, started = cache.get_or_start("key", start)
+    assert started
+    joined = [cache.get_or_start("key", start) for _ in range(3)]
+    assert len(starts) == 1
+    assert all(future is first and not started for future, started in joined)
+
+    encoded.set_result(b"frame")
+    assert first.result() == b"frame"
+    assert cache.peek("key") == b"frame"
+    assert cache.stats()["misses"] == 1
+
+
+def test_failed_fill_raises_and_is_retried():
+    cache = FrameCache(1024)
+
+    def fail():
+        raise RuntimeError("decode failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_fill("key", fail)
+    assert cache.get_or_fill("key", lambda: b"frame") == b"frame"
+
+
+def test_missing_frame_is_not_cached():
+    cache = FrameCache(1024)
+    assert cache.get_or_fill("key", lambda: None) is None
+    assert cache.peek("key") is None
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = FrameCache(10)
+    cache.get_or_fill("a", lambda: b"aaaa")
+    cache.get_or_fill("b", lambda: b"bbbb")
+    # a is used, so b is the least recently used
+    cache.get_or_fill("a", lambda: b"")
+    cache.get_or_fill("c", lambda: b"cccc")
+
+    assert cache.peek("a") == b"aaaa"
+    assert cache.peek("b") is None
+    assert cache.peek("c") == b"cccc"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_frame_larger_than_the_cache_is_not_cached():
+    cache = FrameCache(4)
+    assert cache.get_or_fill("big", lambda: b"too big") == b"too big"
+    assert cache.peek("big") is None
@@ -0,0 +1,45 @@
+from collections import Counter
+
+from redirector import HashRing, NodeRegistry
+
+
+def test_ring_moves_only_the_videos_of_a_node_that_leaves():
+    ring = HashRing(points=50)
+    for node in ("a", "b", "c"):
+        ring.add(node)
+    videos = [f"video-{number}" for number in range(200)]
+    owners = {video: next(ring.nodes_for(video)) for video in videos}
+
+    ring.remove("c")
+    for video in videos:
+        if owners[video] != "c":
+            assert next(ring.nodes_for(video)) == owners[video]
+
+
+def test_ring_gives_every_node_once():
+    ring = HashRing(points=10)
+    for node in ("a", "b", "c"):
+        ring.add(node)
+    assert sorted(ring.nodes_for("video")) == ["a", "b", "c"]
+
+
+def test_locate_bounds_the_load_of_a_node():
+    registry = NodeRegistry(timeout=60, load_factor=1.25)
+    for port, node in enumerate(("a", "b", "c", "d")):
+        registry.heartbeat(node, ("127.0.0.1", 9000 + port), 0)
+
+    # every client asks for the same video, its owner takes only its share
+    sent = Counter(registry.locate("video") for _ in range(40))
+    assert len(sent) == 4
+    assert max(sent.values()) <= 1.25 * 40 / 4 + 1
+
+
+def test_locate_without_a_video_goes_to_the_least_loaded_node():
+    registry = NodeRegistry(timeout=60)
+    registry.heartbeat("busy", ("127.0.0.1", 9000), 10)
+    registry.heartbeat("idle", ("127.0.0.1", 9001), 0)
+    assert registry.locate(None) == ("127.0.0.1", 9001)
+
+
+def test_locate_without_nodes():
+    assert NodeRegistry().locate("video") is None
@@ -0,0 +1,33 @@
+import time
+
+import session_tokens
+from session_tokens import issue_token, verify_token, sign_heartbeat, verify_heartbeat
+
+
+def test_token_of_the_user():
+    assert verify_token(issue_token("alice")) == "alice"
+
+
+def test_forged_token():
+    payload, _, signature = issue_token("alice").partition(".")
+    other_payload, _, _ = issue_token("mallory").partition(".")
+    assert verify_token(f"{other_payload}.{signature}") is None
+    assert verify_token(f"{payload}.{signature[:-2]}xx") is None
+    assert verify_token("not a token") is None
+
+
+def test_expired_token(monkeypatch):
+    token = issue_token("alice")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + session_tokens.SESSION_TOKEN_TTL + 1)
+    assert verify_token(token) is None
+
+
+def test_heartbeat_signature():
+    sent_at = time.time()
+    signature = sign_heartbeat("node", ["127.0.0.1", 9000], 3, sent_at)
+    assert verify_heartbeat("node", ["127.0.0.1", 9000], 3, sent_at, signature)
+    assert not verify_heartbeat("node", ["10.0.0.1", 9000], 3, sent_at, signature)
+    old = sent_at - session_tokens.HEARTBEAT_MAX_AGE - 1
+    assert not verify_heartbeat("node", ["127.0.0.1", 9000], 3, old,
+                                sign_heartbeat("node", ["127.0.0.1", 9000], 3, old))
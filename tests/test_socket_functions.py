@@ -0,0 +1,46 @@
+import socket
+
+import pytest
+
+import socket_functions
+from socket_functions import BINARY_PROTOCOL, LEGACY_PROTOCOL, HEADER_LENGTH, MessageTooLargeError, SocketReader, \
+    pack_data, parse_header, unpack_data
+
+MESSAGE = [socket_functions.ASK_FOR_FRAME, b"\x00\xff" * 20000, None, True, False, -5, 2 ** 40, 0.25, "frame é",
+           [1, [2, "three"]], {"fps": 25.0, "name": "video"}]
+
+
+@pytest.mark.parametrize("protocol", [LEGACY_PROTOCOL, BINARY_PROTOCOL])
+def test_pack_unpack_round_trip(protocol):
+    packed = pack_data(MESSAGE, protocol)
+    protocol_read, opcode, size = parse_header(packed[:HEADER_LENGTH])
+    assert protocol_read == protocol
+    assert size == len(packed) - HEADER_LENGTH
+    assert unpack_data(packed[HEADER_LENGTH:], protocol_read, opcode) == MESSAGE
+
+
+def test_buffers_are_the_packed_message():
+    buffers = socket_functions.pack_buffers(MESSAGE, BINARY_PROTOCOL)
+    assert b"".join(buffers) == pack_data(MESSAGE, BINARY_PROTOCOL)
+
+
+@pytest.mark.parametrize("protocol", [LEGACY_PROTOCOL, BINARY_PROTOCOL])
+def test_header_above_the_most_is_rejected(protocol):
+    header = pack_data(MESSAGE, protocol)[:HEADER_LENGTH]
+    with pytest.raises(MessageTooLargeError):
+        parse_header(header, max_size=100)
+
+
+def test_socket_reader_reads_the_messages_in_order():
+    sender, receiver = socket.socketpair()
+    with sender, receiver:
+        for index in range(3):
+            socket_functions.send_data_through_socket(sender, [socket_functions.GRANT_CREDIT, index],
+                                                      BINARY_PROTOCOL)
+        socket_functions.send_data_through_socket(sender, MESSAGE, BINARY_PROTOCOL)
+        sender.shutdown(socket.SHUT_WR)
+        # a small buffer, so the reader has to grow it for the frame
+        reader = SocketReader(receiver, size=64)
+        assert [reader.read()[1] for _ in range(3)] == [[socket_functions.GRANT_CREDIT, index] for index in range(3)]
+        assert reader.read() == (True, MESSAGE)
+        assert reader.read() == (False, None)